@@ -4,12 +4,14 @@ import json
 from os.path import splitext, getsize, join
 import struct
 from argparse import ArgumentParser, Namespace
-from multiprocessing import Pool
+from multiprocessing import get_all_start_methods
 from typing import List, Union
 from io import FileIO
 
 import ffmpy
 
+from utils import create_pool
+
 
 def _parse_arguments() -> ArgumentParser:
     """
@@ -23,6 +25,14 @@ def _parse_arguments() -> ArgumentParser:
     parser.add_argument("-i", "--input", default='.', help='Folder path of sound files')
     parser.add_argument("-o", "--output", default='concatenated_sounds.blob', help='Name of output file')
     parser.add_argument("-c", "--convert", action='store_true', help='Convert to mp3 using ffmpeg')
+    parser.add_argument("-w", "--workers", type=lambda x: abs(int(x)), default=0,
+                        help='Number of conversion processes. Default: 0 for one per cpu')
+    parser.add_argument("--chunksize", type=lambda x: abs(int(x)), default=0,
+                        help='Number of files sent to a conversion process at once. Default: 0 for automatic')
+    parser.add_argument("--maxtasksperchild", type=lambda x: abs(int(x)), default=0,
+                        help='Number of tasks a process completes before it is replaced. Default: 0 for no limit')
+    parser.add_argument("--start_method", choices=get_all_start_methods(), default=None,
+                        help='Method used to start conversion processes. Default: platform default')
 
     return parser
 
@@ -83,8 +93,8 @@ def main(args: Namespace) -> None:
                            join(args.input, '{}.{}'.format(splitext(inpath[3])[0], args.ext)))
                           for inpath in _read_points(args.json)]
     if args.convert:
-        with Pool() as pool:
-            pool.starmap(_convert, inputs_and_outputs)
+        with create_pool(args.workers, args.maxtasksperchild, args.start_method) as pool:
+            pool.starmap(_convert, inputs_and_outputs, args.chunksize or None)
     with open(args.output, 'wb') as blob_output_file:
         for in_and_out in inputs_and_outputs:
             _write_to_file(blob_output_file, in_and_out[1])
@@ -0,0 +1,6 @@
+"""
+Provides benchmarks of the cruncher on synthetic audio corpora
+"""
+__all__ = ["make_corpus", "synthesize_clip", "run_benchmarks", "compare_to_baseline", "time_call", "environment"]
+from benchmark.corpus import make_corpus, synthesize_clip
+from benchmark.suite import run_benchmarks, compare_to_baseline, time_call, environment
@@ -0,0 +1,86 @@
+import json
+import os
+import sys
+import tempfile
+from argparse import ArgumentParser, Namespace
+
+from benchmark import make_corpus, run_benchmarks, compare_to_baseline, environment
+
+_groups = ["fingerprint", "reduction", "add_color", "output", "audio_concatenator"]
+
+
+def _arg_parse() -> ArgumentParser:
+    """
+    Provides a command line argument parser object.
+
+    :return: Argument parser for the benchmarks
+    :rtype: ArgumentParser
+    """
+    arg_parser = ArgumentParser(prog="python -m benchmark", description="Benchmark the cruncher on synthetic corpora.")
+    arg_parser.add_argument("-s", "--sizes", type=int, nargs='+', default=[1000],
+                            help="Numbers of clips in the corpora, e.g. 1000 10000 100000. Default: [1000]")
+    arg_parser.add_argument("-d", "--durations", type=int, nargs='+', default=[1000],
+                            help="Durations of the clips in milliseconds. Default: [1000]")
+    arg_parser.add_argument("-c", "--corpus_dir", type=str,
+                            default=os.path.join(tempfile.gettempdir(), "cruncher_benchmark"),
+                            help="Folder to keep generated corpora in. Existing corpora are reused. "
+                                 "Default: cruncher_benchmark in the system temporary folder.")
+    arg_parser.add_argument("-o", "--output", type=str, default=None,
+                            help="'.json' file to write results to. Default: None")
+    arg_parser.add_argument("-b", "--baseline", type=str, default=None,
+                            help="'.json' results file of an earlier run to compare against. Default: None")
+    arg_parser.add_argument("-t", "--tolerance", type=float, default=0.2,
+                            help="Allowed slowdown relative to the baseline. Default: 0.2 (20 %%)")
+    arg_parser.add_argument("-r", "--repeat", type=lambda x: max(1, int(x)), default=3,
+                            help="Number of runs of each benchmark. The shortest is reported. Default: 3")
+    arg_parser.add_argument("-g", "--groups", type=str, nargs='+', choices=_groups, default=_groups,
+                            help="Benchmark groups to run. Default: all")
+    arg_parser.add_argument("--reduction_limit", type=lambda x: abs(int(x)), default=2000,
+                            help="Maximum number of samples used in dimensionality reduction benchmarks. Exact t-SNE "
+                                 "scales quadratically. Default: 2000")
+    arg_parser.add_argument("--workers", type=lambda x: abs(int(x)), default=0,
+                            help="Number of fingerprinting processes. Default: 0 for one per cpu.")
+    arg_parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic corpora. Default: 0")
+    return arg_parser
+
+
+def main(args: Namespace) -> int:
+    """
+    Run benchmarks and compare them to a baseline based on command line parameters.
+
+    :param args: parsed command line argument object
+    :type args: argparse.Namespace
+    :return: Exit status. 1 if a benchmark is slower than the baseline allows.
+    :rtype: int
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as output_folder:
+        for size in args.sizes:
+            for duration in args.durations:
+                print("Generating corpus of {} clips of {} ms.".format(size, duration))
+                corpus = make_corpus(os.path.join(args.corpus_dir, "{}x{}ms".format(size, duration)), size, duration,
+                                     seed=args.seed)
+                print("Running benchmarks on {}.".format(corpus))
+                results.update(run_benchmarks(corpus, output_folder, duration, args.repeat, args.reduction_limit,
+                                              args.workers, args.groups))
+    if args.output:
+        with open(args.output, "w") as out_file:
+            json.dump({"environment": environment(), "benchmarks": results}, out_file, indent=2, sort_keys=True)
+        print("Wrote results to {}.".format(args.output))
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)["benchmarks"]
+    status = 0
+    for name, reference, seconds, slower in compare_to_baseline(results, baseline, args.tolerance):
+        if reference is None:
+            print("{:<50} {:>10.4f} s".format(name, seconds))
+        else:
+            print("{:<50} {:>10.4f} s {:>+8.1%}{}".format(name, seconds, seconds / reference - 1,
+                                                          "  SLOWER" if slower else ""))
+        status = 1 if slower else status
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main(_arg_parse().parse_args()))
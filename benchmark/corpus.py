@@ -0,0 +1,104 @@
+import csv
+import json
+import os
+from typing import List
+
+import numpy as np
+import scipy.io.wavfile as wf
+
+from utils import mkdir_p
+
+
+def clip_name(index: int) -> str:
+    """
+    Get file name of a synthetic clip.
+
+    :param index: Index of the clip.
+    :type index: int
+    :return: File name.
+    :rtype: str
+    """
+    return "clip_{:06d}.wav".format(index)
+
+
+def synthesize_clip(index: int, duration: int, sample_rate: int = 22050, seed: int = 0) -> np.ndarray:
+    """
+    Generate a decaying harmonic tone with noise. The clip only depends on its index and the seed, so corpora of
+    different sizes share their first clips.
+
+    :param index: Index of the clip.
+    :type index: int
+    :param duration: Duration of the clip in milliseconds.
+    :type duration: int
+    :param sample_rate: Sample rate of the clip.
+    :type sample_rate: int
+    :param seed: Seed of the corpus.
+    :type seed: int
+    :return: 16 bit audio data.
+    :rtype: numpy.ndarray
+    """
+    rng = np.random.RandomState([seed, index])
+    f0 = rng.uniform(80, 1000)
+    t = np.arange(sample_rate * duration // 1000) / sample_rate
+    audio = np.zeros(len(t))
+    for k in range(1, rng.randint(1, 8) + 1):
+        audio += rng.uniform(0.2, 1) / k * np.sin(2 * np.pi * k * f0 * t + rng.uniform(0, 2 * np.pi))
+    audio *= np.exp(-t * rng.uniform(1, 10))
+    audio += rng.uniform(0, 0.3) * rng.randn(len(t))
+    peak = np.abs(audio).max() if len(audio) else 0
+    if peak:
+        audio *= 0.9 / peak
+    return (audio * 32767).astype(np.int16)
+
+
+def _clip_labels(index: int, seed: int) -> List[str]:
+    """
+    Get metadata of a synthetic clip.
+
+    :param index: Index of the clip.
+    :type index: int
+    :param seed: Seed of the corpus.
+    :type seed: int
+    :return: List of file name, harmonics and pitch range labels.
+    :rtype: List[str]
+    """
+    rng = np.random.RandomState([seed, index])
+    f0 = rng.uniform(80, 1000)
+    return [clip_name(index), "harmonics_{}".format(rng.randint(1, 8)), "{}Hz".format(int(f0 // 100) * 100)]
+
+
+def make_corpus(folder: str, clips: int, duration: int, sample_rate: int = 22050, seed: int = 0) -> str:
+    """
+    Write a deterministic corpus of synthetic wave files and a 'labels.csv' metadata file into a folder. An existing
+    corpus with the same parameters is reused.
+
+    :param folder: Folder to write the corpus to.
+    :type folder: str
+    :param clips: Number of clips.
+    :type clips: int
+    :param duration: Duration of each clip in milliseconds.
+    :type duration: int
+    :param sample_rate: Sample rate of the clips.
+    :type sample_rate: int
+    :param seed: Seed of the corpus.
+    :type seed: int
+    :return: Path to the corpus folder.
+    :rtype: str
+    """
+    parameters = {"clips": clips, "duration": duration, "sample_rate": sample_rate, "seed": seed}
+    marker = os.path.join(folder, "corpus.json")
+    if os.path.isfile(marker):
+        with open(marker) as marker_file:
+            if json.load(marker_file) == parameters:
+                return folder
+    mkdir_p(folder)
+    for i in range(clips):
+        wf.write(os.path.join(folder, clip_name(i)), sample_rate, synthesize_clip(i, duration, sample_rate, seed))
+    with open(os.path.join(folder, "labels.csv"), "w", newline="") as labels_file:
+        writer = csv.writer(labels_file)
+        writer.writerow(["filename", "harmonics", "pitch"])
+        for i in range(clips):
+            writer.writerow(_clip_labels(i, seed))
+    with open(marker, "w") as marker_file:
+        json.dump(parameters, marker_file)
+    return folder
@@ -0,0 +1,148 @@
+import copy
+import os
+import platform
+import time
+from argparse import Namespace
+from contextlib import redirect_stdout
+from typing import Callable, Dict, List, Tuple, Any
+
+import numpy as np
+
+import audio_concatenator
+import crunch
+from crunch import ProcessFunctions
+from utils import add_color, normalize, parse_metadata, configure_metrics
+
+
+def time_call(function: Callable[[], Any], repeat: int = 3, setup: Callable[[], None] = None) -> float:
+    """
+    Time a function. Output of the function is discarded.
+
+    :param function: Function to time.
+    :type function: Callable[[], Any]
+    :param repeat: Number of runs.
+    :type repeat: int
+    :param setup: Function to call before each run. Not included in the timing.
+    :type setup: Callable[[], None]
+    :return: Shortest time of the runs in seconds.
+    :rtype: float
+    """
+    times = []
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        for _ in range(repeat):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def environment() -> Dict[str, Any]:
+    """
+    Describe the environment benchmarks are run in.
+
+    :return: Dictionary of python and library versions, platform and cpu count.
+    :rtype: Dict[str, Any]
+    """
+    import librosa
+    import sklearn
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "numpy": np.__version__, "sklearn": sklearn.__version__, "librosa": librosa.__version__}
+
+
+def run_benchmarks(corpus: str, output_folder: str, duration: int, repeat: int = 3, reduction_limit: int = 2000,
+                   workers: int = 0, groups: List[str] = None) -> Dict[str, float]:
+    """
+    Time the stages of a crunch on a synthetic corpus.
+
+    :param corpus: Folder containing a corpus made with make_corpus.
+    :type corpus: str
+    :param output_folder: Folder to write json, blob and fingerprint output to.
+    :type output_folder: str
+    :param duration: Duration to load of each clip in milliseconds.
+    :type duration: int
+    :param repeat: Number of runs of each benchmark. The shortest run is reported.
+    :type repeat: int
+    :param reduction_limit: Maximum number of rows used for dimensionality reduction benchmarks.
+    :type reduction_limit: int
+    :param workers: Number of fingerprinting processes. 0 for one per cpu.
+    :type workers: int
+    :param groups: Benchmark groups to run ('fingerprint', 'reduction', 'add_color', 'output' and
+                   'audio_concatenator'). None to run all.
+    :type groups: List[str]
+    :return: Dictionary of benchmark names and times in seconds.
+    :rtype: Dict[str, float]
+    """
+    groups = groups or ["fingerprint", "reduction", "add_color", "output", "audio_concatenator"]
+    configure_metrics(interval=0)
+    clips = len([f for f in os.listdir(corpus) if f.endswith(".wav")])
+    label = "{}x{}ms".format(clips, duration)
+    results = {}
+    output_file = os.path.join(output_folder, "benchmark_.json")
+    args = crunch._arg_parse().parse_args(["-f", corpus, "-d", str(duration), "-o", output_file, "-k", "pca",
+                                           "-c", os.path.join(corpus, "labels.csv"), "--workers", str(workers),
+                                           "--progress_interval", "0"])
+
+    def fingerprint(method: str) -> Tuple[np.ndarray, List[str]]:
+        method_args = Namespace(**vars(args))
+        method_args.fingerprint_method = method
+        return crunch._read_data_to_fingerprints(method_args)
+
+    if "fingerprint" in groups:
+        for method in sorted(ProcessFunctions.fingerprint_dict):
+            results["fingerprint/{}/{}".format(method, label)] = time_call(lambda: fingerprint(method), repeat)
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        data, file_data = fingerprint("mfcc")
+        data = np.asarray(data).reshape(len(data), -1)
+        x_nd = crunch.pca(data, 3)[0][0]
+    rows = min(len(data), reduction_limit)
+    if "reduction" in groups:
+        for method in sorted(ProcessFunctions.dimensionality_reduction_dict):
+            reduction = ProcessFunctions.dimensionality_reduction_dict[method]
+            results["reduction/{}/{}x{}".format(method, rows, data.shape[1])] = \
+                time_call(lambda: reduction(data[:rows], 3, args), repeat)
+    metadata = parse_metadata(args, {os.path.basename(file_data[i]): i for i in range(len(file_data))})
+    if "add_color" in groups:
+        colored = {}
+
+        def reset() -> None:
+            colored.clear()
+            colored.update(copy.deepcopy(metadata))
+
+        results["add_color/{}".format(clips)] = time_call(lambda: add_color(colored, x_nd), repeat, reset)
+    add_color(metadata, x_nd)
+    norm_data = normalize(x_nd, args.value_minimum, args.value_maximum)
+    if "output" in groups:
+        results["output/{}".format(clips)] = time_call(
+            lambda: crunch.output(output_file, file_data, norm_data, args, metadata, "pca"), repeat)
+    if "audio_concatenator" in groups:
+        time_call(lambda: crunch.output(output_file, file_data, norm_data, args, metadata, "pca"), 1)
+        concatenator_args = audio_concatenator._parse_arguments().parse_args(
+            [output_file, "-e", "wav", "-i", corpus, "-o", os.path.join(output_folder, "benchmark.blob")])
+        results["audio_concatenator/{}".format(label)] = time_call(
+            lambda: audio_concatenator.main(concatenator_args), repeat)
+    return results
+
+
+def compare_to_baseline(results: Dict[str, float], baseline: Dict[str, float],
+                        tolerance: float = 0.2) -> List[Tuple[str, float, float, bool]]:
+    """
+    Compare benchmark times to a baseline.
+
+    :param results: Dictionary of benchmark names and times in seconds.
+    :type results: Dict[str, float]
+    :param baseline: Dictionary of benchmark names and baseline times in seconds.
+    :type baseline: Dict[str, float]
+    :param tolerance: Allowed slowdown relative to the baseline, e.g. 0.2 for 20 %.
+    :type tolerance: float
+    :return: List of tuples containing benchmark name, baseline time (None if not in baseline), time and whether the
+             benchmark is slower than the baseline allows.
+    :rtype: List[Tuple[str, float, float, bool]]
+    """
+    comparison = []
+    for name in sorted(results):
+        reference = baseline.get(name)
+        comparison.append((name, reference, results[name],
+                           reference is not None and results[name] > reference * (1 + tolerance)))
+    return comparison
@@ -1,15 +1,57 @@
 import json
 import os
+import tempfile
 import time
-from argparse import ArgumentParser, Namespace
-from multiprocessing import Pool
-from typing import Tuple, List, Dict, Any, Union
+import warnings
+import zlib
+from argparse import ArgumentParser, ArgumentTypeError, Namespace
+from functools import partial
+from itertools import islice
+from multiprocessing import get_all_start_methods
+from typing import Tuple, List, Dict, Any, Union, Callable, Iterable, Iterator, Sized
 
 import numpy as np
 
 from subprocesses import *
 from utils import *
 
+_worker_state = {}
+_temp_files = []
+
+
+def _shard(value: str) -> Tuple[int, int]:
+    """
+    Parse a shard argument of the form i/N.
+
+    :param value: Shard argument.
+    :type value: str
+    :return: Tuple of shard index and shard count.
+    :rtype: Tuple[int, int]
+    """
+    try:
+        index, count = (int(x) for x in value.split("/"))
+    except ValueError:
+        raise ArgumentTypeError("Shard must be given as i/N, e.g. 0/4.")
+    if not 0 <= index < count:
+        raise ArgumentTypeError("Shard index must be between 0 and N - 1.")
+    return index, count
+
+
+def _warm_iterations(value: str) -> int:
+    """
+    Parse a warm start iteration count. sklearn.manifold.TSNE needs at least 250 iterations, so smaller counts are
+    rejected before any work is done.
+
+    :param value: Warm start iteration argument.
+    :type value: str
+    :return: Number of iterations, 0 for the default.
+    :rtype: int
+    """
+    iterations = abs(int(value))
+    if 0 < iterations < 250:
+        raise ArgumentTypeError("Warm started t-SNE needs at least 250 iterations.")
+    return iterations
+
 
 def _arg_parse() -> ArgumentParser:
     """
@@ -60,19 +102,137 @@ def _arg_parse() -> ArgumentParser:
                             help="Read fingerprints form file instead fo generating them. Default: None.")
     arg_parser.add_argument("--format", type=str, choices=ProcessFunctions.fingerprint_loader, default="npy",
                             help="Input format for fingerprint input. Default is 'npy' (numpy)")
+    arg_parser.add_argument("--output_format", type=str, choices=ProcessFunctions.fingerprint_writer, default="npy",
+                            help="Format of written fingerprint files. 'matrix' stores can be memory mapped. "
+                                 "Default is 'npy' (numpy)")
     arg_parser.add_argument("--td", help="Generates 2d data instead of the default 3d.", action="store_true")
     arg_parser.add_argument("--colorby", type=str, default=None,
                             help="Tag to do default coloring by.")
     arg_parser.add_argument("--parallel", action="store_true", help="If t-SNE reduction is selected will run batch"
-                                                                    " perplexities in parallel. Memory hog.")
+                                                                    " perplexities in parallel. See --max_memory.")
+    arg_parser.add_argument("--max_memory", type=lambda x: abs(int(x)), default=0,
+                            help="Memory budget in megabytes for perplexities run in parallel. Only as many "
+                                 "perplexities are run at once as are estimated to fit. Default: 0 for no limit.")
+    arg_parser.add_argument("--cache_dir", type=str, default=None,
+                            help="Folder to cache fingerprints in. Only new or changed files are fingerprinted when "
+                                 "a cache is used. Default: None")
+    arg_parser.add_argument("--cache_size", type=int, default=0,
+                            help="Maximum size of the fingerprint cache in megabytes. Least recently used entries "
+                                 "are evicted after fingerprinting. Default: 0 for no limit.")
+    arg_parser.add_argument("--cache_by_content", action="store_true",
+                            help="Identify cached files by content hash instead of path, size and modification time.")
+    arg_parser.add_argument("--invalidate_cache", type=str, action="append", default=[],
+                            choices=ProcessFunctions.fingerprint_dict.keys(),
+                            help="Fingerprinting method to remove cached fingerprints for before fingerprinting. "
+                                 "May be given multiple times.")
+    arg_parser.add_argument("--manifest", type=str, default=None,
+                            help="File listing the audio files in the input folder. Written by scanning the folder if "
+                                 "it does not exist, read instead of scanning otherwise.")
+    arg_parser.add_argument("--rescan", action='store_true',
+                            help="Scan the input folder and rewrite --manifest even if it exists.")
+    arg_parser.add_argument("--scan_threads", type=lambda x: abs(int(x)), default=0,
+                            help="Number of folders to scan at once. Default: 0 to choose based on the number of cpus.")
+    arg_parser.add_argument("--shard", type=_shard, default=None, metavar="i/N",
+                            help="Only fingerprint shard i of N of the input files and write them to "
+                                 "--fingerprint_output without dimensionality reduction. Default: None")
+    arg_parser.add_argument("--merge", type=str, nargs='+', default=None, metavar="STORE",
+                            help="'.npy' fingerprint stores of shards to merge and use instead of fingerprinting. "
+                                 "The merged store is written to --fingerprint_output. Default: None")
+    arg_parser.add_argument("--metrics", type=str, default=None,
+                            help="JSON lines file to append throughput and memory metrics of each stage to. "
+                                 "Default: None")
+    arg_parser.add_argument("--progress_interval", type=float, default=5.0,
+                            help="Seconds between progress reports. Default: 5, 0 to disable progress reports.")
+    arg_parser.add_argument("--profile", type=str, default=None, metavar="DIR",
+                            help="Folder to write a cProfile '.pstats' file of each stage to. Default: None")
+    arg_parser.add_argument("--profile_memory", action='store_true',
+                            help="Also write a tracemalloc snapshot of each stage to --profile.")
+    arg_parser.add_argument("--workers", type=lambda x: abs(int(x)), default=0,
+                            help="Number of worker processes for fingerprinting and parallel t-SNE. "
+                                 "Default: 0 for one per cpu.")
+    arg_parser.add_argument("--maxtasksperchild", type=lambda x: abs(int(x)), default=0,
+                            help="Number of tasks a worker process completes before it is replaced with a fresh one. "
+                                 "Default: 0 to keep workers for the whole run.")
+    arg_parser.add_argument("--start_method", type=str, choices=get_all_start_methods(), default=None,
+                            help="Method used to start worker processes. Default: platform default.")
+    arg_parser.add_argument("--chunksize", type=int, default=0,
+                            help="Number of files (or batches with --batch_size) handed to a fingerprinting process "
+                                 "at a time. Default: 0 to choose based on the number of files and processes.")
+    arg_parser.add_argument("--batch_size", type=lambda x: abs(int(x)), default=0,
+                            help="Number of samples to fingerprint together in one vectorized call. Requires "
+                                 "--duration. Default: 0 to fingerprint samples one at a time.")
+    arg_parser.add_argument("--dtype", type=str, choices=["float64", "float32"], default="float64",
+                            help="Float type to store fingerprints and run scaling and reduction in. float32 halves "
+                                 "memory and storage use. Default: float64")
+    arg_parser.add_argument("--temp_dir", type=str, default=None,
+                            help="Folder to write the fingerprint matrix to while files are fingerprinted. "
+                                 "Default: the folder of --output_file.")
+    arg_parser.add_argument("--features", type=str, nargs='+', choices=sorted(feature_rows.keys()), default=None,
+                            help="Compute several fingerprints from one spectrogram per sample. Each fingerprint is "
+                                 "reduced and stored separately unless --fuse is given. Overrides "
+                                 "--fingerprint_method. Default: None")
+    arg_parser.add_argument("--fuse", action="store_true",
+                            help="Concatenate the fingerprints selected with --features into one fingerprint.")
+    arg_parser.add_argument("--incremental", type=str, default=None,
+                            help="'.npy' fingerprint store to update. Only files missing from the store are "
+                                 "fingerprinted and the store is rewritten before reduction. Default: None")
+    arg_parser.add_argument("--pre_pca", type=lambda x: abs(int(x)), default=0,
+                            help="Project scaled fingerprints to this many principal components with randomized PCA "
+                                 "before t-SNE, e.g. 50. Default: 0 to run t-SNE on the full fingerprints.")
+    arg_parser.add_argument("--tsne_method", type=str, choices=["exact", "barnes_hut", "auto"], default="auto",
+                            help="t-SNE gradient method. 'auto' uses 'exact' for up to --tsne_exact_limit samples and "
+                                 "'barnes_hut' for more. Default: auto")
+    arg_parser.add_argument("--tsne_exact_limit", type=lambda x: abs(int(x)), default=5000,
+                            help="Largest number of samples reduced with exact t-SNE if --tsne_method is auto. "
+                                 "Default: 5000")
+    arg_parser.add_argument("--angle", type=float, default=0.5,
+                            help="Barnes-Hut t-SNE angle between 0 and 1. Larger values are faster but less "
+                                 "accurate. Default: 0.5")
+    arg_parser.add_argument("--tsne_init", type=str, choices=["pca", "random"], default="pca",
+                            help="Initialization of t-SNE runs that are not warm started. Default: pca")
+    arg_parser.add_argument("--chain", action="store_true",
+                            help="Run t-SNE perplexities one after another in the given order, each starting from the "
+                                 "embedding of the previous one. Can not be combined with --parallel.")
+    arg_parser.add_argument("--init_embedding", type=str, default=None,
+                            help="json file written by an earlier t-SNE run to start t-SNE from. Samples are matched "
+                                 "by file name. Default: None")
+    arg_parser.add_argument("--warm_iterations", type=_warm_iterations, default=0,
+                            help="Maximum number of iterations of t-SNE runs started from --init_embedding or, with "
+                                 "--chain, from the previous perplexity. At least 250. Default: 0 for the same "
+                                 "number as other runs.")
+    arg_parser.add_argument("--rows_per_chunk", type=lambda x: abs(int(x)), default=10000,
+                            help="Number of fingerprints read from a fingerprint file at a time by stages that work "
+                                 "in chunks. Default: 10000")
+    arg_parser.add_argument("--pca_solver", type=str, choices=["full", "randomized", "incremental"], default="full",
+                            help="PCA solver. 'randomized' only computes the requested components and is much faster "
+                                 "on large data. 'incremental' scales and reduces fingerprints in chunks of "
+                                 "--rows_per_chunk rows, so fingerprint files larger than memory can be reduced. "
+                                 "Default: full")
+    arg_parser.add_argument("--save_projection", action="store_true",
+                            help="Write a '.npz' projection file next to each PCA output file, so new files can be "
+                                 "placed exactly on the map with --project.")
+    arg_parser.add_argument("--project", type=str, default=None, metavar="MAP",
+                            help="json file written by an earlier run to add new files to instead of computing a new "
+                                 "map. Files already on the map keep their position. PCA maps place new files with the "
+                                 "projection file written next to them with --save_projection, other maps at the "
+                                 "inverse distance weighted mean position of their nearest fingerprints on the map, "
+                                 "which needs the fingerprints of all files, so use --incremental or --cache_dir to "
+                                 "avoid computing them again. The updated map is written to --output_file. "
+                                 "Default: None")
+    arg_parser.add_argument("--project_neighbors", type=lambda x: max(1, abs(int(x))), default=10,
+                            help="Number of nearest fingerprints averaged to place a new file with --project on a map "
+                                 "without a projection file. Default: 10")
     return arg_parser
 
 
 def _finalize(x_nd: Tuple[np.ndarray, str], args: Namespace, data: List[str], metadata: Dict[str, dict]) -> None:
     """
-    Add coloration to the metadata and output files.
+    Add coloration to the metadata and output files. Reductions that return a projection dictionary as the third
+    element of x_nd get it saved next to the json file with --save_projection, including the normalization of the
+    coordinates.
 
-    :param x_nd: Pairs of arrays of reduced 3d or 2d vectors and identifiers
+    :param x_nd: Pairs of arrays of reduced 3d or 2d vectors and identifiers, optionally followed by a projection
+                 dictionary
     :type x_nd: Tuple[numpy.ndarray, str]
     :param args: command line argument namespace
     :type args: argparse.Namespace
@@ -81,11 +241,80 @@ def _finalize(x_nd: Tuple[np.ndarray, str], args: Namespace, data: List[str], me
     :param metadata: Metadata dictionary
     :type metadata: Dict[str, Dict[str, bool]]
     """
-    add_color(metadata, x_nd[0])
+    with Stage("coloring {}".format(x_nd[1]), unit="points") as stage:
+        add_color(metadata, x_nd[0])
+        stage.update(len(x_nd[0]))
     if args.plot_output:
-        plot_results(x_nd[0], insert_suffix(args.plot_output, x_nd[1]), metadata, args.colorby)
-    norm_data = normalize(np.asarray(x_nd[0]), args.value_minimum, args.value_maximum)
-    output(insert_suffix(args.output_file, x_nd[1]), data, norm_data, args, metadata, x_nd[1])
+        with Stage("plotting {}".format(x_nd[1]), unit="points") as stage:
+            plot_results(x_nd[0], insert_suffix(args.plot_output, x_nd[1]), metadata, args.colorby)
+            stage.update(len(x_nd[0]))
+    with Stage("output {}".format(x_nd[1]), unit="points") as stage:
+        output_file = insert_suffix(args.output_file, x_nd[1])
+        if args.save_projection and len(x_nd) > 2 and len(x_nd[0]):
+            # normalize works in place, so its offset and factor are computed from the coordinates beforehand
+            offset = float(np.min(x_nd[0]))
+            factor = (args.value_maximum - args.value_minimum) / (float(np.max(x_nd[0])) - offset)
+            save_projection(projection_path(output_file), x_nd[2], offset, factor, args.value_minimum)
+        norm_data = normalize(np.asarray(x_nd[0]), args.value_minimum, args.value_maximum)
+        output(output_file, data, norm_data, args, metadata, x_nd[1])
+        stage.update(len(x_nd[0]))
+
+
+def _make_cache(args: Namespace) -> Union[FingerprintCache, None]:
+    """
+    Create fingerprint cache based on command line arguments.
+
+    :param args: Command line arguments.
+    :type args: argparse.Namespace
+    :return: Fingerprint cache or None if caching is not enabled.
+    :rtype: Union[FingerprintCache, None]
+    """
+    if not args.cache_dir:
+        return None
+    return FingerprintCache(args.cache_dir, args.cache_size * 1024 * 1024, args.cache_by_content)
+
+
+def _fingerprint_function(args: Namespace) -> Callable:
+    """
+    Select fingerprint function based on command line arguments.
+
+    :param args: Command line arguments.
+    :type args: argparse.Namespace
+    :return: Function taking samples (or a batch of samples), sample rate and sample length.
+    :rtype: Callable
+    """
+    if args.features:
+        return partial(spectral_batch_fingerprint if args.batch_size else spectral_fingerprint, methods=args.features)
+    if args.batch_size:
+        return ProcessFunctions.batch_fingerprint_dict[args.fingerprint_method]
+    return ProcessFunctions.fingerprint_dict[args.fingerprint_method]
+
+
+def _method_name(args: Namespace) -> str:
+    """
+    Get name of the fingerprinting method used based on command line arguments.
+
+    :param args: Command line arguments.
+    :type args: argparse.Namespace
+    :return: Fingerprint method or feature names joined with '+'.
+    :rtype: str
+    """
+    return "+".join(args.features) if args.features else args.fingerprint_method
+
+
+def _fingerprint_parameters(args: Namespace) -> Dict[str, Any]:
+    """
+    Collect the command line arguments that affect fingerprint values.
+
+    :param args: Command line arguments.
+    :type args: argparse.Namespace
+    :return: Dictionary of fingerprinting parameters.
+    :rtype: Dict[str, Any]
+    """
+    parameters = {"method": _method_name(args), "duration": args.duration, "frames": frame_count}
+    if args.batch_size:
+        parameters["batch"] = True
+    return parameters
 
 
 def _read_and_fingerprint(file_path: str, args: Namespace) -> Tuple[np.ndarray, str, int]:
@@ -99,39 +328,368 @@ def _read_and_fingerprint(file_path: str, args: Namespace) -> Tuple[np.ndarray,
     :return: Tuple containing fingerprint data, file path and audio length
     :rtype: Tuple[numpy.ndarray, str, int]
     """
-    fingerprint_function = ProcessFunctions.fingerprint_dict[args.fingerprint_method]
-    data = load_sample(file_path, args.duration)
-    result = fingerprint_function(data[1], data[3], data[2])
-    print("{} read and fingerprinted".format(file_path))
+    cache = _make_cache(args)
+    parameters = _fingerprint_parameters(args)
+    if cache:
+        with timed("cache"):
+            cached = cache.get(file_path, parameters)
+        if cached is not None:
+            return cached[0], file_path, cached[1]
+    fingerprint_function = _fingerprint_function(args)
+    with timed("decode") as counter:
+        data = load_sample(file_path, args.duration)
+        counter[2] += data[1].nbytes
+    with timed("fingerprint"):
+        result = fingerprint_function(data[1], data[3], data[2])
+    if cache:
+        cache.put(file_path, parameters, result, data[2])
     return result, data[0], data[2]
 
 
-def _read_data_to_fingerprints(args: Namespace) -> Tuple[List[np.ndarray], List[str]]:
+def _in_shard(file_path: str, args: Namespace) -> bool:
+    """
+    Check whether a file belongs to the selected shard. Files are assigned by a checksum of their path relative to the
+    input folder, so every machine gets the same split regardless of where the corpus is mounted or in which order
+    files are found.
+
+    :param file_path: Path to audio file.
+    :type file_path: str
+    :param args: Command line arguments.
+    :type args: argparse.Namespace
+    :return: True if the file belongs to the shard.
+    :rtype: bool
+    """
+    index, count = args.shard
+    relative_path = os.path.relpath(file_path, args.input_folder).replace(os.sep, "/")
+    return zlib.crc32(relative_path.encode("utf-8")) % count == index
+
+
+def _list_input_files(args: Namespace, limit: bool = True) -> Iterator[str]:
+    """
+    List audio files to fingerprint based on command line arguments. Files are listed lazily so fingerprinting can
+    start while the input folder is still being scanned.
+
+    :param args: Command line arguments.
+    :type args: argparse.Namespace
+    :param limit: Whether to stop after --max_to_load files.
+    :type limit: bool
+    :return: Iterator over file paths.
+    :rtype: Iterator[str]
+    """
+    if not args.manifest:
+        file_list = all_files(args.input_folder, [".wav"], args.scan_threads)
+    elif os.path.isfile(args.manifest) and not args.rescan:
+        file_list = (entry.path for entry in read_manifest(args.manifest))
+    else:
+        file_list = (entry.path for entry in scan_manifest(args.input_folder, [".wav"], args.manifest,
+                                                           args.scan_threads))
+    if args.shard:
+        file_list = (f for f in file_list if _in_shard(f, args))
+    return islice(file_list, (args.max_to_load if limit else 0) or None)
+
+
+def _read_and_fingerprint_batch(file_paths: List[str], args: Namespace) -> List[Tuple[np.ndarray, str, int]]:
+    """
+    Read audio data from files and fingerprint them together with the batch version of the specified fingerprint
+    algorithm. Samples are truncated to the selected duration and batched with samples of the same sample rate and
+    length, so every fingerprint equals the one computed for the sample on its own.
+
+    :param file_paths: Paths to files to read.
+    :type file_paths: List[str]
+    :param args: Command line arguments.
+    :type args: argparse.Namespace
+    :return: List of tuples containing fingerprint data, file path and audio length
+    :rtype: List[Tuple[numpy.ndarray, str, int]]
+    """
+    cache = _make_cache(args)
+    parameters = _fingerprint_parameters(args)
+    results = [None] * len(file_paths)
+    samples = {}
+    for i in range(len(file_paths)):
+        cached = None
+        if cache:
+            with timed("cache"):
+                cached = cache.get(file_paths[i], parameters)
+        if cached is not None:
+            results[i] = cached[0], file_paths[i], cached[1]
+        else:
+            with timed("decode") as counter:
+                data = load_sample(file_paths[i], args.duration)
+                counter[2] += data[1].nbytes
+            samples.setdefault((data[3], data[2]), []).append((i, data))
+    fingerprint_function = _fingerprint_function(args)
+    # The hop of the spectrogram depends on the sample length, so samples shorter than the duration are not zero
+    # padded but batched with samples of the same length
+    for (sr, size), group in samples.items():
+        batch = np.stack([data[1] for _, data in group])
+        with timed("fingerprint", len(group)):
+            fingerprints = fingerprint_function(batch, sr, size)
+        for j in range(len(group)):
+            i, data = group[j]
+            results[i] = fingerprints[j], data[0], data[2]
+            if cache:
+                cache.put(data[0], parameters, fingerprints[j], data[2])
+    return results
+
+
+def _fingerprint_files(file_paths: List[str], args: Namespace) -> List[Tuple[np.ndarray, str, int]]:
+    """
+    Read and fingerprint files one by one or as a batch based on command line arguments.
+
+    :param file_paths: Paths to files to read.
+    :type file_paths: List[str]
+    :param args: Command line arguments.
+    :type args: argparse.Namespace
+    :return: List of tuples containing fingerprint data, file path and audio length
+    :rtype: List[Tuple[numpy.ndarray, str, int]]
+    """
+    if args.batch_size:
+        return _read_and_fingerprint_batch(file_paths, args)
+    return [_read_and_fingerprint(f, args) for f in file_paths]
+
+
+def _stack_fingerprints(results: List[Tuple[np.ndarray, str, int]], shape: Tuple[int, ...],
+                        dtype: str = "float64") -> np.ndarray:
+    """
+    Stack fingerprints into contiguous rows of float data.
+
+    :param results: List of tuples containing fingerprint data, file path and audio length.
+    :type results: List[Tuple[numpy.ndarray, str, int]]
+    :param shape: Expected shape of each fingerprint.
+    :type shape: Tuple[int, ...]
+    :param dtype: Float type of the rows.
+    :type dtype: str
+    :return: Array of shape (len(results),) + shape
+    :rtype: numpy.ndarray
+    """
+    for result in results:
+        if result[0].shape != shape:
+            raise ValueError("Fingerprint of {} has shape {}, expected {}.".format(result[1], result[0].shape, shape))
+    return np.ascontiguousarray([r[0] for r in results], dtype=dtype)
+
+
+def _write_rows(matrix_path: str, index: int, rows: np.ndarray) -> None:
+    """
+    Write rows of fingerprint data into a binary matrix file.
+
+    :param matrix_path: Path to matrix file.
+    :type matrix_path: str
+    :param index: Index of the first row to write.
+    :type index: int
+    :param rows: Contiguous rows in the dtype of the matrix.
+    :type rows: numpy.ndarray
+    """
+    with open(matrix_path, "r+b") as matrix_file:
+        matrix_file.seek(index * rows[0].nbytes)
+        matrix_file.write(rows.tobytes())
+
+
+def _warm_up(args: Namespace) -> None:
+    """
+    Run the selected fingerprint algorithm once on silence at librosa's default sample rate so lazily loaded modules,
+    filter banks and windows are ready before the first file is read.
+
+    :param args: Command line arguments.
+    :type args: argparse.Namespace
+    """
+    sr = 22050
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        _fingerprint_function(args)(np.zeros((1, sr)) if args.batch_size else np.zeros(sr), sr, sr)
+
+
+def _init_worker(args: Namespace, matrix_path: str, shape: Tuple[int, ...]) -> None:
+    """
+    Prepare a fingerprinting process. The run parameters are stored once per process instead of being sent with
+    every task.
+
+    :param args: Command line arguments.
+    :type args: argparse.Namespace
+    :param matrix_path: Path to fingerprint matrix file.
+    :type matrix_path: str
+    :param shape: Expected shape of each fingerprint.
+    :type shape: Tuple[int, ...]
+    """
+    _worker_state.update(args=args, matrix_path=matrix_path, shape=shape)
+    configure_metrics(args.metrics, args.progress_interval, args.profile, args.profile_memory)
+    _warm_up(args)
+    take_counters()
+
+
+def _fingerprint_to_rows(task: Tuple[int, List[str]]) -> Tuple[int, List[str], Dict[str, List[float]]]:
+    """
+    Read and fingerprint consecutive files and write the fingerprints into rows of the fingerprint matrix.
+    Must be run in a process prepared with _init_worker.
+
+    :param task: Tuple of first row index and file paths.
+    :type task: Tuple[int, List[str]]
+    :return: Tuple containing first row index, file paths and the metrics counters of the task.
+    :rtype: Tuple[int, List[str], Dict[str, List[float]]]
+    """
+    index, file_paths = task
+    args = _worker_state["args"]
+    with worker_profile("fingerprint_files"):
+        results = _fingerprint_files(file_paths, args)
+        _write_rows(_worker_state["matrix_path"], index,
+                    _stack_fingerprints(results, _worker_state["shape"], args.dtype))
+    return index, [r[1] for r in results], take_counters()
+
+
+def _chunksize(args: Namespace, task_count: Union[int, None], processes: int) -> int:
+    """
+    Select number of tasks to hand to a pool process at a time.
+
+    :param args: Command line arguments.
+    :type args: argparse.Namespace
+    :param task_count: Total number of tasks. None if not known in advance.
+    :type task_count: Union[int, None]
+    :param processes: Number of pool processes.
+    :type processes: int
+    :return: Chunk size.
+    :rtype: int
+    """
+    if args.chunksize or task_count is None:
+        return args.chunksize or 1
+    chunksize, extra = divmod(task_count, processes * 4)
+    return max(1, chunksize + (1 if extra else 0))
+
+
+def _track_scan(files: Iterable[str], stage: Stage) -> Iterator[str]:
+    """
+    Record the scan of the input files as a stage and set the total of the fingerprinting stage once the number of
+    files is known.
+
+    :param files: Iterator over file paths.
+    :type files: Iterable[str]
+    :param stage: Fingerprinting stage.
+    :type stage: Stage
+    :return: Iterator over file paths.
+    :rtype: Iterator[str]
+    """
+    with Stage("scan") as scan:
+        for file_path in files:
+            scan.update()
+            yield file_path
+    stage.total = scan.items
+
+
+def _tasks(files: Iterator[str], index: int, step: int) -> Iterator[Tuple[int, List[str]]]:
+    """
+    Group files into fingerprinting tasks of consecutive rows.
+
+    :param files: Iterator over file paths.
+    :type files: Iterator[str]
+    :param index: Row index of the first file.
+    :type index: int
+    :param step: Number of files per task.
+    :type step: int
+    :return: Iterator over tuples of first row index and file paths.
+    :rtype: Iterator[Tuple[int, List[str]]]
+    """
+    while True:
+        file_paths = list(islice(files, step))
+        if not file_paths:
+            return
+        yield index, file_paths
+        index += len(file_paths)
+
+
+def _temp_dir(args: Namespace) -> str:
+    """
+    Folder to write fingerprint matrices to. The system temporary folder may be memory backed, so by default the
+    matrix is written next to the output file.
+
+    :param args: Command line arguments.
+    :type args: argparse.Namespace
+    :return: Path of the folder.
+    :rtype: str
+    """
+    return args.temp_dir or os.path.dirname(os.path.abspath(args.output_file))
+
+
+def _remove_temp_files() -> None:
+    """
+    Remove the matrix files written by _read_data_to_fingerprints. Arrays mapping the files must be released first,
+    since mapped files can not be removed on Windows. Files that can not be removed are reported and left in place.
+    """
+    while _temp_files:
+        path = _temp_files.pop()
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print("Could not remove temporary file {}: {}".format(path, e))
+
+
+def _read_data_to_fingerprints(args: Namespace, file_list: Iterable[str] = None) -> Tuple[np.ndarray, List[str]]:
     """
     Read audio files and generate fingerprint data asynchronously based on command line arguments.
 
+    Pool processes write fingerprints straight into rows of a matrix file so only file paths are passed back to the
+    main process. Files are handed to the pool as they are listed, so the total number of files does not need to be
+    known in advance and the matrix file grows as rows are written.
+
+    The matrix file is written to --temp_dir and stays in place while the returned array maps it. It is removed by
+    _remove_temp_files once the caller is done with the fingerprints.
+
     :param args: Command line arguments.
     :type args: argparse.Namespace
-    :return: Tuple with list of fingerprint data and a list of file paths.
-    :rtype: Tuple[List[numpy.ndarray], List[str]]]
+    :param file_list: Files to fingerprint. None to fingerprint all files in the input folder.
+    :type file_list: Iterable[str]
+    :return: Tuple with array of fingerprint data and a list of file paths.
+    :rtype: Tuple[numpy.ndarray, List[str]]]
 
     """
-    file_list = list(all_files(args.input_folder, [".wav"]))
-    max_to_read = min(len(file_list), args.max_to_load) if args.max_to_load else len(file_list)
-    with Pool() as p:
-        data = p.starmap(_read_and_fingerprint, [(f, args) for f in file_list[:max_to_read]])
-    results = [x[0] for x in data]
-    file_data = [x[1] for x in data]
-    return results, file_data
+    if args.batch_size and not args.duration:
+        raise ValueError("Batch fingerprinting needs samples of equal length. Set --duration.")
+    stage = Stage("fingerprint_files")
+    if file_list is None:
+        file_list = _track_scan(_list_input_files(args), stage)
+    step = args.batch_size or 1
+    task_count = None
+    if isinstance(file_list, Sized):
+        stage.total = len(file_list)
+        task_count = -(-len(file_list) // step) - 1
+    files = iter(file_list)
+    counters = {}
+    take_counters()
+    with stage:
+        first = _fingerprint_files(list(islice(files, step)), args)
+        if not first:
+            return np.empty((0,), dtype=args.dtype), []
+        add_counters(counters, take_counters())
+        stage.update(len(first), counters.get("decode", [0, 0, 0])[2])
+        shape = first[0][0].shape
+        fd, matrix_path = tempfile.mkstemp(suffix=".fingerprints", dir=_temp_dir(args))
+        os.close(fd)
+        _temp_files.append(matrix_path)
+        _write_rows(matrix_path, 0, _stack_fingerprints(first, shape, args.dtype))
+        file_data = {0: [r[1] for r in first]}
+        processes = args.workers or os.cpu_count() or 1
+        with create_pool(processes, args.maxtasksperchild, args.start_method, _init_worker,
+                         (args, matrix_path, shape)) as p:
+            for index, file_paths, task_counters in p.imap_unordered(
+                    _fingerprint_to_rows, _tasks(files, len(first), step), _chunksize(args, task_count, processes)):
+                file_data[index] = file_paths
+                add_counters(counters, task_counters)
+                stage.update(len(file_paths), task_counters.get("decode", [0, 0, 0])[2])
+            p.close()
+            p.join()
+        row_count = sum(len(file_paths) for file_paths in file_data.values())
+        matrix = np.memmap(matrix_path, dtype=args.dtype, mode="r+", shape=(row_count,) + shape)
+    record_counters(counters)
+    collect_worker_profiles("fingerprint_files")
+    return np.asarray(matrix), [path for index in sorted(file_data) for path in file_data[index]]
 
 
-def _run_dimensionality_reduction(data: List[np.ndarray], args: Namespace, file_data: List[str],
+def _run_dimensionality_reduction(data: Union[np.ndarray, FingerprintSource], args: Namespace, file_data: List[str],
                                   metadata: Dict[str, dict]) -> List[Tuple[np.ndarray, str]]:
     """
     Run 3d or 2d dimensionality reduction on data
 
     :param data: data to run dimensionality reduction on.
-    :type data: numpy.ndarray
+    :type data: Union[numpy.ndarray, FingerprintSource]
     :param args: Command line arguments
     :type args: argparse.Namespace
     :param file_data: List of file paths.
@@ -143,19 +701,204 @@ def _run_dimensionality_reduction(data: List[np.ndarray], args: Namespace, file_
     """
     output_dimensions = 2 if args.td else 3
     reduction_function = ProcessFunctions.dimensionality_reduction_dict[args.reduction_method]
-    return reduction_function(data, output_dimensions, args, a_func=_finalize, a_params=(args, file_data, metadata))
+    # The fingerprints are not used after reduction, so they may be scaled in place instead of copied
+    if args.init_embedding:
+        return reduction_function(data, output_dimensions, args, a_func=_finalize,
+                                  a_params=(args, file_data, metadata), overwrite_input=True,
+                                  init=load_embedding(args.init_embedding, file_data, output_dimensions))
+    return reduction_function(data, output_dimensions, args, a_func=_finalize, a_params=(args, file_data, metadata),
+                              overwrite_input=True)
+
+
+def _map_positions(map_data: Dict[str, Any]) -> Dict[str, List[float]]:
+    """
+    Get the positions of the files on a map read from a json output file.
+
+    :param map_data: Contents of the json file.
+    :type map_data: Dict[str, Any]
+    :return: Dictionary of file names and coordinates of their first point.
+    :rtype: Dict[str, List[float]]
+    """
+    positions = {}
+    for point in map_data["points"]:
+        positions.setdefault(point[3], point[:3])
+    return positions
 
 
-def load_fingerprints(args: Namespace) -> Tuple[List[np.ndarray], List[str]]:
+def _files_missing_from_map(args: Namespace, map_data: Dict[str, Any]) -> List[str]:
     """
-    Read previously calculated fingerprint data from file.
+    List the input files that are not on the map given with --project.
+
+    :param args: Command line arguments.
+    :type args: argparse.Namespace
+    :param map_data: Contents of the json file.
+    :type map_data: Dict[str, Any]
+    :return: List of file paths.
+    :rtype: List[str]
+    """
+    positions = _map_positions(map_data)
+    return [path for path in _list_input_files(args) if path.split("/")[-1] not in positions]
+
+
+def project(args: Namespace, results: Union[np.ndarray, FingerprintSource], file_data: List[str],
+            map_data: Dict[str, Any]) -> None:
+    """
+    Add files missing from the map given with --project to it without recomputing the map. Files are matched to
+    points by file name. New files are placed with the projection file of a PCA map if there is one, otherwise next
+    to their nearest fingerprints among the files already on the map. With --collect_metadata the tags of the map are
+    collected again for all of its points and recolored. The updated map is written to the output file.
+
+    :param args: Command line arguments.
+    :type args: argparse.Namespace
+    :param results: Fingerprint data with one row per file.
+    :type results: Union[numpy.ndarray, FingerprintSource]
+    :param file_data: List of file paths.
+    :type file_data: List[str]
+    :param map_data: Contents of the json file given with --project.
+    :type map_data: Dict[str, Any]
+    """
+    points = map_data["points"]
+    positions = _map_positions(map_data)
+    names = [path.split("/")[-1] for path in file_data]
+    known = [i for i in range(len(names)) if names[i] in positions]
+    new, seen = [], set(positions)
+    for i in range(len(names)):
+        if names[i] not in seen:
+            seen.add(names[i])
+            new.append(i)
+    with Stage("projection", unit="points") as stage:
+        if new:
+            data = np.asarray(results, dtype=args.dtype).reshape(len(file_data), -1)
+            sidecar = projection_path(args.project)
+            if os.path.isfile(sidecar):
+                x_nd = linear_projection(data[new], sidecar)
+            elif known:
+                x_nd = knn_projection(data[known], np.asarray([positions[names[i]] for i in known]), data[new],
+                                      args.project_neighbors)
+            else:
+                raise ValueError("None of the files are on {}, so new files can not be placed.".format(args.project))
+            for i, x in zip(new, x_nd):
+                points.append([float(x[0]), float(x[1]), 0 if len(x) < 3 else float(x[2]), names[i]])
+        map_data["totalPoints"] = len(points)
+        stage.update(len(new))
+    if args.collect_metadata:
+        with Stage("coloring projection", unit="points") as stage:
+            map_data["tags"] = parse_metadata(args, {points[i][3]: i for i in reversed(range(len(points)))})
+            add_color(map_data["tags"], np.asarray([point[:3] for point in points]))
+            stage.update(len(points))
+    with open(args.output_file, 'w') as outfile:
+        json.dump(map_data, outfile)
+    print("Added {} files to {} and wrote data to {}.".format(len(new), args.project, args.output_file))
+
+
+def load_fingerprints(args: Namespace) -> Tuple[FingerprintSource, List[str]]:
+    """
+    Read previously calculated fingerprint data from file. The data is not converted to a matrix until a stage reads
+    it, and a 'matrix' store stays memory mapped, so stages working in chunks can use files larger than memory.
 
     :param args: Command line arguments
     :type args: argparse.Namespace
-    :return: Tuple of a list of fingerprint data and list of paths.
-    :rtype: Tuple[List[numpy.ndarray], List[str]]
+    :return: Tuple of fingerprint data and list of paths.
+    :rtype: Tuple[FingerprintSource, List[str]]
+    """
+    with Stage("load") as stage:
+        loader = ProcessFunctions.fingerprint_loader[args.format]
+        if args.format in ("csv", "tsv"):
+            # Text values are parsed straight into a matrix of the selected float type instead of being converted later
+            loader = partial(loader, dtype=args.dtype)
+        results, file_data = loader(args.fingerprint_input)
+        results = FingerprintSource(results, args.dtype, args.rows_per_chunk)
+        stage.update(len(file_data), results.nbytes)
+    return results, file_data
+
+
+def merge_fingerprints(args: Namespace) -> Tuple[np.ndarray, List[str]]:
+    """
+    Concatenate fingerprint stores written by shards and optionally save the result to disk.
+
+    :param args: Command line arguments.
+    :type args: argparse.Namespace
+    :return: Tuple of fingerprint data and list of file paths.
+    :rtype: Tuple[numpy.ndarray, List[str]]
+    """
+    parts, file_data = [], []
+    with Stage("merge") as stage:
+        for store in args.merge:
+            store_results, store_files = load_fingerprint_store(store)
+            if not store_files:
+                continue
+            part = np.asarray(store_results, dtype=args.dtype).reshape(len(store_files), -1)
+            stage.update(len(store_files), part.nbytes)
+            if parts and part.shape[1] != parts[0].shape[1]:
+                raise ValueError("Fingerprints in {} do not match fingerprints in {}.".format(store, args.merge[0]))
+            parts.append(part)
+            file_data += store_files
+    if len(set(file_data)) != len(file_data):
+        raise ValueError("Fingerprint stores contain the same files more than once.")
+    results = np.concatenate(parts) if parts else np.empty(0, dtype=args.dtype)
+    print("Merged {} fingerprints from {} stores.".format(len(file_data), len(args.merge)))
+    if args.fingerprint_output:
+        ProcessFunctions.fingerprint_writer[args.output_format](args.fingerprint_output, results, file_data)
+        print("Wrote fingerprint data to {}.".format(args.fingerprint_output))
+    return results, file_data
+
+
+def _split_incremental(store_path: str, file_list: List[str]) -> Tuple[List[np.ndarray], List[str], List[str]]:
+    """
+    Compare files to fingerprint against the contents of an existing fingerprint store.
+
+    :param store_path: Path to '.npy' or 'matrix' fingerprint store.
+    :type store_path: str
+    :param file_list: Files to fingerprint.
+    :type file_list: List[str]
+    :return: Tuple of stored fingerprints and paths of files that still exist and a list of files missing from the
+             store.
+    :rtype: Tuple[List[numpy.ndarray], List[str], List[str]]
+    """
+    if not os.path.isfile(store_path):
+        return [], [], file_list
+    stored_results, stored_files = load_fingerprint_store(store_path)
+    present = set(file_list)
+    keep = [i for i in range(len(stored_files)) if stored_files[i] in present]
+    stored = set(stored_files)
+    return [stored_results[i] for i in keep], [stored_files[i] for i in keep], [f for f in file_list if f not in stored]
+
+
+def _feature_runs(results: Union[np.ndarray, FingerprintSource],
+                  args: Namespace) -> List[Tuple[Namespace, Union[np.ndarray, FingerprintSource]]]:
+    """
+    Split fingerprints computed with --features into a fingerprint for each feature unless they are fused. Each
+    feature gets a copy of the command line arguments with the feature name added to its output files.
+
+    :param results: Fingerprint data with one row per file.
+    :type results: Union[numpy.ndarray, FingerprintSource]
+    :param args: Command line arguments.
+    :type args: argparse.Namespace
+    :return: List of tuples containing command line arguments and fingerprint data for each reduction run.
+    :rtype: List[Tuple[argparse.Namespace, Union[numpy.ndarray, FingerprintSource]]]
     """
-    return ProcessFunctions.fingerprint_loader[args.format](args.fingerprint_input)
+    if not args.features or args.fuse or not len(results):
+        return [(args, results)]
+    widths = [feature_rows[method] * frame_count for method in args.features]
+    if results.shape[1] != sum(widths):
+        raise ValueError("Fingerprints do not match features {}.".format(", ".join(args.features)))
+    runs = []
+    start = 0
+    for method, width in zip(args.features, widths):
+        method_args = Namespace(**vars(args))
+        method_args.fingerprint_method = method
+        method_args.features = None
+        method_args.output_file = insert_suffix(args.output_file, method + "_")
+        if args.plot_output:
+            method_args.plot_output = insert_suffix(args.plot_output, method + "_")
+        if args.fingerprint_output:
+            method_args.fingerprint_output = insert_suffix(args.fingerprint_output, "_" + method)
+        if isinstance(results, FingerprintSource):
+            runs.append((method_args, results.columns(start, start + width)))
+        else:
+            runs.append((method_args, results[:, start:start + width]))
+        start += width
+    return runs
 
 
 def generate_fingerprints(args: Namespace) -> Tuple[List[np.ndarray], List[str]]:
@@ -167,14 +910,43 @@ def generate_fingerprints(args: Namespace) -> Tuple[List[np.ndarray], List[str]]
     :return: Tuple of a list of fingerprint data and list of file paths.
     :rtype: Tuple[List[np.ndarray], List[str]]
     """
-    results, file_data = _read_data_to_fingerprints(args)
-    results = np.asarray(results).astype(np.float64)
+    cache = _make_cache(args)
+    for method in args.invalidate_cache:
+        if cache:
+            cache.invalidate(method)
+            print("Invalidated cached {} fingerprints.".format(method))
+    stored_results, stored_files = [], []
+    if args.incremental:
+        # The store is compared against all input files, so --max_to_load only limits how many new files are added
+        # and never drops stored fingerprints outside the first files
+        stored_results, stored_files, new_files = _split_incremental(args.incremental,
+                                                                     list(_list_input_files(args, limit=False)))
+        new_files = new_files[:args.max_to_load or None]
+        print("Found {} stored and {} new files.".format(len(stored_files), len(new_files)))
+        results, file_data = _read_data_to_fingerprints(args, new_files)
+    else:
+        results, file_data = _read_data_to_fingerprints(args)
+    if cache and cache.max_size:
+        print("Evicted {} fingerprints from cache.".format(cache.evict()))
+    results = np.asarray(results, dtype=args.dtype)
     print("Read and fingerprinted {} files.".format(len(file_data)))
     if len(results.shape) > 2:
         results = results.reshape(len(results), -1)
-    if args.fingerprint_output:
-        np.save(args.fingerprint_output, [(file_data[i], results[i]) for i in range(len(results))])
-        print("Wrote fingerprint data to {}.".format(args.fingerprint_output))
+    if stored_files:
+        stored = np.asarray(stored_results, dtype=args.dtype).reshape(len(stored_files), -1)
+        if len(results) and results.shape[1] != stored.shape[1]:
+            raise ValueError("Fingerprints in {} do not match the selected fingerprinting method."
+                             .format(args.incremental))
+        results = np.concatenate([stored, results]) if len(results) else stored
+        file_data = stored_files + file_data
+    if args.incremental:
+        ProcessFunctions.fingerprint_writer[args.output_format](args.incremental, results, file_data)
+        print("Wrote {} fingerprints to {}.".format(len(file_data), args.incremental))
+    for run_args, run_results in _feature_runs(results, args):
+        if run_args.fingerprint_output:
+            ProcessFunctions.fingerprint_writer[args.output_format](run_args.fingerprint_output, run_results,
+                                                                    file_data)
+            print("Wrote fingerprint data to {}.".format(run_args.fingerprint_output))
     return results, file_data
 
 
@@ -182,15 +954,62 @@ def main(args: Namespace) -> None:
     """
     Run analysis and reduction based on command line parameters
 
+    :param args: parsed command line argument object
+    :type args: argparse.Namespace
+    """
+    try:
+        _crunch(args)
+    finally:
+        # The fingerprints mapping the matrix files were local to _crunch and are released once it returns
+        _remove_temp_files()
+
+
+def _crunch(args: Namespace) -> None:
+    """
+    Run analysis and reduction based on command line parameters. Called by main, which removes the temporary files
+    afterwards.
+
     :param args: parsed command line argument object
     :type args: argparse.Namespace
     """
     t = time.time()
-    results, file_data = load_fingerprints(args) if args.fingerprint_input else generate_fingerprints(args)
+    configure_metrics(args.metrics, args.progress_interval, args.profile, args.profile_memory)
+    if args.shard and not (args.fingerprint_output or args.incremental):
+        raise ValueError("Shards are written to fingerprint stores. Set --fingerprint_output.")
+    if args.chain and args.parallel:
+        raise ValueError("--chain runs perplexities one after another and can not be combined with --parallel.")
+    if args.init_embedding and args.reduction_method != "tsne":
+        raise ValueError("--init_embedding can only be used with t-SNE.")
+    if args.project and args.features and not args.fuse:
+        raise ValueError("--project places files with one fingerprint. Set --fuse to use --features.")
+    map_data = None
+    if args.project:
+        with open(args.project) as in_file:
+            map_data = json.load(in_file)
+    if args.fingerprint_input:
+        results, file_data = load_fingerprints(args)
+    elif args.merge:
+        results, file_data = merge_fingerprints(args)
+    elif args.project and not args.incremental and os.path.isfile(projection_path(args.project)):
+        # A PCA map places every file on its own, so files already on the map do not need to be fingerprinted
+        results, file_data = _read_data_to_fingerprints(args, _files_missing_from_map(args, map_data))
+    else:
+        results, file_data = generate_fingerprints(args)
+    if args.shard:
+        print("Fingerprinted shard {} of {} in ".format(*args.shard), int(time.time() - t), " seconds")
+        return
+    if args.project:
+        project(args, results, file_data, map_data)
+        print("Projection completed in ", int(time.time() - t), " seconds")
+        return
     metadata = {}
     if args.collect_metadata:
         metadata = parse_metadata(args, {file_data[i].split('/')[-1]: i for i in range(len(file_data))})
-    _run_dimensionality_reduction(results, args, file_data, metadata)
+    for run_args, run_results in _feature_runs(results, args):
+        _run_dimensionality_reduction(run_results, run_args, file_data, metadata)
+    total = Stage("total", start=t)
+    total.update(len(file_data))
+    total.close()
     print("Crunching completed in ", int(time.time() - t), " seconds")
 
 
@@ -231,7 +1050,7 @@ def _make_header(args: Namespace, point_count: int, suffix: str) -> Dict[str, An
     :rtype: Dict[str, NoneType]
     """
     return {"soundInfo": args.sound_info, "dataSet": args.data_set,
-            "processingMethod": "{} - {}, {}".format(args.fingerprint_method, args.reduction_method, suffix),
+            "processingMethod": "{} - {}, {}".format(_method_name(args), args.reduction_method, suffix),
             "colorBy": args.colorby, "totalPoints": point_count}
 
 
@@ -258,7 +1077,7 @@ def collect(data: List[str], x_nd: np.ndarray, metadata: Dict[str, dict], args:
     lst = []
     for i in range(len(data)):
         fn = data[i].split("/")[-1]
-        lst.append([x_nd[i][0], x_nd[i][1], 0 if len(x_nd[i]) < 3 else x_nd[i][2], fn])
+        lst.append([float(x_nd[i][0]), float(x_nd[i][1]), 0 if len(x_nd[i]) < 3 else float(x_nd[i][2]), fn])
     out_data["points"] = lst
     return out_data
 
@@ -272,9 +1091,18 @@ class ProcessFunctions:
     dimensionality_reduction_dict = {"pca": pca,
                                      "tsne": t_sne}
 
+    batch_fingerprint_dict = {"fft": fft_batch_fingerprint,
+                              "chroma": chroma_batch_fingerprint,
+                              "ms": ms_batch_fingerprint,
+                              "mfcc": mfcc_batch_fingerprint}
+
     fingerprint_loader = {"npy": load_numpy_fingerprints,
+                          "matrix": load_matrix_fingerprints,
                           "csv": load_csv_fingerprints,
                           "tsv": load_tsv_fingerprints}
 
+    fingerprint_writer = {"npy": save_numpy_fingerprints,
+                          "matrix": save_matrix_fingerprints}
+
 if __name__ == "__main__":
     main(_arg_parse().parse_args())
@@ -3,9 +3,24 @@ Provides processing functions for the top level application
 """
 __all__ = ["t_sne", "plot_results", "collect_data", "load_sample", "ms_fingerprint",
            "chroma_fingerprint", "fft_fingerprint", "pca", "tonnez_fingerprint", "mfcc_fingerprint",
-           "load_csv_fingerprints", "load_numpy_fingerprints", "load_tsv_fingerprints"]
+           "load_csv_fingerprints", "load_numpy_fingerprints", "load_tsv_fingerprints", "FingerprintCache",
+           "save_numpy_fingerprints", "fft_batch_fingerprint", "ms_batch_fingerprint", "chroma_batch_fingerprint",
+           "mfcc_batch_fingerprint", "frame_count", "feature_rows", "spectral_fingerprint",
+           "spectral_batch_fingerprint", "scan_manifest", "read_manifest", "ManifestEntry",
+           "save_matrix_fingerprints", "load_matrix_fingerprints", "load_fingerprint_store",
+           "load_delimited_fingerprints", "FingerprintSource", "load_embedding",
+           "projection_path", "save_projection", "linear_projection", "knn_projection"]
 from subprocesses.fingerprint import fft_fingerprint, mfcc_fingerprint, \
-    ms_fingerprint, chroma_fingerprint, tonnez_fingerprint
+    ms_fingerprint, chroma_fingerprint, tonnez_fingerprint, fft_batch_fingerprint, ms_batch_fingerprint, \
+    chroma_batch_fingerprint, mfcc_batch_fingerprint, frame_count, feature_rows, spectral_fingerprint, \
+    spectral_batch_fingerprint
 from subprocesses.dimensionality_reduction import t_sne, plot_results, pca
 from subprocesses.collect_data import load_sample
-from subprocesses.fingerprint_loader import load_csv_fingerprints, load_numpy_fingerprints, load_tsv_fingerprints
+from subprocesses.fingerprint_loader import load_csv_fingerprints, load_numpy_fingerprints, load_tsv_fingerprints, \
+    save_numpy_fingerprints, save_matrix_fingerprints, load_matrix_fingerprints, load_fingerprint_store, \
+    load_delimited_fingerprints
+from subprocesses.fingerprint_source import FingerprintSource
+from subprocesses.embedding import load_embedding, projection_path, save_projection, linear_projection, \
+    knn_projection
+from subprocesses.fingerprint_cache import FingerprintCache
+from subprocesses.manifest import scan_manifest, read_manifest, ManifestEntry
@@ -6,7 +6,8 @@ import scipy.io.wavfile as wf
 
 def load_sample(file_path: str, max_duration: int = 0) -> Tuple[str, np.ndarray, int, int]:
     """
-    Load wave file data into numpy array
+    Load wave file data into numpy array. The file is memory mapped when possible so only the frames used from the
+    first channel are read from disk. They are copied out of the mapping, so no file stays open after returning.
     :param file_path: Path to .wav file.
     :type file_path: str
     :param max_duration: Maximum length of audio to load. 0 to load entire sample.
@@ -14,10 +15,15 @@ def load_sample(file_path: str, max_duration: int = 0) -> Tuple[str, np.ndarray,
     :return: Tuple containing file path, numpy array, sample length and samlpe rate.
     :rtype: Tuple[str, numpy.ndarray, int, int]
     """
-    sr, audio = wf.read(file_path)
-    max_samples = (sr * max_duration) // 1000
+    try:
+        sr, audio = wf.read(file_path, mmap=True)
+    except ValueError:
+        sr, audio = wf.read(file_path)
+    if max_duration:
+        audio = audio[:(sr * max_duration) // 1000]
     if len(audio.shape) > 1:
-        audio = np.asarray([x[0] for x in audio])
-    if max_duration and len(audio) > max_samples:
-        audio = np.resize(audio, max_samples)
+        audio = audio[:, 0]
+    # A view would keep the memory map and its file descriptor alive, which runs out of descriptors when a batch of
+    # samples is held at once
+    audio = np.array(audio)
     return file_path, audio, len(audio), sr
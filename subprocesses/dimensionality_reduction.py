@@ -1,21 +1,231 @@
 import os
-from multiprocessing.pool import Pool
+import tempfile
 from argparse import Namespace
+from functools import partial
+from multiprocessing.pool import Pool
 from typing import Iterable, Any, Tuple, List, Dict, Union, Callable
 
 import numpy as np
 from matplotlib import pyplot as plt
+from scipy.sparse import csr_matrix, issparse
 from sklearn.manifold import TSNE
-from sklearn.decomposition import PCA
+from sklearn.decomposition import PCA, IncrementalPCA
+from sklearn.metrics import pairwise_distances
+from sklearn.neighbors import NearestNeighbors
 from sklearn.preprocessing import StandardScaler
 
+from subprocesses.fingerprint_source import FingerprintSource
 from utils import *
 
+BARNES_HUT_BYTES_PER_NEIGHBOR = 96
+
+
+def _fit_scaler(source: FingerprintSource) -> StandardScaler:
+    """
+    Compute scaling statistics of fingerprint data one chunk at a time.
+
+    :param source: Fingerprint data.
+    :type source: FingerprintSource
+    :return: Fitted scaler.
+    :rtype: StandardScaler
+    """
+    scaler = StandardScaler()
+    for chunk in source.chunks():
+        scaler.partial_fit(chunk)
+    return scaler
+
+
+def _scale(data: Union[np.ndarray, FingerprintSource], args: Namespace = None,
+           overwrite_input: bool = False) -> Tuple[np.ndarray, StandardScaler]:
+    """
+    Standardize data to zero mean and unit variance in the float type selected by the command line arguments.
+    Arrays converted to another float type are scaled in place, as are writable input arrays if overwrite_input is
+    set, to avoid another copy of the data. A FingerprintSource is scaled one chunk at a time into a new matrix, so
+    its unscaled data is never held in memory as a whole.
+
+    :param data: numpy array of shape (n, m) containing n m-dimensional vectors.
+    :type data: Union[numpy.ndarray, FingerprintSource]
+    :param args: Command line parameters.
+    :type args: argparse.Namespace
+    :param overwrite_input: Whether a writable input array may be scaled in place.
+    :type overwrite_input: bool
+    :return: Tuple of scaled data and the fitted scaler.
+    :rtype: Tuple[numpy.ndarray, StandardScaler]
+    """
+    print("Scaling data.")
+    with Stage("scaling", unit="rows") as stage:
+        if isinstance(data, FingerprintSource):
+            scaler = _fit_scaler(data)
+            scaled = np.empty(data.shape, dtype=data.dtype)
+            start = 0
+            for chunk in data.chunks():
+                scaled[start:start + len(chunk)] = scaler.transform(chunk)
+                start += len(chunk)
+            data = scaled
+        else:
+            array = np.asarray(data, dtype=args.dtype if args else np.float64)
+            owned = not isinstance(data, np.ndarray) or not np.may_share_memory(array, data)
+            scaler = StandardScaler(copy=not ((owned or overwrite_input) and array.flags.writeable))
+            data = scaler.fit_transform(array)
+        stage.update(len(data), data.nbytes)
+    return data, scaler
+
+
+def _tsne_method(args: Namespace, rows: int) -> str:
+    """
+    Choose the t-SNE gradient method. 'auto' selects the exact method up to --tsne_exact_limit rows and Barnes-Hut
+    above it, since exact t-SNE needs time and memory quadratic in the number of rows.
+
+    :param args: Command line parameters.
+    :type args: argparse.Namespace
+    :param rows: Number of rows to reduce.
+    :type rows: int
+    :return: Method name for sklearn.manifold.TSNE.
+    :rtype: str
+    """
+    if not args or args.tsne_method == "exact":
+        return "exact"
+    if args.tsne_method == "barnes_hut" or rows > args.tsne_exact_limit:
+        return "barnes_hut"
+    return "exact"
+
+
+def _neighbor_distances(data: np.ndarray, method: str, perplexity: int,
+                        args: Namespace = None) -> Union[np.ndarray, csr_matrix]:
+    """
+    Compute the input distances t-SNE needs for a perplexity and every smaller perplexity. Exact t-SNE uses all
+    pairwise distances. Barnes-Hut t-SNE only uses the 3 * perplexity + 1 nearest neighbours of each point, so a
+    neighbour graph for the largest perplexity contains the neighbours of all smaller perplexities.
+
+    :param data: numpy array of shape (n, m) containing n m-dimensional vectors.
+    :type data: numpy.ndarray
+    :param method: t-SNE method, 'exact' or 'barnes_hut'.
+    :type method: str
+    :param perplexity: Largest perplexity the distances are used for.
+    :type perplexity: int
+    :param args: Command line parameters.
+    :type args: argparse.Namespace
+    :return: Dense matrix of euclidean distances for 'exact', sparse nearest neighbour graph for 'barnes_hut'.
+    :rtype: Union[numpy.ndarray, scipy.sparse.csr_matrix]
+    """
+    with Stage("neighbors", unit="rows") as stage:
+        if method == "exact":
+            distances = pairwise_distances(data)
+        else:
+            # The graph includes each point as its own nearest neighbour, which sklearn expects of precomputed
+            # graphs of the training data
+            knn = NearestNeighbors(n_neighbors=min(len(data), int(3 * perplexity + 1) + 1),
+                                   n_jobs=(args.workers or -1) if args else None)
+            distances = knn.fit(data).kneighbors_graph(data, mode="distance")
+        stage.update(len(data), data.nbytes)
+    return distances
+
+
+def _pre_pca(data: np.ndarray, dimensions: int) -> np.ndarray:
+    """
+    Project scaled data onto its first principal components with a randomized solver before t-SNE. Distance and
+    neighbour computations then work on the projected data, whose cost scales with its much lower dimensionality.
+
+    :param data: numpy array of shape (n, m) containing n m-dimensional vectors.
+    :type data: numpy.ndarray
+    :param dimensions: Number of principal components to keep. Data with as many columns or less is returned as is.
+    :type dimensions: int
+    :return: Projected data.
+    :rtype: numpy.ndarray
+    """
+    if dimensions >= min(data.shape):
+        return data
+    print("Projecting data to {} dimensions.".format(dimensions))
+    with Stage("pre-PCA", unit="rows") as stage:
+        projected = PCA(n_components=dimensions, svd_solver="randomized").fit_transform(data)
+        stage.update(len(data), data.nbytes)
+    return projected
+
+
+def _pca_init(data: np.ndarray, no_dims: int) -> np.ndarray:
+    """
+    Compute the PCA initialization sklearn uses for t-SNE, which it can not compute itself from precomputed
+    distances.
+
+    :param data: numpy array of shape (n, m) containing n m-dimensional vectors.
+    :type data: numpy.ndarray
+    :param no_dims: Number of output dimensions.
+    :type no_dims: int
+    :return: Initial embedding of shape (n, no_dims).
+    :rtype: numpy.ndarray
+    """
+    x_nd = PCA(n_components=no_dims, svd_solver="randomized").fit_transform(data).astype(np.float32, copy=False)
+    return x_nd / np.std(x_nd[:, 0]) * 1e-4
+
+
+def _rescale_init(x_nd: np.ndarray) -> np.ndarray:
+    """
+    Scale an initial embedding the way sklearn scales its PCA initialization, to a standard deviation of 1e-4 in the
+    first dimension. Dimensions without variance, e.g. the third dimension of a 2d map, get small random values
+    instead, since t-SNE can not move points apart in a dimension in which they all coincide.
+
+    :param x_nd: Initial embedding of shape (n, no_dims).
+    :type x_nd: numpy.ndarray
+    :return: Scaled embedding.
+    :rtype: numpy.ndarray
+    """
+    x_nd = np.array(x_nd, dtype=np.float32)
+    x_nd -= x_nd.mean(axis=0)
+    std = np.std(x_nd[:, 0])
+    x_nd *= 1e-4 / std if std else 1.0
+    flat = np.std(x_nd, axis=0) == 0
+    x_nd[:, flat] = 1e-4 * np.random.standard_normal((len(x_nd), int(flat.sum())))
+    return x_nd
+
+
+def _fill_missing(init: np.ndarray, data: np.ndarray) -> np.ndarray:
+    """
+    Place points without an initial position at the position of their nearest neighbour in the data that has one.
+
+    :param init: Initial embedding with NaN rows for points without a position.
+    :type init: numpy.ndarray
+    :param data: numpy array of shape (n, m) containing n m-dimensional vectors.
+    :type data: numpy.ndarray
+    :return: Initial embedding with a position for every point.
+    :rtype: numpy.ndarray
+    """
+    missing = np.isnan(init).any(axis=1)
+    if not missing.any():
+        return init
+    if missing.all():
+        raise ValueError("None of the files are in the initial embedding.")
+    print("Placing {} points missing from the initial embedding next to their nearest neighbours.".format(
+        int(missing.sum())))
+    known = np.flatnonzero(~missing)
+    nearest = NearestNeighbors(n_neighbors=1).fit(data[known]).kneighbors(data[missing], return_distance=False)
+    init = init.copy()
+    init[missing] = init[known[nearest[:, 0]]]
+    return init
+
+
+def _warm_start_params(args: Namespace) -> Dict[str, Any]:
+    """
+    Get TSNE parameters for a run started from an existing embedding. Early exaggeration is turned off, since it
+    pulls clusters apart to form the global layout the existing embedding already has.
+
+    :param args: Command line parameters.
+    :type args: argparse.Namespace
+    :return: Dictionary of sklearn.manifold.TSNE parameters.
+    :rtype: Dict[str, Any]
+    """
+    params = {"early_exaggeration": 1.0}
+    if args and args.warm_iterations:
+        params["max_iter"] = args.warm_iterations
+    return params
+
 
-def t_sne(data: np.ndarray, no_dims: int = 3, args: Namespace = None,
-          a_func: Callable = None, a_params: Iterable[Any] = None) -> List[Tuple[np.ndarray, str]]:
+def t_sne(data: np.ndarray, no_dims: int = 3, args: Namespace = None, a_func: Callable = None,
+          a_params: Iterable[Any] = None, init: np.ndarray = None,
+          overwrite_input: bool = False) -> List[Tuple[np.ndarray, str]]:
     """
-    Run t-SNE dimensionality reduction on data.
+    Run t-SNE dimensionality reduction on data. Distances between points and the initial embedding are computed
+    once and shared by all perplexities. With --chain the perplexities are run one after another, each starting
+    from the embedding of the previous one. The input is left unchanged unless overwrite_input is set.
 
     :param data: numpy array of shape (n, m) containing n m-dimensional vectors.
     :type data: numpy.ndarray
@@ -27,28 +237,188 @@ def t_sne(data: np.ndarray, no_dims: int = 3, args: Namespace = None,
     :type a_func: Callable
     :param a_params: Parameters to be appended to a_func call after dimensionality reduction.
     :type a_params: Iterable[Any]
+    :param init: Initial embedding of shape (n, no_dims), e.g. read with load_embedding. Rows of NaN are placed next
+                 to their nearest neighbour. None to initialize as selected by --tsne_init.
+    :type init: numpy.ndarray
+    :param overwrite_input: Whether data may be scaled in place to save memory, which leaves it standardized.
+    :type overwrite_input: bool
     :return: List of tuples containing dimensionally reduced data and perplexity string.
     :rtype: List[Tuple[numpy.ndarray, str]]
     """
     perplexity = args.perplexity if args else [30]
-    print("Scaling data.")
-    data = StandardScaler().fit_transform(data)
+    data = _scale(data, args, overwrite_input)[0]
+    if args and args.pre_pca:
+        data = _pre_pca(data, args.pre_pca)
+    method = _tsne_method(args, len(data))
+    angle = args.angle if args else 0.5
+    distances = _neighbor_distances(data, method, max(perplexity), args)
+    params = None
+    if init is not None:
+        init = _rescale_init(_fill_missing(init, data))
+        params = _warm_start_params(args)
+    elif not args or args.tsne_init == "pca":
+        init = _pca_init(data, no_dims)
+    else:
+        init = "random"
     if args and args.parallel:
-        with Pool() as p:
-            l_nd = list(p.starmap(_t_sne_job, [(data, x, no_dims, a_func, a_params) for x in perplexity]))
+        shared = _share_distances(distances)
+        try:
+            with create_pool(args.workers, args.maxtasksperchild, args.start_method,
+                             partial(configure_metrics, **metrics_settings())) as p:
+                jobs = [(shared, x, no_dims, a_func, a_params, method, angle, init, params) for x in perplexity]
+                estimates = [_job_memory(len(data), method, x, no_dims) for x in perplexity]
+                l_nd = _schedule(p, _t_sne_shared_job, jobs, estimates, args.max_memory * 1024 ** 2)
+        finally:
+            for path in shared:
+                os.remove(path)
     else:
         l_nd = []
         for p in perplexity:
-            l_nd.append(_t_sne_job(data, p, no_dims, a_func, a_params))
+            l_nd.append(_t_sne_job(distances, p, no_dims, a_func, a_params, method, angle, "precomputed", init,
+                                   params))
+            if args and args.chain:
+                init = _rescale_init(l_nd[-1][0])
+                params = _warm_start_params(args)
     return l_nd
 
 
-def _t_sne_job(data: np.ndarray, perplexity: int, no_dims: int,
-               a_func: Callable = None, a_params: Iterable[Any] = None) -> Tuple[np.ndarray, str]:
+def _share_distances(distances: Union[np.ndarray, csr_matrix]) -> Tuple[str, ...]:
+    """
+    Write distances to temporary numpy files that pool processes memory map, so the distances exist in memory only
+    once however many processes use them. The caller removes the files.
+
+    :param distances: Distances computed by _neighbor_distances.
+    :type distances: Union[numpy.ndarray, scipy.sparse.csr_matrix]
+    :return: Path of a dense matrix or paths of the data, indices and index pointer arrays of a sparse matrix.
+    :rtype: Tuple[str, ...]
+    """
+    arrays = [distances.data, distances.indices, distances.indptr] if issparse(distances) else [distances]
+    paths = []
+    try:
+        for array in arrays:
+            fd, path = tempfile.mkstemp(suffix=".npy")
+            os.close(fd)
+            paths.append(path)
+            np.save(path, array)
+    except BaseException:
+        for path in paths:
+            os.remove(path)
+        raise
+    return tuple(paths)
+
+
+def _load_distances(paths: Tuple[str, ...]) -> Union[np.ndarray, csr_matrix]:
+    """
+    Memory map distances written by _share_distances.
+
+    :param paths: Paths returned by _share_distances.
+    :type paths: Tuple[str, ...]
+    :return: Read only distances.
+    :rtype: Union[numpy.ndarray, scipy.sparse.csr_matrix]
+    """
+    arrays = [np.load(path, mmap_mode="r") for path in paths]
+    if len(arrays) == 1:
+        return arrays[0]
+    return csr_matrix(tuple(arrays), shape=(len(arrays[2]) - 1,) * 2)
+
+
+def _job_memory(rows: int, method: str, perplexity: int, no_dims: int) -> int:
+    """
+    Estimate peak memory use of a t-SNE job on precomputed distances, not counting the memory of the process itself
+    or the shared distances. Exact t-SNE holds about four and a half float64 matrices of rows x rows values at its
+    peak, one of them the copy of the distances _t_sne_job makes for sklearn to square in place. Barnes-Hut uses the
+    shared neighbour graph without copying it and holds about a dozen values per neighbour of each point.
+
+    :param rows: Number of rows to reduce.
+    :type rows: int
+    :param method: t-SNE method, 'exact' or 'barnes_hut'.
+    :type method: str
+    :param perplexity: Perplexity of the job.
+    :type perplexity: int
+    :param no_dims: Number of output dimensions.
+    :type no_dims: int
+    :return: Estimated peak memory use in bytes.
+    :rtype: int
+    """
+    if method == "exact":
+        return 36 * rows * rows
+    return BARNES_HUT_BYTES_PER_NEIGHBOR * rows * min(rows, int(3 * perplexity + 1) + 1) + 64 * rows * no_dims
+
+
+def _schedule(pool: Pool, function: Callable, jobs: List[Tuple], estimates: List[int], budget: int) -> List[Any]:
+    """
+    Run jobs in a pool, starting a job only if the estimated memory use of all running jobs stays within a budget.
+    A job that does not fit the budget on its own is run alone.
+
+    :param pool: Process pool to run jobs in.
+    :type pool: multiprocessing.pool.Pool
+    :param function: Function to call with the arguments of each job.
+    :type function: Callable
+    :param jobs: List of argument tuples.
+    :type jobs: List[Tuple]
+    :param estimates: Estimated peak memory use of each job in bytes.
+    :type estimates: List[int]
+    :param budget: Memory budget in bytes. 0 for no limit.
+    :type budget: int
+    :return: List of job results in the order of the jobs.
+    :rtype: List[Any]
+    """
+    results = [None] * len(jobs)
+    pending = list(range(len(jobs)))
+    running = {}
+    while pending or running:
+        while pending and (not running or not budget or
+                           sum(estimates[i] for i in running) + estimates[pending[0]] <= budget):
+            i = pending.pop(0)
+            if budget and estimates[i] > budget:
+                print("Job {} needs about {:.0f} MB, which exceeds --max_memory.".format(i, estimates[i] / 1024 ** 2))
+            running[i] = pool.apply_async(function, jobs[i])
+        next(iter(running.values())).wait(0.1)
+        for i in [i for i in running if running[i].ready()]:
+            results[i] = running.pop(i).get()
+    return results
+
+
+def _t_sne_shared_job(paths: Tuple[str, ...], perplexity: int, no_dims: int, a_func: Callable = None,
+                      a_params: Iterable[Any] = None, method: str = "exact", angle: float = 0.5,
+                      init: Union[str, np.ndarray] = "random",
+                      params: Dict[str, Any] = None) -> Tuple[np.ndarray, str]:
+    """
+    Run _t_sne_job on distances written by _share_distances.
+
+    :param paths: Paths returned by _share_distances.
+    :type paths: Tuple[str, ...]
+    :param perplexity: Perplexity to run t-SNE with.
+    :type perplexity: int
+    :param no_dims: Number of output dimensions.
+    :type no_dims: int
+    :param a_func: Function to call with reduced data and a_params after reduction.
+    :type a_func: Callable
+    :param a_params: Parameters to be appended to a_func call after dimensionality reduction.
+    :type a_params: Iterable[Any]
+    :param method: Gradient calculation method, 'exact' or 'barnes_hut'.
+    :type method: str
+    :param angle: Barnes-Hut trade-off between speed (larger) and accuracy (smaller).
+    :type angle: float
+    :param init: Initialization, 'random' or an initial embedding.
+    :type init: Union[str, numpy.ndarray]
+    :param params: Additional parameters of sklearn.manifold.TSNE.
+    :type params: Dict[str, Any]
+    :return: Tuple containing dimensionally reduced data and perplexity string.
+    :rtype: Tuple[numpy.ndarray, str]
+    """
+    return _t_sne_job(_load_distances(paths), perplexity, no_dims, a_func, a_params, method, angle, "precomputed",
+                      init, params)
+
+
+def _t_sne_job(data: Union[np.ndarray, csr_matrix], perplexity: int, no_dims: int, a_func: Callable = None,
+               a_params: Iterable[Any] = None, method: str = "exact", angle: float = 0.5, metric: str = "euclidean",
+               init: Union[str, np.ndarray] = "pca", params: Dict[str, Any] = None) -> Tuple[np.ndarray, str]:
     """
     Run t-SNE dimensionality reduction on data with given preplexity.
-    :param data: numpy array of shape (n, m) containing n m-dimensional vectors.
-    :type data: numpy.ndarray
+    :param data: numpy array of shape (n, m) containing n m-dimensional vectors, or distances computed by
+                 _neighbor_distances if metric is 'precomputed'.
+    :type data: Union[numpy.ndarray, scipy.sparse.csr_matrix]
     :param perplexity: Perplexity to run t-SNE with.
     :type perplexity: int
     :param no_dims: Number of output dimensions.
@@ -57,21 +427,43 @@ def _t_sne_job(data: np.ndarray, perplexity: int, no_dims: int,
     :type a_func: Callable
     :param a_params: Parameters to be appended to a_func call after dimensionality reduction.
     :type a_params: Iterable[Any]
+    :param method: Gradient calculation method, 'exact' or 'barnes_hut'.
+    :type method: str
+    :param angle: Barnes-Hut trade-off between speed (larger) and accuracy (smaller).
+    :type angle: float
+    :param metric: 'euclidean' for vectors or 'precomputed' for distances.
+    :type metric: str
+    :param init: Initialization, 'pca', 'random' or an initial embedding. Must not be 'pca' for precomputed
+                 distances.
+    :type init: Union[str, numpy.ndarray]
+    :param params: Additional parameters of sklearn.manifold.TSNE, e.g. from _warm_start_params.
+    :type params: Dict[str, Any]
     :return: Tuple containing dimensionally reduced data and perplexity string.
     :rtype: Tuple[numpy.ndarray, str]
     """
-    print("Running t-SNE with perplexity {}".format(perplexity))
-    model = TSNE(n_components=no_dims, perplexity=perplexity, method='exact', verbose=2, learning_rate=50)
-    x_nd = model.fit_transform(data), str(perplexity)
+    print("Running {} t-SNE with perplexity {}".format(method, perplexity))
+    model = TSNE(n_components=no_dims, perplexity=perplexity, method=method, angle=angle, metric=metric, init=init,
+                 verbose=2, learning_rate=50)
+    if params:
+        model.set_params(**params)
+    with Stage("t-SNE {}".format(perplexity), unit="rows") as stage:
+        # Exact t-SNE squares a dense precomputed matrix in place, so each perplexity gets its own copy. Barnes-Hut
+        # searches its own neighbour graph in the precomputed one and squares that, so the shared graph is only read
+        copy = metric == "precomputed" and method == "exact"
+        x_nd = model.fit_transform(data.copy() if copy else data), str(perplexity)
+        stage.update(data.shape[0], data.data.nbytes if issparse(data) else data.nbytes)
     if a_func and a_params:
         a_func(x_nd, *a_params)
     return x_nd
 
 
 def pca(data: np.ndarray, output_dimensions: int, args: Namespace = None,
-        a_func: Callable = None, a_params: Iterable[Any] = None) -> List[Tuple[np.ndarray, str]]:
+        a_func: Callable = None, a_params: Iterable[Any] = None,
+        overwrite_input: bool = False) -> List[Tuple[np.ndarray, str, Dict[str, np.ndarray]]]:
     """
-    Run PCA dimensionality reduction on data.
+    Run PCA dimensionality reduction on data. The scaling and principal components are returned with the reduced data,
+    so new fingerprints can later be projected onto the same axes. The input is left unchanged unless
+    overwrite_input is set.
     :param data: numpy array of shape (n, m) containing n m-dimensional vectors.
     :type data: numpy.ndarray
     :param output_dimensions: Number of output dimensions.
@@ -82,18 +474,84 @@ def pca(data: np.ndarray, output_dimensions: int, args: Namespace = None,
     :type a_func: Callable
     :param a_params: Parameters to be appended to a_func call after dimensionality reduction.
     :type a_params: Iterable[Any]
-    :return: List of length 1 containing tuple with dimensionally reduced data and description string.
-    :rtype: List[Tuple[numpy.ndarray, str]]
+    :param overwrite_input: Whether data may be scaled and centered in place to save memory, which leaves it changed.
+    :type overwrite_input: bool
+    :return: List of length 1 containing tuple with dimensionally reduced data, description string and projection
+             dictionary.
+    :rtype: List[Tuple[numpy.ndarray, str, Dict[str, numpy.ndarray]]]
     """
-    print("Scaling data.")
-    data = StandardScaler().fit_transform(data)
-    model = PCA(n_components=output_dimensions, svd_solver='full')
-    x_nd = model.fit_transform(data), "pca"
+    if args and args.pca_solver == "incremental":
+        x_nd = _incremental_pca(data, output_dimensions, args)
+    else:
+        data, scaler = _scale(data, args, overwrite_input)
+        # The scaled data is either a new array or the caller's array already scaled in place with overwrite_input,
+        # so PCA may center it in place too
+        model = PCA(n_components=output_dimensions, svd_solver=args.pca_solver if args else 'full', copy=False)
+        with Stage("PCA", unit="rows") as stage:
+            x_nd = model.fit_transform(data), "pca", _projection(scaler, model)
+            stage.update(len(data), data.nbytes)
     if a_func and a_params:
         a_func(x_nd, *a_params)
     return [x_nd]
 
 
+def _projection(scaler: StandardScaler, model: Union[PCA, IncrementalPCA]) -> Dict[str, np.ndarray]:
+    """
+    Collect the parameters mapping fingerprints to PCA coordinates.
+
+    :param scaler: Scaler fitted to the fingerprints.
+    :type scaler: StandardScaler
+    :param model: PCA fitted to the scaled fingerprints.
+    :type model: Union[PCA, IncrementalPCA]
+    :return: Dictionary of scaler mean and scale and PCA mean and components.
+    :rtype: Dict[str, numpy.ndarray]
+    """
+    return {"scale_mean": scaler.mean_, "scale": scaler.scale_, "mean": model.mean_,
+            "components": model.components_}
+
+
+def _incremental_pca(data: Union[np.ndarray, FingerprintSource], output_dimensions: int,
+                     args: Namespace) -> Tuple[np.ndarray, str, Dict[str, np.ndarray]]:
+    """
+    Run PCA on scaled data one chunk at a time. Only one chunk of the data is held in memory at a time, so the data
+    may be a FingerprintSource of a store larger than memory.
+
+    :param data: numpy array of shape (n, m) containing n m-dimensional vectors.
+    :type data: Union[numpy.ndarray, FingerprintSource]
+    :param output_dimensions: Number of output dimensions.
+    :type output_dimensions: int
+    :param args: Command line parameters.
+    :type args: argparse.Namespace
+    :return: Tuple of dimensionally reduced data, description string and projection dictionary.
+    :rtype: Tuple[numpy.ndarray, str, Dict[str, numpy.ndarray]]
+    """
+    if not isinstance(data, FingerprintSource):
+        data = FingerprintSource(data, args.dtype, args.rows_per_chunk)
+    print("Scaling data.")
+    with Stage("scaling", unit="rows") as stage:
+        scaler = _fit_scaler(data)
+        stage.update(len(data), data.nbytes)
+    model = IncrementalPCA(n_components=output_dimensions)
+    with Stage("PCA", unit="rows") as stage:
+        pending = None
+        for chunk in data.chunks():
+            chunk = scaler.transform(chunk)
+            # partial_fit needs at least n_components rows, so a short last chunk is fitted with the previous one
+            if pending is not None and len(chunk) < output_dimensions:
+                chunk = np.concatenate([pending, chunk])
+            elif pending is not None:
+                model.partial_fit(pending)
+            pending = chunk
+        model.partial_fit(pending)
+        x_nd = np.empty((len(data), output_dimensions), dtype=data.dtype)
+        start = 0
+        for chunk in data.chunks():
+            x_nd[start:start + len(chunk)] = model.transform(scaler.transform(chunk))
+            start += len(chunk)
+            stage.update(len(chunk), chunk.nbytes)
+    return x_nd, "pca", _projection(scaler, model)
+
+
 def _get_colors(x_nd: np.ndarray, metadata: Dict[str, Any] = None,
                 color_by: str = None) -> List[Union[int, Tuple[float, float, float]]]:
     """
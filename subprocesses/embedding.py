@@ -0,0 +1,107 @@
+import json
+import os
+from typing import List, Dict
+
+import numpy
+from sklearn.neighbors import NearestNeighbors
+from sklearn.preprocessing import StandardScaler
+
+
+def load_embedding(path: str, file_data: List[str], no_dims: int) -> numpy.ndarray:
+    """
+    Read point coordinates from a json file written by crunch.py and order them like the given files. Points are
+    matched to files by file name.
+
+    :param path: Path to json output file
+    :type path: str
+    :param file_data: List of file paths
+    :type file_data: List[str]
+    :param no_dims: Number of coordinates to read per point, 2 or 3
+    :type no_dims: int
+    :return: Array of shape (len(file_data), no_dims). Rows of files missing from the json file are NaN.
+    :rtype: numpy.ndarray
+    """
+    with open(path) as in_file:
+        points = json.load(in_file)["points"]
+    positions = {}
+    for point in points:
+        positions.setdefault(point[3], point[:no_dims])
+    embedding = numpy.full((len(file_data), no_dims), numpy.nan)
+    for i in range(len(file_data)):
+        position = positions.get(file_data[i].split("/")[-1])
+        if position is not None:
+            embedding[i] = position
+    return embedding
+
+
+def projection_path(map_path: str) -> str:
+    """
+    Get path of the file storing the projection of a PCA map.
+
+    :param map_path: Path to json output file
+    :type map_path: str
+    :return: Path to '.npz' projection file next to the json file
+    :rtype: str
+    """
+    return os.path.splitext(map_path)[0] + ".npz"
+
+
+def save_projection(path: str, projection: Dict[str, numpy.ndarray], offset: float, factor: float,
+                    minimum: float) -> None:
+    """
+    Save the linear projection of fingerprints to map coordinates of a PCA map.
+
+    :param path: Path to '.npz' file
+    :type path: str
+    :param projection: Dictionary of scaler mean and scale and PCA mean and components
+    :type projection: Dict[str, numpy.ndarray]
+    :param offset: Value subtracted from PCA coordinates when they were normalized
+    :type offset: float
+    :param factor: Factor PCA coordinates were multiplied with after subtracting the offset
+    :type factor: float
+    :param minimum: Value added to PCA coordinates after multiplying
+    :type minimum: float
+    """
+    numpy.savez(path, offset=offset, factor=factor, minimum=minimum, **projection)
+
+
+def linear_projection(data: numpy.ndarray, path: str) -> numpy.ndarray:
+    """
+    Place fingerprints on a PCA map with the projection stored by save_projection.
+
+    :param data: Fingerprint data with one row per file
+    :type data: numpy.ndarray
+    :param path: Path to '.npz' file
+    :type path: str
+    :return: Map coordinates with one row per file
+    :rtype: numpy.ndarray
+    """
+    with numpy.load(path) as projection:
+        x_nd = ((data - projection["scale_mean"]) / projection["scale"] - projection["mean"]) @ \
+            projection["components"].T
+        return (x_nd - projection["offset"]) * projection["factor"] + projection["minimum"]
+
+
+def knn_projection(known: numpy.ndarray, positions: numpy.ndarray, data: numpy.ndarray,
+                   neighbors: int = 10) -> numpy.ndarray:
+    """
+    Place fingerprints on a map at the average position of their nearest neighbours among the fingerprints already
+    on the map, weighted by inverse distance. Distances are measured between standardized fingerprints, like the
+    ones the map was computed from.
+
+    :param known: Fingerprint data of files on the map with one row per file
+    :type known: numpy.ndarray
+    :param positions: Map coordinates of the known files
+    :type positions: numpy.ndarray
+    :param data: Fingerprint data of files to place with one row per file
+    :type data: numpy.ndarray
+    :param neighbors: Number of neighbours to average
+    :type neighbors: int
+    :return: Map coordinates with one row per file to place
+    :rtype: numpy.ndarray
+    """
+    scaler = StandardScaler().fit(known)
+    knn = NearestNeighbors(n_neighbors=min(neighbors, len(known))).fit(scaler.transform(known))
+    distances, indices = knn.kneighbors(scaler.transform(data))
+    weights = 1 / numpy.maximum(distances, 1e-12)
+    return numpy.einsum("ij,ijk->ik", weights, positions[indices]) / weights.sum(axis=1, keepdims=True)
@@ -1,8 +1,88 @@
+from functools import lru_cache
+from typing import Sequence, List, Union
+
 import numpy as np
 import librosa
+from scipy.fftpack import dct
+from scipy.signal import get_window
 from skimage.measure import block_reduce
 
 window = np.hanning(1024)
+frame_count = 26
+feature_rows = {"ms": 128, "mfcc": 20, "chroma": 12}
+
+
+@lru_cache(maxsize=None)
+def _hann_window(n_fft: int) -> np.ndarray:
+    """
+    Get periodic Hann window. Windows are computed once per size.
+    :param n_fft: Window size
+    :type n_fft: int
+    :return: Window function
+    :rtype: numpy.ndarray
+    """
+    return get_window('hann', n_fft, fftbins=True)
+
+
+@lru_cache(maxsize=None)
+def _mel_basis(sr: int, n_fft: int, n_mels: int = 128) -> np.ndarray:
+    """
+    Get mel filter bank. Filter banks are computed once per parameter combination.
+    :param sr: Sample rate
+    :type sr: int
+    :param n_fft: FFT window size
+    :type n_fft: int
+    :param n_mels: Number of mel bands
+    :type n_mels: int
+    :return: Filter bank of shape (n_mels, n_fft // 2 + 1)
+    :rtype: numpy.ndarray
+    """
+    return librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels)
+
+
+@lru_cache(maxsize=None)
+def _chroma_basis(sr: int, n_fft: int, tuning: float = 0.0) -> np.ndarray:
+    """
+    Get chroma filter bank. Filter banks are computed once per parameter combination.
+    :param sr: Sample rate
+    :type sr: int
+    :param n_fft: FFT window size
+    :type n_fft: int
+    :param tuning: Tuning deviation from A440 in fractions of a chroma bin
+    :type tuning: float
+    :return: Filter bank of shape (12, n_fft // 2 + 1)
+    :rtype: numpy.ndarray
+    """
+    return librosa.filters.chroma(sr=sr, n_fft=n_fft, tuning=tuning)
+
+
+@lru_cache(maxsize=None)
+def _dct_basis(n_mfcc: int, n_mels: int) -> np.ndarray:
+    """
+    Get orthonormal type 2 DCT matrix for computing cepstral coefficients from log mel spectra.
+    :param n_mfcc: Number of coefficients
+    :type n_mfcc: int
+    :param n_mels: Number of mel bands
+    :type n_mels: int
+    :return: DCT matrix of shape (n_mfcc, n_mels)
+    :rtype: numpy.ndarray
+    """
+    return dct(np.eye(n_mels), type=2, norm='ortho', axis=0)[:n_mfcc]
+
+
+def _fix_frames(s: np.ndarray, frames: int = frame_count) -> np.ndarray:
+    """
+    Crop or zero pad the frame (last) axis of a feature array to a fixed number of frames.
+    :param s: Feature array
+    :type s: numpy.ndarray
+    :param frames: Number of frames in output
+    :type frames: int
+    :return: Feature array with exactly the given number of frames
+    :rtype: numpy.ndarray
+    """
+    if s.shape[-1] < frames:
+        return np.pad(s, [(0, 0)] * (s.ndim - 1) + [(0, frames - s.shape[-1])], 'constant')
+    return s[..., :frames]
 
 
 def fft_fingerprint(y: np.ndarray, sr: int = None, size: int = None) -> np.ndarray:
@@ -17,17 +97,7 @@ def fft_fingerprint(y: np.ndarray, sr: int = None, size: int = None) -> np.ndarr
     :return: Fingerprint array
     :rtype: np.ndarray
     """
-    s = librosa.stft(y, 1024, 4096, window=window)
-    amp = np.abs(s)
-    amp = block_reduce(amp, (10, 1), func=np.mean)
-    if amp.shape[1] < 32:
-        amp = np.pad(amp, ((0, 0), (0, 32 - amp.shape[1])), 'constant')
-    amp = amp[:32, :32]
-    amp -= amp.min()
-    if amp.max() > 0:
-        amp /= amp.max()
-    amp = np.flipud(amp)
-    return amp
+    return fft_batch_fingerprint(np.asarray(y)[np.newaxis], sr, size)[0]
 
 
 def ms_fingerprint(data: np.ndarray, sr: int, size: int) -> np.ndarray:
@@ -39,12 +109,10 @@ def ms_fingerprint(data: np.ndarray, sr: int, size: int) -> np.ndarray:
     :type sr: int
     :param size: Sample size
     :type size: int
-    :return: Fingerprint array
+    :return: Fingerprint array of shape (128, 26)
     :rtype: numpy.ndarray
     """
-    steps = 25
-    hop = size//steps
-    return librosa.feature.melspectrogram(y=data, sr=sr, hop_length=hop)
+    return ms_batch_fingerprint(np.asarray(data)[np.newaxis], sr, size)[0]
 
 
 def tonnez_fingerprint(data: np.ndarray, sr: int, size: int) -> np.ndarray:
@@ -71,12 +139,11 @@ def chroma_fingerprint(data: np.ndarray, sr: int, size: int) -> np.ndarray:
     :type sr: int
     :param size: Sample size
     :type size: int
-    :return: Fingerprint array
+    :return: Fingerprint array of shape (12, 26)
     :rtype: numpy.ndarray
     """
-    steps = 25
-    hop = size//steps
-    return librosa.feature.chroma_stft(y=data, sr=sr, hop_length=hop)
+    power = _batch_power(np.asarray(data)[np.newaxis], size)
+    return _chroma(power, sr, _estimate_tuning(power, sr))[0]
 
 
 def mfcc_fingerprint(data: np.ndarray, sr: int, size: int) -> np.ndarray:
@@ -88,9 +155,238 @@ def mfcc_fingerprint(data: np.ndarray, sr: int, size: int) -> np.ndarray:
     :type sr: int
     :param size: Sample size
     :type size: int
-    :return: Fingerprint array
+    :return: Fingerprint array of shape (20, 26)
+    :rtype: numpy.ndarray
+    """
+    return mfcc_batch_fingerprint(np.asarray(data)[np.newaxis], sr, size)[0]
+
+
+def _batch_stft(data: np.ndarray, n_fft: int, hop: int, fft_window: np.ndarray) -> np.ndarray:
+    """
+    Calculate centered short time Fourier transforms for a batch of equal length clips.
+    :param data: Input samples of shape (clips, samples)
+    :type data: numpy.ndarray
+    :param n_fft: FFT window size
+    :type n_fft: int
+    :param hop: Number of samples between frames
+    :type hop: int
+    :param fft_window: Window function of length n_fft
+    :type fft_window: numpy.ndarray
+    :return: Complex array of shape (clips, n_fft // 2 + 1, frames)
+    :rtype: numpy.ndarray
+    """
+    padded = np.pad(np.asarray(data, dtype=np.float64), ((0, 0), (n_fft // 2, n_fft // 2)), 'constant')
+    n_frames = 1 + (padded.shape[1] - n_fft) // hop
+    framed = np.lib.stride_tricks.as_strided(padded, shape=(len(padded), n_frames, n_fft),
+                                             strides=(padded.strides[0], padded.strides[1] * hop,
+                                                      padded.strides[1]))
+    return np.fft.rfft(framed * fft_window, axis=-1).transpose(0, 2, 1)
+
+
+def _batch_power(data: np.ndarray, size: int, n_fft: int = 2048) -> np.ndarray:
+    """
+    Calculate power spectrograms with 25 steps per clip for a batch of equal length clips.
+    :param data: Input samples of shape (clips, samples)
+    :type data: numpy.ndarray
+    :param size: Sample size
+    :type size: int
+    :param n_fft: FFT window size
+    :type n_fft: int
+    :return: Power spectrograms of shape (clips, n_fft // 2 + 1, frames)
     :rtype: numpy.ndarray
     """
     steps = 25
-    hop = size//steps
-    return librosa.feature.mfcc(data, sr, hop_length=hop, n_mfcc=20)
+    hop = max(1, size//steps)
+    return np.abs(_batch_stft(data, n_fft, hop, _hann_window(n_fft))) ** 2
+
+
+def _estimate_tuning(power: np.ndarray, sr: int) -> List[float]:
+    """
+    Estimate the tuning of each clip from its power spectrogram. Estimates are rounded so clips with similar tuning
+    share a chroma filter bank.
+    :param power: Power spectrograms of shape (clips, 1025, frames)
+    :type power: numpy.ndarray
+    :param sr: Sample rate
+    :type sr: int
+    :return: Tuning deviation from A440 in fractions of a chroma bin for each clip
+    :rtype: List[float]
+    """
+    return [round(float(librosa.estimate_tuning(S=p, sr=sr, bins_per_octave=12)), 2) for p in power]
+
+
+def _chroma(power: np.ndarray, sr: int, tuning: Union[float, Sequence[float]] = 0.0) -> np.ndarray:
+    """
+    Project power spectrograms to normalized chromagrams.
+    :param power: Power spectrograms of shape (clips, 1025, frames)
+    :type power: numpy.ndarray
+    :param sr: Sample rate
+    :type sr: int
+    :param tuning: Tuning deviation from A440 in fractions of a chroma bin, for all clips or for each clip
+    :type tuning: Union[float, Sequence[float]]
+    :return: Chromagrams of shape (clips, 12, 26)
+    :rtype: numpy.ndarray
+    """
+    tunings = np.broadcast_to(tuning, len(power))
+    chroma = None
+    for value in np.unique(tunings):
+        clips = np.flatnonzero(tunings == value)
+        part = np.matmul(_chroma_basis(sr, 2048, float(value)), power[clips])
+        if chroma is None:
+            chroma = np.empty((len(power),) + part.shape[1:], dtype=part.dtype)
+        chroma[clips] = part
+    norm = chroma.max(axis=1, keepdims=True)
+    norm[norm < np.finfo(chroma.dtype).tiny] = 1
+    return _fix_frames(chroma / norm)
+
+
+def _mfcc(mel: np.ndarray) -> np.ndarray:
+    """
+    Calculate mel frequency cepstral coefficients from mel spectrograms.
+    :param mel: Mel spectrograms of shape (clips, 128, 26)
+    :type mel: numpy.ndarray
+    :return: Coefficients of shape (clips, 20, 26)
+    :rtype: numpy.ndarray
+    """
+    log_mel = 10 * np.log10(np.maximum(1e-10, mel))
+    log_mel = np.maximum(log_mel, log_mel.max(axis=(1, 2), keepdims=True) - 80)
+    return np.matmul(_dct_basis(20, log_mel.shape[1]), log_mel)
+
+
+def _spectral_features(power: np.ndarray, sr: int, methods: Sequence[str],
+                       tuning: Union[float, Sequence[float]] = 0.0) -> np.ndarray:
+    """
+    Derive several fingerprints from the same power spectrograms.
+    :param power: Power spectrograms of shape (clips, 1025, frames)
+    :type power: numpy.ndarray
+    :param sr: Sample rate
+    :type sr: int
+    :param methods: Fingerprint methods out of "ms", "mfcc" and "chroma"
+    :type methods: Sequence[str]
+    :param tuning: Tuning deviation from A440 in fractions of a chroma bin used for chroma, for all clips or for each
+                   clip
+    :type tuning: Union[float, Sequence[float]]
+    :return: Fingerprints of the methods stacked along axis 1 in the given order
+    :rtype: numpy.ndarray
+    """
+    mel = None
+    features = []
+    for method in methods:
+        if method in ("ms", "mfcc") and mel is None:
+            mel = _fix_frames(np.matmul(_mel_basis(sr, 2048), power))
+        if method == "ms":
+            features.append(mel)
+        elif method == "mfcc":
+            features.append(_mfcc(mel))
+        elif method == "chroma":
+            features.append(_chroma(power, sr, tuning))
+        else:
+            raise ValueError("{} can not be computed from a shared spectrogram.".format(method))
+    return np.concatenate(features, axis=1)
+
+
+def fft_batch_fingerprint(data: np.ndarray, sr: int = None, size: int = None) -> np.ndarray:
+    """
+    Create fft fingerprints for a batch of equal length clips.
+    :param data: Input samples of shape (clips, samples)
+    :type data: numpy.ndarray
+    :param sr: Sample rate. Not used.
+    :type sr: int
+    :param size: Samlpe lenth. Not used
+    :type size: int
+    :return: Fingerprint array of shape (clips, 32, 32)
+    :rtype: numpy.ndarray
+    """
+    amp = np.abs(_batch_stft(data, 1024, 4096, window))
+    amp = block_reduce(amp, (1, 10, 1), func=np.mean)
+    if amp.shape[2] < 32:
+        amp = np.pad(amp, ((0, 0), (0, 0), (0, 32 - amp.shape[2])), 'constant')
+    amp = amp[:, :32, :32]
+    amp -= amp.min(axis=(1, 2), keepdims=True)
+    peak = amp.max(axis=(1, 2), keepdims=True)
+    amp /= np.where(peak > 0, peak, 1)
+    return amp[:, ::-1, :]
+
+
+def ms_batch_fingerprint(data: np.ndarray, sr: int, size: int) -> np.ndarray:
+    """
+    Create mel spectrum fingerprints for a batch of equal length clips.
+    :param data: Input samples of shape (clips, samples)
+    :type data: numpy.ndarray
+    :param sr: Sample rate
+    :type sr: int
+    :param size: Sample size
+    :type size: int
+    :return: Fingerprint array of shape (clips, 128, 26)
+    :rtype: numpy.ndarray
+    """
+    return _fix_frames(np.matmul(_mel_basis(sr, 2048), _batch_power(data, size)))
+
+
+def chroma_batch_fingerprint(data: np.ndarray, sr: int, size: int) -> np.ndarray:
+    """
+    Generate chromagrams for a batch of equal length clips. The tuning of each clip is estimated like in
+    chroma_fingerprint, so every row equals the chromagram of the clip on its own.
+    :param data: Input samples of shape (clips, samples)
+    :type data: numpy.ndarray
+    :param sr: Sample rate
+    :type sr: int
+    :param size: Sample size
+    :type size: int
+    :return: Fingerprint array of shape (clips, 12, 26)
+    :rtype: numpy.ndarray
+    """
+    power = _batch_power(data, size)
+    return _chroma(power, sr, _estimate_tuning(power, sr))
+
+
+def mfcc_batch_fingerprint(data: np.ndarray, sr: int, size: int) -> np.ndarray:
+    """
+    Generate mel frequency cepstral coefficients for a batch of equal length clips.
+    :param data: Input samples of shape (clips, samples)
+    :type data: numpy.ndarray
+    :param sr: Sample rate
+    :type sr: int
+    :param size: Sample size
+    :type size: int
+    :return: Fingerprint array of shape (clips, 20, 26)
+    :rtype: numpy.ndarray
+    """
+    return _mfcc(ms_batch_fingerprint(data, sr, size))
+
+
+def spectral_fingerprint(data: np.ndarray, sr: int, size: int, methods: Sequence[str]) -> np.ndarray:
+    """
+    Generate several fingerprints from one power spectrogram of input sample data.
+    :param data: Input samples
+    :type data: numpy.ndarray
+    :param sr: Sample rate
+    :type sr: int
+    :param size: Sample size
+    :type size: int
+    :param methods: Fingerprint methods out of "ms", "mfcc" and "chroma"
+    :type methods: Sequence[str]
+    :return: Fingerprint array with the rows of each method stacked in the given order
+    :rtype: numpy.ndarray
+    """
+    power = _batch_power(np.asarray(data)[np.newaxis], size)
+    tuning = _estimate_tuning(power, sr) if "chroma" in methods else 0.0
+    return _spectral_features(power, sr, methods, tuning)[0]
+
+
+def spectral_batch_fingerprint(data: np.ndarray, sr: int, size: int, methods: Sequence[str]) -> np.ndarray:
+    """
+    Generate several fingerprints from one power spectrogram per clip for a batch of equal length clips.
+    :param data: Input samples of shape (clips, samples)
+    :type data: numpy.ndarray
+    :param sr: Sample rate
+    :type sr: int
+    :param size: Sample size
+    :type size: int
+    :param methods: Fingerprint methods out of "ms", "mfcc" and "chroma"
+    :type methods: Sequence[str]
+    :return: Fingerprint array with the rows of each method stacked in the given order
+    :rtype: numpy.ndarray
+    """
+    power = _batch_power(data, size)
+    tuning = _estimate_tuning(power, sr) if "chroma" in methods else 0.0
+    return _spectral_features(power, sr, methods, tuning)
@@ -0,0 +1,165 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from typing import Any, Dict, List, Tuple, Union
+
+import numpy as np
+
+
+class FingerprintCache:
+    def __init__(self, cache_dir: str, max_size: int = 0, content_key: bool = False):
+        """
+        Create instance of FingerprintCache.
+
+        :param cache_dir: Folder to store cached fingerprints in.
+        :type cache_dir: str
+        :param max_size: Maximum size of the cache in bytes. 0 for no limit.
+        :type max_size: int
+        :param content_key: Key entries by file content hash instead of path, size and modification time.
+        :type content_key: bool
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.content_key = content_key
+
+    def _file_key(self, file_path: str) -> str:
+        """
+        Create a string identifying the contents of an audio file.
+
+        :param file_path: Path to audio file.
+        :type file_path: str
+        :return: Content hash or path, size and modification time of the file.
+        :rtype: str
+        """
+        if self.content_key:
+            h = hashlib.sha1()
+            with open(file_path, "rb") as in_file:
+                for block in iter(lambda: in_file.read(1 << 20), b""):
+                    h.update(block)
+            return h.hexdigest()
+        st = os.stat(file_path)
+        return "{}|{}|{}".format(os.path.abspath(file_path), st.st_size, st.st_mtime_ns)
+
+    def entry_path(self, file_path: str, parameters: Dict[str, Any]) -> str:
+        """
+        Get path of the cache entry for a file fingerprinted with given parameters.
+
+        :param file_path: Path to audio file.
+        :type file_path: str
+        :param parameters: Fingerprinting parameters. Must contain the key "method".
+        :type parameters: Dict[str, Any]
+        :return: Path to cache entry.
+        :rtype: str
+        """
+        param_str = ",".join("{}={}".format(k, parameters[k]) for k in sorted(parameters.keys()))
+        key = hashlib.sha1("{}#{}".format(self._file_key(file_path), param_str).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, parameters["method"], key[:2], key + ".npz")
+
+    def get(self, file_path: str, parameters: Dict[str, Any]) -> Union[Tuple[np.ndarray, int], None]:
+        """
+        Read fingerprint from cache.
+
+        :param file_path: Path to audio file.
+        :type file_path: str
+        :param parameters: Fingerprinting parameters.
+        :type parameters: Dict[str, Any]
+        :return: Tuple of fingerprint and audio length or None if file is not cached.
+        :rtype: Union[Tuple[numpy.ndarray, int], None]
+        """
+        entry = self.entry_path(file_path, parameters)
+        try:
+            with np.load(entry) as data:
+                result = data["fingerprint"], int(data["length"])
+        except (OSError, KeyError, ValueError):
+            return None
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        return result
+
+    def put(self, file_path: str, parameters: Dict[str, Any], fingerprint: np.ndarray, length: int) -> None:
+        """
+        Store fingerprint in cache. Entries are written atomically so concurrent workers never see partial files.
+
+        :param file_path: Path to audio file.
+        :type file_path: str
+        :param parameters: Fingerprinting parameters.
+        :type parameters: Dict[str, Any]
+        :param fingerprint: Fingerprint data.
+        :type fingerprint: numpy.ndarray
+        :param length: Length of the audio data.
+        :type length: int
+        """
+        entry = self.entry_path(file_path, parameters)
+        folder = os.path.dirname(entry)
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as out_file:
+                np.savez(out_file, fingerprint=fingerprint, length=length)
+            os.replace(tmp_path, entry)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        """
+        List all cache entries.
+
+        :return: List of tuples containing last access time, size and path of each entry.
+        :rtype: List[Tuple[float, int, str]]
+        """
+        entries = []
+        for root, dirs, files in os.walk(self.cache_dir):
+            for f in files:
+                if f.endswith(".npz"):
+                    st = os.stat(os.path.join(root, f))
+                    entries.append((st.st_mtime, st.st_size, os.path.join(root, f)))
+        return entries
+
+    def size(self) -> int:
+        """
+        Calculate total size of cache entries.
+
+        :return: Size of the cache in bytes.
+        :rtype: int
+        """
+        return sum(e[1] for e in self._entries())
+
+    def evict(self) -> int:
+        """
+        Remove least recently used entries until the cache fits in max_size.
+
+        :return: Number of removed entries.
+        :rtype: int
+        """
+        if not self.max_size:
+            return 0
+        entries = sorted(self._entries())
+        total = sum(e[1] for e in entries)
+        removed = 0
+        for mtime, size, path in entries:
+            if total <= self.max_size:
+                break
+            os.remove(path)
+            total -= size
+            removed += 1
+        return removed
+
+    def invalidate(self, method: str = None) -> None:
+        """
+        Remove cached fingerprints. Entries of feature sets computed together with the method are removed as well.
+
+        :param method: Fingerprinting method to remove entries for. None to clear the whole cache.
+        :type method: str
+        """
+        if not os.path.isdir(self.cache_dir):
+            return
+        if not method:
+            shutil.rmtree(self.cache_dir)
+            return
+        for name in os.listdir(self.cache_dir):
+            if method in name.split("+"):
+                shutil.rmtree(os.path.join(self.cache_dir, name))
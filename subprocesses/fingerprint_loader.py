@@ -1,5 +1,7 @@
-from typing import Tuple, List
+from itertools import islice
+from typing import Tuple, List, Union
 import csv
+import os
 
 import numpy
 
@@ -13,66 +15,236 @@ def load_numpy_fingerprints(path: str) -> Tuple[List[numpy.ndarray], List[str]]:
     :return: Tuple containing list of numpy arrays and a list of file names
     :rtype: Tuple[List[numpy.ndarray], List[str]
     """
-    data = numpy.load(path)
+    data = numpy.load(path, allow_pickle=True)
     results = [c[1] for c in data]
     file_data = [c[0] for c in data]
     return results, file_data
 
 
-def _load_row(row: List[str], results: List[numpy.ndarray], file_data: List[str]) -> None:
+def save_numpy_fingerprints(path: str, results: numpy.ndarray, file_data: List[str]) -> None:
     """
-    Raad csv row and add contenst to the given lists
+    Save fingerprint data to numpy file as a list of (file name, fingerprint) tuples.
 
-    :param row: Row to read
-    :type row: List[str]
-    :param results: List of numpy arrays to add to
-    :type results: List[numpy.ndarray]
-    :param file_data: List of file name strings to add to
+    :param path: Path to file
+    :type path: str
+    :param results: Fingerprint data with one row per file
+    :type results: numpy.ndarray
+    :param file_data: List of file names
+    :type file_data: List[str]
+    """
+    data = numpy.empty(len(file_data), dtype=object)
+    for i in range(len(file_data)):
+        data[i] = (file_data[i], results[i])
+    numpy.save(path, data)
+
+
+def _paths_file(path: str) -> str:
+    """
+    Get path of the file name index of a matrix fingerprint store.
+
+    :param path: Path to matrix file
+    :type path: str
+    :return: Path to file name index
+    :rtype: str
+    """
+    return path + ".paths"
+
+
+def save_matrix_fingerprints(path: str, results: numpy.ndarray, file_data: List[str]) -> None:
+    """
+    Save fingerprint data as a contiguous float matrix in a numpy file and the file names, one per line, in a
+    '.paths' file next to it. Neither file needs pickle. Files are replaced atomically, so a store can be rewritten
+    while it is memory mapped.
+
+    :param path: Path to file
+    :type path: str
+    :param results: Fingerprint data with one row per file
+    :type results: numpy.ndarray
+    :param file_data: List of file names
     :type file_data: List[str]
     """
-    file_data.append(row[0])
-    results.append(numpy.asarray([int(x) for x in row[1:]]))
+    matrix = numpy.ascontiguousarray(results).reshape(len(file_data), -1) if file_data else numpy.empty((0, 0))
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as out_file:
+        numpy.save(out_file, matrix)
+    os.replace(tmp_path, path)
+    with open(tmp_path, "w", encoding="utf-8") as out_file:
+        out_file.writelines(f + "\n" for f in file_data)
+    os.replace(tmp_path, _paths_file(path))
+
+
+def load_matrix_fingerprints(path: str) -> Tuple[numpy.ndarray, List[str]]:
+    """
+    Load fingerprint data from a store written by save_matrix_fingerprints. The matrix is memory mapped read only,
+    so opening the store takes constant time regardless of its size.
+
+    :param path: Path to file
+    :type path: str
+    :return: Tuple containing memory mapped matrix with one row per file and a list of file names
+    :rtype: Tuple[numpy.ndarray, List[str]
+    """
+    matrix = numpy.load(path, mmap_mode="r")
+    with open(_paths_file(path), encoding="utf-8") as in_file:
+        file_data = in_file.read().split("\n")[:-1]
+    if len(file_data) != len(matrix):
+        raise ValueError("{} has {} rows but {} lists {} files.".format(path, len(matrix), _paths_file(path),
+                                                                         len(file_data)))
+    return matrix, file_data
+
+
+def is_matrix_store(path: str) -> bool:
+    """
+    Check whether a numpy file contains a fingerprint matrix instead of pickled (file name, fingerprint) tuples.
+
+    :param path: Path to file
+    :type path: str
+    :return: True if the file holds a matrix written by save_matrix_fingerprints
+    :rtype: bool
+    """
+    with open(path, "rb") as in_file:
+        version = numpy.lib.format.read_magic(in_file)
+        if version == (1, 0):
+            header = numpy.lib.format.read_array_header_1_0(in_file)
+        else:
+            header = numpy.lib.format.read_array_header_2_0(in_file)
+    return not header[2].hasobject and os.path.isfile(_paths_file(path))
 
 
-def load_delimited_fingerprints(path: str, delimiter: str) -> Tuple[List[numpy.ndarray], List[str]]:
+def load_fingerprint_store(path: str) -> Tuple[Union[numpy.ndarray, List[numpy.ndarray]], List[str]]:
     """
-    Load fingerprint data from csv file with given delimiter.
+    Load a fingerprint store written by save_numpy_fingerprints or save_matrix_fingerprints.
+
+    :param path: Path to file
+    :type path: str
+    :return: Tuple containing fingerprint data and a list of file names
+    :rtype: Tuple[Union[numpy.ndarray, List[numpy.ndarray]], List[str]
+    """
+    if is_matrix_store(path):
+        return load_matrix_fingerprints(path)
+    return load_numpy_fingerprints(path)
+
+
+def _count_lines(path: str) -> int:
+    """
+    Count lines in a file without decoding it. A last line without a line break is counted too.
+
+    :param path: Path to file
+    :type path: str
+    :return: Number of lines
+    :rtype: int
+    """
+    lines = 0
+    last = b"\n"
+    with open(path, "rb") as in_file:
+        for block in iter(lambda: in_file.read(1 << 20), b""):
+            lines += block.count(b"\n")
+            last = block[-1:]
+    return lines + (last != b"\n")
+
+
+def _split_rows(lines: List[str], delimiter: str) -> Tuple[List[str], List[str]]:
+    """
+    Split delimited lines into the file name in the first column and the rest of the line. Empty lines are skipped.
+
+    :param lines: Lines to split
+    :type lines: List[str]
+    :param delimiter: Cell delimiter used in file
+    :type delimiter: str
+    :return: Tuple containing a list of file names and a list of delimited values
+    :rtype: Tuple[List[str], List[str]]
+    """
+    file_data = []
+    values = []
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if not line:
+            continue
+        if line.startswith('"'):
+            row = next(csv.reader([line], delimiter=delimiter))
+            file_data.append(row[0])
+            values.append(delimiter.join(row[1:]))
+        else:
+            name, _, row_values = line.partition(delimiter)
+            file_data.append(name)
+            values.append(row_values)
+    return file_data, values
+
+
+def load_delimited_fingerprints(path: str, delimiter: str, chunk_rows: int = 10000,
+                                dtype: str = "float64") -> Tuple[numpy.ndarray, List[str]]:
+    """
+    Load fingerprint data from csv file with given delimiter. The first column holds the file name and the other
+    columns integer or float values, the same number in every row. The file is read in chunks of rows whose values
+    are parsed at once into a matrix allocated up front, so memory use beyond the matrix is bounded by the chunk
+    size.
 
     :param path: Path to csv file
     :type path: str
     :param delimiter: Cell delimiter used in file
     :type delimiter: str
-    :return: Tuple containing list of numpy arrays and a list of file names
-    :rtype: Tuple[List[numpy.ndarray], List[str]
+    :param chunk_rows: Number of rows to parse at once
+    :type chunk_rows: int
+    :param dtype: Float type of the matrix
+    :type dtype: str
+    :return: Tuple containing matrix with one row per file and a list of file names
+    :rtype: Tuple[numpy.ndarray, List[str]
     """
-    results = []
+    results = None
     file_data = []
     with open(path) as in_file:
-        csv_reader = csv.reader(in_file, delimiter=delimiter)
-        for row in csv_reader:
-            _load_row(row, results, file_data)
-    return results, file_data
-
-
-def load_tsv_fingerprints(path: str) -> Tuple[List[numpy.ndarray], List[str]]:
+        while True:
+            lines = list(islice(in_file, chunk_rows))
+            if not lines:
+                break
+            chunk_names, chunk_values = _split_rows(lines, delimiter)
+            if not chunk_names:
+                continue
+            if results is None:
+                columns = chunk_values[0].count(delimiter) + 1 if chunk_values[0] else 0
+                results = numpy.empty((_count_lines(path), columns), dtype=dtype)
+            row = len(file_data)
+            # Rows that are too short and too long could add up to the right number of values for the chunk, so the
+            # columns of every row are counted before the chunk is parsed
+            for i in range(len(chunk_values)):
+                if (chunk_values[i].count(delimiter) + 1 if chunk_values[i] else 0) != columns:
+                    raise ValueError("{} has a different number of values in row {} ({}) than in the first row."
+                                     .format(path, row + i + 1, chunk_names[i]))
+            if columns:
+                try:
+                    results[row:row + len(chunk_names)] = numpy.loadtxt(chunk_values, dtype=dtype, delimiter=delimiter,
+                                                                        comments=None, ndmin=2)
+                except ValueError:
+                    raise ValueError("{} has rows with missing or non-numeric values between rows {} and {}.".format(
+                        path, row + 1, row + len(chunk_names)))
+            file_data += chunk_names
+    if results is None:
+        return numpy.empty((0, 0), dtype=dtype), file_data
+    return results[:len(file_data)], file_data
+
+
+def load_tsv_fingerprints(path: str, dtype: str = "float64") -> Tuple[numpy.ndarray, List[str]]:
     """
     Load fingerprint data from tsv file.
 
     :param path: Path to tsv file
     :type path: str
-    :return: Tuple containing list of numpy arrays and a list of file names
-    :rtype: Tuple[List[numpy.ndarray], List[str]
+    :param dtype: Float type of the matrix
+    :type dtype: str
+    :return: Tuple containing matrix with one row per file and a list of file names
+    :rtype: Tuple[numpy.ndarray, List[str]
     """
-    return load_delimited_fingerprints(path, '\t')
+    return load_delimited_fingerprints(path, '\t', dtype=dtype)
 
 
-def load_csv_fingerprints(path: str) -> Tuple[List[numpy.ndarray], List[str]]:
+def load_csv_fingerprints(path: str, dtype: str = "float64") -> Tuple[numpy.ndarray, List[str]]:
     """
     Load fingerprint data from tsv file.
 
     :param path: Path to csv file
     :type path: str
-    :return: Tuple containing list of numpy arrays and a list of file names
-    :rtype: Tuple[List[numpy.ndarray], List[str]
+    :param dtype: Float type of the matrix
+    :type dtype: str
+    :return: Tuple containing matrix with one row per file and a list of file names
+    :rtype: Tuple[numpy.ndarray, List[str]
     """
-    return load_delimited_fingerprints(path, ',')
+    return load_delimited_fingerprints(path, ',', dtype=dtype)
@@ -0,0 +1,104 @@
+from typing import Iterator, Tuple, Sequence, Union
+
+import numpy
+
+
+class FingerprintSource:
+    def __init__(self, data: Union[numpy.ndarray, Sequence[numpy.ndarray]], dtype: str = "float64",
+                 rows_per_chunk: int = 10000, columns: slice = None):
+        """
+        Create instance of FingerprintSource. Wraps fingerprint data with one row per file, e.g. a memory mapped
+        matrix or a list of fingerprints, without copying it. Rows are only converted to a float matrix when they are
+        indexed or iterated in chunks, so stages that work on chunks can process stores larger than memory.
+
+        :param data: Fingerprint data with one row or fingerprint per file.
+        :type data: Union[numpy.ndarray, Sequence[numpy.ndarray]]
+        :param dtype: Float type of the rows.
+        :type dtype: str
+        :param rows_per_chunk: Number of rows in each chunk returned by chunks.
+        :type rows_per_chunk: int
+        :param columns: Columns of the flattened fingerprints to include. None for all columns.
+        :type columns: slice
+        """
+        self.data = data
+        self.dtype = numpy.dtype(dtype)
+        self.rows_per_chunk = max(1, rows_per_chunk)
+        self._columns = columns or slice(None)
+        self._width = numpy.size(data[0]) if len(data) else 0
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        """
+        Shape of the fingerprint matrix.
+
+        :return: Tuple of row and column count.
+        :rtype: Tuple[int, int]
+        """
+        return len(self.data), len(range(*self._columns.indices(self._width)))
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Size of the fingerprint matrix in bytes.
+
+        :return: Number of bytes.
+        :rtype: int
+        """
+        return self.shape[0] * self.shape[1] * self.dtype.itemsize
+
+    def _rows(self, start: int, stop: int) -> numpy.ndarray:
+        """
+        Convert a range of rows to a float matrix.
+
+        :param start: First row.
+        :type start: int
+        :param stop: Row after the last row.
+        :type stop: int
+        :return: Matrix of the rows.
+        :rtype: numpy.ndarray
+        """
+        rows = numpy.asarray(self.data[start:stop], dtype=self.dtype).reshape(stop - start, self._width)
+        return rows[:, self._columns]
+
+    def __getitem__(self, index: int) -> numpy.ndarray:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Fingerprint index out of range.")
+        return self._rows(index, index + 1)[0]
+
+    def chunks(self) -> Iterator[numpy.ndarray]:
+        """
+        Iterate over the fingerprint matrix in chunks of rows_per_chunk rows.
+
+        :return: Iterator over matrices of consecutive rows.
+        :rtype: Iterator[numpy.ndarray]
+        """
+        for start in range(0, len(self), self.rows_per_chunk):
+            yield self._rows(start, min(start + self.rows_per_chunk, len(self)))
+
+    def columns(self, start: int, stop: int) -> "FingerprintSource":
+        """
+        Select a range of columns without reading the data.
+
+        :param start: First column.
+        :type start: int
+        :param stop: Column after the last column.
+        :type stop: int
+        :return: Fingerprint source of the columns.
+        :rtype: FingerprintSource
+        """
+        first, _, step = self._columns.indices(self._width)
+        return FingerprintSource(self.data, self.dtype, self.rows_per_chunk,
+                                 slice(first + start * step, first + stop * step, step))
+
+    def __array__(self, dtype: numpy.dtype = None, copy: bool = None) -> numpy.ndarray:
+        matrix = numpy.empty(self.shape, dtype=dtype or self.dtype)
+        start = 0
+        for chunk in self.chunks():
+            matrix[start:start + len(chunk)] = chunk
+            start += len(chunk)
+        return matrix
@@ -0,0 +1,106 @@
+import csv
+import os
+import struct
+from collections import namedtuple
+from typing import Tuple, List, Iterator
+
+from utils import scan_files
+
+ManifestEntry = namedtuple("ManifestEntry", ["path", "size", "mtime_ns", "sample_rate", "frames"])
+
+_fields = list(ManifestEntry._fields)
+
+
+def wav_info(path: str) -> Tuple[int, int]:
+    """
+    Read sample rate and frame count from the header of a RIFF wave file without reading the audio data.
+
+    :param path: Path to wave file
+    :type path: str
+    :return: Tuple of sample rate and number of frames. (0, 0) if the header can not be read.
+    :rtype: Tuple[int, int]
+    """
+    try:
+        with open(path, "rb") as in_file:
+            riff = in_file.read(12)
+            if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+                return 0, 0
+            sample_rate = block_align = 0
+            while True:
+                chunk_id, size = struct.unpack("<4sI", in_file.read(8))
+                if chunk_id == b"fmt ":
+                    fmt = in_file.read(size + (size & 1))
+                    sample_rate, = struct.unpack("<I", fmt[4:8])
+                    block_align, = struct.unpack("<H", fmt[12:14])
+                elif chunk_id == b"data":
+                    return sample_rate, size // block_align if block_align else 0
+                else:
+                    in_file.seek(size + (size & 1), os.SEEK_CUR)
+    except (OSError, struct.error):
+        return 0, 0
+
+
+def _describe(entry: os.DirEntry) -> ManifestEntry:
+    """
+    Create manifest entry for a file found by the scanner.
+
+    :param entry: Directory entry of the file
+    :type entry: os.DirEntry
+    :return: Manifest entry
+    :rtype: ManifestEntry
+    """
+    st = entry.stat()
+    return ManifestEntry(entry.path, st.st_size, st.st_mtime_ns, *wav_info(entry.path))
+
+
+def scan_manifest(folder_path: str, exts: List[str], manifest_path: str, threads: int = 0) -> Iterator[ManifestEntry]:
+    """
+    Scan folder for audio files and write a tab separated manifest of them. Entries are yielded while the scan is
+    still running. The manifest only replaces an existing file once the scan has finished. If the iterator is closed
+    early, e.g. because only the first files were used, the rest of the folder is scanned on closing so the manifest
+    is still complete.
+
+    :param folder_path: Path to folder
+    :type folder_path: str
+    :param exts: list of file extensions to accept
+    :type exts: List[str]
+    :param manifest_path: Path to manifest file
+    :type manifest_path: str
+    :param threads: Number of folders to scan at once. 0 for the thread pool default.
+    :type threads: int
+    :return: Iterator over manifest entries
+    :rtype: Iterator[ManifestEntry]
+    """
+    tmp_path = manifest_path + ".tmp"
+    try:
+        with open(tmp_path, "w", newline="") as out_file:
+            writer = csv.writer(out_file, delimiter="\t")
+            writer.writerow(_fields)
+            entries = scan_files(folder_path, exts, threads, _describe)
+            try:
+                for entry in entries:
+                    writer.writerow(entry)
+                    yield entry
+            except GeneratorExit:
+                writer.writerows(entries)
+        os.replace(tmp_path, manifest_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def read_manifest(manifest_path: str) -> Iterator[ManifestEntry]:
+    """
+    Read entries from a manifest file.
+
+    :param manifest_path: Path to manifest file
+    :type manifest_path: str
+    :return: Iterator over manifest entries
+    :rtype: Iterator[ManifestEntry]
+    """
+    with open(manifest_path, newline="") as in_file:
+        reader = csv.reader(in_file, delimiter="\t")
+        if next(reader, None) != _fields:
+            raise ValueError("{} is not a manifest file.".format(manifest_path))
+        for row in reader:
+            yield ManifestEntry(row[0], *(int(x) for x in row[1:]))
@@ -0,0 +1,46 @@
+import csv
+import os
+import shutil
+import tempfile
+from unittest import mock, TestCase
+
+import numpy
+import scipy.io.wavfile
+
+from benchmark import make_corpus, synthesize_clip
+
+
+class TestCorpus(TestCase):
+    def setUp(self):
+        self.folder = os.path.join(tempfile.mkdtemp(), "corpus")
+
+    def tearDown(self):
+        shutil.rmtree(os.path.dirname(self.folder))
+
+    def test_synthesize_clip(self):
+        clip = synthesize_clip(3, 100, 8000)
+        self.assertEqual(clip.dtype, numpy.int16)
+        self.assertEqual(len(clip), 800)
+        numpy.testing.assert_array_equal(clip, synthesize_clip(3, 100, 8000))
+        self.assertFalse(numpy.array_equal(clip, synthesize_clip(4, 100, 8000)))
+        self.assertFalse(numpy.array_equal(clip, synthesize_clip(3, 100, 8000, seed=1)))
+
+    def test_make_corpus(self):
+        make_corpus(self.folder, 3, 50, 8000)
+        self.assertEqual(sorted(os.listdir(self.folder)), ["clip_000000.wav", "clip_000001.wav", "clip_000002.wav",
+                                                           "corpus.json", "labels.csv"])
+        sr, audio = scipy.io.wavfile.read(os.path.join(self.folder, "clip_000001.wav"))
+        self.assertEqual(sr, 8000)
+        numpy.testing.assert_array_equal(audio, synthesize_clip(1, 50, 8000))
+        with open(os.path.join(self.folder, "labels.csv")) as labels_file:
+            rows = list(csv.reader(labels_file))
+        self.assertEqual(rows[0], ["filename", "harmonics", "pitch"])
+        self.assertEqual([r[0] for r in rows[1:]], ["clip_000000.wav", "clip_000001.wav", "clip_000002.wav"])
+
+    def test_make_corpus_reuse(self):
+        make_corpus(self.folder, 2, 50, 8000)
+        with mock.patch("scipy.io.wavfile.write") as mock_write:
+            make_corpus(self.folder, 2, 50, 8000)
+            self.assertFalse(mock_write.called)
+            make_corpus(self.folder, 2, 60, 8000)
+            self.assertTrue(mock_write.called)
@@ -0,0 +1,25 @@
+from unittest import mock, TestCase
+
+from benchmark import compare_to_baseline, time_call
+
+
+class TestSuite(TestCase):
+    def test_time_call(self):
+        function = mock.MagicMock()
+        setup = mock.MagicMock()
+        self.assertGreaterEqual(time_call(function, 3, setup), 0)
+        self.assertEqual(function.call_count, 3)
+        self.assertEqual(setup.call_count, 3)
+
+    @mock.patch("time.perf_counter")
+    def test_time_call_minimum(self, mock_counter):
+        mock_counter.side_effect = [0, 5, 10, 12, 20, 24]
+        self.assertEqual(time_call(lambda: None, 3), 2)
+
+    def test_compare_to_baseline(self):
+        results = {"fingerprint/ms/1000x1000ms": 1.1, "reduction/pca/1000x520": 2.5, "output/1000": 0.1}
+        baseline = {"fingerprint/ms/1000x1000ms": 1.0, "reduction/pca/1000x520": 2.0}
+        comparison = compare_to_baseline(results, baseline, 0.2)
+        self.assertEqual(comparison, [("fingerprint/ms/1000x1000ms", 1.0, 1.1, False),
+                                      ("output/1000", None, 0.1, False),
+                                      ("reduction/pca/1000x520", 2.0, 2.5, True)])
@@ -2,6 +2,7 @@ from unittest import mock, TestCase
 
 import numpy
 
+from subprocesses import FingerprintSource
 from subprocesses.dimensionality_reduction import pca
 from crunch import _arg_parse
 
@@ -15,6 +16,37 @@ class TestCalculatePCA(TestCase):
         self.assertEqual(ret[0][1], "pca")
         self.assertEqual(len(ret), 1)
 
+    def test_pca_float32(self):
+        args = _arg_parse().parse_args(["--dtype", "float32"])
+        arr = numpy.asarray([[1, 2, 3], [3, 4, 7], [5, 6, 7], [1, 0, 1]])
+        ret = pca(arr, 2, args)
+        self.assertEqual(ret[0][0].dtype, numpy.float32)
+
+    def test_pca_incremental(self):
+        args = _arg_parse().parse_args(["--pca_solver", "incremental", "--rows_per_chunk", "4"])
+        arr = numpy.random.RandomState(0).rand(10, 5)
+        ret = pca(FingerprintSource(arr, "float32", 4), 2, args)
+        self.assertEqual(ret[0][0].shape, (10, 2))
+        self.assertEqual(ret[0][0].dtype, numpy.float32)
+        args.rows_per_chunk = 10
+        ret = pca(arr, 2, args)
+        expected = pca(arr.copy(), 2, _arg_parse().parse_args([]))[0][0]
+        numpy.testing.assert_allclose(numpy.abs(ret[0][0]), numpy.abs(expected), atol=1e-6)
+
+    def test_pca_randomized(self):
+        args = _arg_parse().parse_args(["--pca_solver", "randomized"])
+        arr = numpy.random.RandomState(0).rand(50, 6)
+        ret = pca(arr.copy(), 2, args)
+        expected = pca(arr.copy(), 2, _arg_parse().parse_args([]))[0][0]
+        numpy.testing.assert_allclose(numpy.abs(ret[0][0]), numpy.abs(expected), atol=1e-6)
+
+    def test_pca_fingerprint_source(self):
+        args = _arg_parse().parse_args()
+        arr = numpy.random.RandomState(0).rand(10, 5)
+        ret = pca(FingerprintSource(arr, "float64", 3), 2, args)
+        expected = pca(arr.copy(), 2, args)[0][0]
+        numpy.testing.assert_allclose(ret[0][0], expected)
+
     @mock.patch("subprocesses.dimensionality_reduction.PCA")
     def test_pca_func_call(self, mock_sci_pca):
         mock_func = mock.MagicMock()
@@ -22,8 +54,26 @@ class TestCalculatePCA(TestCase):
         arr = numpy.asarray([1, 2, 3])
         params = (4, 5)
         res = pca(arr, 2, args, mock_func, params)
-        mock_sci_pca.assert_called_with(n_components=2, svd_solver='full')
+        mock_sci_pca.assert_called_with(n_components=2, svd_solver='full', copy=False)
         self.assertEqual(mock_func.call_args[0][0][1], "pca")
         self.assertEqual(mock_func.call_args[0][1], 4)
         self.assertEqual(mock_func.call_args[0][2], 5)
         self.assertEqual(res[0][1], "pca")
+
+    def test_pca_input_unchanged(self):
+        args = _arg_parse().parse_args()
+        arr = numpy.random.RandomState(0).rand(10, 5)
+        original = arr.copy()
+        ret = pca(arr, 2, args)
+        numpy.testing.assert_array_equal(arr, original)
+        numpy.testing.assert_allclose(pca(arr, 2, args, overwrite_input=True)[0][0], ret[0][0])
+        self.assertFalse(numpy.allclose(arr, original))
+
+    def test_pca_projection(self):
+        arr = numpy.random.RandomState(0).rand(12, 5)
+        for solver in ["full", "incremental"]:
+            args = _arg_parse().parse_args(["--pca_solver", solver])
+            x_nd, _, projection = pca(arr.copy(), 2, args)[0]
+            projected = ((arr - projection["scale_mean"]) / projection["scale"] - projection["mean"]) @ \
+                projection["components"].T
+            numpy.testing.assert_allclose(projected, x_nd, atol=1e-10)
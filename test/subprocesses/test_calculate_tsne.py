@@ -1,13 +1,15 @@
+import os
 from unittest import mock, TestCase
 from unittest.mock import call
 
 import numpy
 
-from subprocesses.dimensionality_reduction import t_sne, _t_sne_job
+from subprocesses.dimensionality_reduction import t_sne, _t_sne_job, _tsne_method, _neighbor_distances, \
+    _share_distances, _load_distances, _job_memory, _schedule, _pre_pca, _rescale_init, _fill_missing
 from crunch import _arg_parse
 
 
-def mock_tsne_job(arr, perp, dims, a, b):
+def mock_tsne_job(arr, perp, dims, a, b, method, angle, metric, init, params):
     return numpy.asarray([3, 2, 1]), "mock"
 
 
@@ -47,8 +49,180 @@ class TestCalculateTSNE(TestCase):
         arr = numpy.asarray([1, 2, 3])
         params = (4, 5)
         res = _t_sne_job(arr, 30, 2, mock_func, params)
-        mock_sci_tsne.assert_called_with(learning_rate=50, method='exact', n_components=2, perplexity=30, verbose=2)
+        mock_sci_tsne.assert_called_with(learning_rate=50, method='exact', angle=0.5, n_components=2, perplexity=30,
+                                         metric="euclidean", init="pca", verbose=2)
         self.assertEqual(mock_func.call_args[0][0][1], "30")
         self.assertEqual(mock_func.call_args[0][1], 4)
         self.assertEqual(mock_func.call_args[0][2], 5)
         self.assertEqual(res[1], "30")
+
+    @mock.patch("subprocesses.dimensionality_reduction.TSNE")
+    def test_t_sne_job_barnes_hut(self, mock_tsne):
+        mock_tsne.return_value.fit_transform.return_value = numpy.zeros((3, 2))
+        _t_sne_job(numpy.zeros((3, 4)), 30, 2, method="barnes_hut", angle=0.7)
+        self.assertEqual(mock_tsne.call_args[1]["method"], "barnes_hut")
+        self.assertEqual(mock_tsne.call_args[1]["angle"], 0.7)
+
+    @mock.patch("subprocesses.dimensionality_reduction.TSNE")
+    def test_t_sne_job_precomputed_copy(self, mock_tsne):
+        mock_tsne.return_value.fit_transform.return_value = numpy.zeros((20, 2))
+        data = numpy.random.RandomState(0).rand(20, 4)
+        for method in ["exact", "barnes_hut"]:
+            paths = _share_distances(_neighbor_distances(data, method, 2))
+            try:
+                shared = _load_distances(paths)
+                _t_sne_job(shared, 2, 2, method=method, metric="precomputed", init="random")
+                passed = mock_tsne.return_value.fit_transform.call_args[0][0]
+                if method == "exact":
+                    self.assertIsNot(passed, shared, "exact t-SNE squares its input in place")
+                    numpy.testing.assert_array_equal(passed, shared)
+                    self.assertTrue(passed.flags.writeable)
+                else:
+                    self.assertIs(passed, shared, "Barnes-Hut should use the shared graph as is")
+                del shared, passed
+            finally:
+                for path in paths:
+                    os.remove(path)
+
+    def test_t_sne_job_shared_graph(self):
+        data = numpy.random.RandomState(0).rand(40, 4)
+        distances = _neighbor_distances(data, "barnes_hut", 5)
+        paths = _share_distances(distances)
+        try:
+            shared = _load_distances(paths)
+            res = _t_sne_job(shared, 5, 2, method="barnes_hut", metric="precomputed", init="random")
+            self.assertEqual(res[0].shape, (40, 2))
+            numpy.testing.assert_array_equal(shared.toarray(), distances.toarray())
+            del shared
+        finally:
+            for path in paths:
+                os.remove(path)
+
+    def test_tsne_method(self):
+        args = _arg_parse().parse_args(["--tsne_exact_limit", "100"])
+        self.assertEqual(_tsne_method(args, 100), "exact")
+        self.assertEqual(_tsne_method(args, 101), "barnes_hut")
+        self.assertEqual(_tsne_method(None, 10 ** 6), "exact")
+        args.tsne_method = "exact"
+        self.assertEqual(_tsne_method(args, 101), "exact")
+        args.tsne_method = "barnes_hut"
+        self.assertEqual(_tsne_method(args, 10), "barnes_hut")
+
+    def test_neighbor_distances(self):
+        data = numpy.random.RandomState(0).rand(20, 4)
+        distances = _neighbor_distances(data, "exact", 30)
+        self.assertEqual(distances.shape, (20, 20))
+        self.assertAlmostEqual(distances[0, 1], numpy.linalg.norm(data[0] - data[1]))
+        graph = _neighbor_distances(data, "barnes_hut", 2)
+        self.assertEqual(graph.shape, (20, 20))
+        self.assertEqual(graph.getnnz(axis=1).tolist(), [8] * 20)
+
+    @mock.patch("subprocesses.dimensionality_reduction._t_sne_job")
+    @mock.patch("subprocesses.dimensionality_reduction._neighbor_distances")
+    def test_t_sne_shared_distances(self, mock_distances, mock_t_sne_job):
+        args = _arg_parse().parse_args(["-p", "5", "30", "10"])
+        mock_t_sne_job.return_value = (numpy.zeros((40, 2)), "5")
+        t_sne(numpy.random.RandomState(0).rand(40, 4), 2, args)
+        self.assertEqual(mock_distances.call_count, 1)
+        self.assertEqual(mock_distances.call_args[0][1:3], ("exact", 30))
+        self.assertEqual(mock_t_sne_job.call_count, 3)
+        for job_call in mock_t_sne_job.call_args_list:
+            self.assertIs(job_call[0][0], mock_distances.return_value)
+            self.assertEqual(job_call[0][7], "precomputed")
+
+    def test_share_distances(self):
+        data = numpy.random.RandomState(0).rand(20, 4)
+        for method in ["exact", "barnes_hut"]:
+            distances = _neighbor_distances(data, method, 2)
+            paths = _share_distances(distances)
+            try:
+                shared = _load_distances(paths)
+                numpy.testing.assert_array_equal(shared if method == "exact" else shared.toarray(),
+                                                  distances if method == "exact" else distances.toarray())
+            finally:
+                for path in paths:
+                    os.remove(path)
+
+    def test_job_memory(self):
+        self.assertEqual(_job_memory(1000, "exact", 30, 2), 36 * 10 ** 6)
+        self.assertLess(_job_memory(1000, "barnes_hut", 5, 2), _job_memory(1000, "barnes_hut", 50, 2))
+        self.assertLess(_job_memory(10 ** 5, "barnes_hut", 50, 3), _job_memory(10 ** 4, "exact", 50, 3))
+
+    def test_schedule(self):
+        pool = mock.MagicMock()
+        running = []
+
+        def apply_async(function, job):
+            running.append(job[0])
+            self.assertTrue(sum(running) <= 10 or len(running) == 1)
+            result = mock.MagicMock()
+            result.get.side_effect = lambda: running.remove(job[0]) or function(*job)
+            return result
+
+        pool.apply_async.side_effect = apply_async
+        res = _schedule(pool, lambda x: x * 2, [(6,), (4,), (5,), (20,)], [6, 4, 5, 20], 10)
+        self.assertEqual(res, [12, 8, 10, 40])
+        self.assertEqual(pool.apply_async.call_count, 4)
+
+    def test_pre_pca(self):
+        data = numpy.random.RandomState(0).rand(30, 8)
+        self.assertEqual(_pre_pca(data, 3).shape, (30, 3))
+        self.assertIs(_pre_pca(data, 8), data)
+
+    @mock.patch("subprocesses.dimensionality_reduction._t_sne_job")
+    @mock.patch("subprocesses.dimensionality_reduction._neighbor_distances")
+    def test_t_sne_pre_pca(self, mock_distances, mock_t_sne_job):
+        args = _arg_parse().parse_args(["-p", "5", "--pre_pca", "4"])
+        mock_t_sne_job.return_value = (numpy.zeros((40, 2)), "5")
+        t_sne(numpy.random.RandomState(0).rand(40, 10), 2, args)
+        self.assertEqual(mock_distances.call_args[0][0].shape, (40, 4))
+
+    @mock.patch("subprocesses.dimensionality_reduction._t_sne_job")
+    @mock.patch("subprocesses.dimensionality_reduction._neighbor_distances")
+    def test_t_sne_input_unchanged(self, mock_distances, mock_t_sne_job):
+        args = _arg_parse().parse_args(["-p", "5"])
+        mock_t_sne_job.return_value = (numpy.zeros((40, 2)), "5")
+        data = numpy.random.RandomState(0).rand(40, 10)
+        original = data.copy()
+        t_sne(data, 2, args)
+        numpy.testing.assert_array_equal(data, original)
+        t_sne(data, 2, args, overwrite_input=True)
+        numpy.testing.assert_allclose(data.mean(axis=0), 0, atol=1e-12)
+
+    def test_rescale_init(self):
+        x_nd = _rescale_init(numpy.asarray([[1, 5, 0], [3, 9, 0], [5, 13, 0]]))
+        self.assertAlmostEqual(float(numpy.std(x_nd[:, 0])), 1e-4)
+        numpy.testing.assert_allclose(x_nd[:, 1], 2 * x_nd[:, 0])
+        self.assertGreater(numpy.std(x_nd[:, 2]), 0)
+
+    def test_fill_missing(self):
+        init = numpy.asarray([[1, 1], [numpy.nan, numpy.nan], [5, 5]])
+        data = numpy.asarray([[0, 0], [9, 9], [10, 10]])
+        numpy.testing.assert_array_equal(_fill_missing(init, data), [[1, 1], [5, 5], [5, 5]])
+        self.assertRaises(ValueError, _fill_missing, numpy.full((2, 2), numpy.nan), data[:2])
+
+    @mock.patch("subprocesses.dimensionality_reduction._t_sne_job")
+    @mock.patch("subprocesses.dimensionality_reduction._neighbor_distances")
+    def test_t_sne_chain(self, mock_distances, mock_t_sne_job):
+        args = _arg_parse().parse_args(["-p", "5", "10", "--chain", "--warm_iterations", "300"])
+        first = numpy.random.RandomState(1).rand(40, 2)
+        mock_t_sne_job.side_effect = [(first, "5"), (first, "10")]
+        t_sne(numpy.random.RandomState(0).rand(40, 4), 2, args)
+        first_call, second_call = mock_t_sne_job.call_args_list
+        self.assertIsNone(first_call[0][9])
+        self.assertEqual(second_call[0][9], {"early_exaggeration": 1.0, "max_iter": 300})
+        numpy.testing.assert_allclose(second_call[0][8], _rescale_init(first), rtol=1e-5)
+
+    @mock.patch("subprocesses.dimensionality_reduction._t_sne_job")
+    @mock.patch("subprocesses.dimensionality_reduction._neighbor_distances")
+    def test_t_sne_init(self, mock_distances, mock_t_sne_job):
+        args = _arg_parse().parse_args(["-p", "5", "--warm_iterations", "300"])
+        mock_t_sne_job.return_value = (numpy.zeros((40, 2)), "5")
+        init = numpy.random.RandomState(1).rand(40, 2)
+        t_sne(numpy.random.RandomState(0).rand(40, 4), 2, args, init=init)
+        numpy.testing.assert_allclose(mock_t_sne_job.call_args[0][8], _rescale_init(init), rtol=1e-5)
+        self.assertEqual(mock_t_sne_job.call_args[0][9], {"early_exaggeration": 1.0, "max_iter": 300})
+        args.tsne_init = "random"
+        t_sne(numpy.random.RandomState(0).rand(40, 4), 2, args)
+        self.assertEqual(mock_t_sne_job.call_args[0][8], "random")
+        self.assertIsNone(mock_t_sne_job.call_args[0][9])
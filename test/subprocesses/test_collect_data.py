@@ -1,5 +1,13 @@
-from unittest import mock, TestCase
+import os
+import shutil
+import tempfile
+from unittest import mock, skipUnless, TestCase
+try:
+    import resource
+except ImportError:
+    resource = None
 import numpy
+import scipy.io.wavfile
 from subprocesses.collect_data import load_sample
 
 
@@ -34,3 +42,41 @@ class TestCollectData(TestCase):
         self.assertTrue("bla" in res[0], "filename not in results")
         self.assertEqual(len(res[1]), 10, "Unexpected size of audio")
         self.assertEqual(res[2], 10, "Incorrect audio length in return")
+
+    @mock.patch("scipy.io.wavfile.read")
+    def test_load_sample_no_mmap(self, mock_wavfile_read):
+        f_data = (10, numpy.asarray([1, 2, 3, 4, 5, 6, 7, 8, 9, 10]))
+        mock_wavfile_read.side_effect = [ValueError("mmap not supported"), f_data]
+        res = load_sample("bla.wav", 500)
+        mock_wavfile_read.assert_called_with("bla.wav")
+        numpy.testing.assert_array_equal(res[1], [1, 2, 3, 4, 5])
+
+    def test_load_sample_memory_mapped(self):
+        folder = tempfile.mkdtemp()
+        try:
+            path = os.path.join(folder, "sample.wav")
+            audio = numpy.arange(200, dtype=numpy.int16).reshape(100, 2)
+            scipy.io.wavfile.write(path, 100, audio)
+            res = load_sample(path, 500)
+            self.assertIsNone(res[1].base)
+            self.assertTrue(res[1].flags.c_contiguous)
+            numpy.testing.assert_array_equal(res[1], audio[:50, 0])
+            self.assertEqual(res[2], 50)
+            self.assertEqual(res[3], 100)
+            del res
+        finally:
+            shutil.rmtree(folder)
+
+    @skipUnless(resource and os.path.isdir("/proc/self/fd"), "needs resource limits and /proc")
+    def test_load_sample_file_descriptors(self):
+        folder = tempfile.mkdtemp()
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        try:
+            path = os.path.join(folder, "sample.wav")
+            scipy.io.wavfile.write(path, 100, numpy.zeros((100, 2), dtype=numpy.int16))
+            resource.setrlimit(resource.RLIMIT_NOFILE, (len(os.listdir("/proc/self/fd")) + 10, hard))
+            samples = [load_sample(path, 500) for _ in range(50)]
+            self.assertEqual(len(samples), 50)
+        finally:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+            shutil.rmtree(folder)
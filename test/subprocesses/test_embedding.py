@@ -0,0 +1,42 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy
+from numpy.testing import assert_array_equal, assert_allclose
+
+from subprocesses import load_embedding, projection_path, save_projection, linear_projection, knn_projection
+
+
+class TestLoadEmbedding(TestCase):
+    def test_load_embedding(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "t_sne_30.json")
+            with open(path, "w") as json_file:
+                json.dump({"totalPoints": 2, "points": [[1, 2, 0, "a.wav"], [3, 4, 0, "b.wav"]]}, json_file)
+            embedding = load_embedding(path, ["root/b.wav", "root/c.wav", "root/a.wav"], 2)
+        assert_array_equal(embedding[0], [3, 4])
+        self.assertTrue(numpy.isnan(embedding[1]).all())
+        assert_array_equal(embedding[2], [1, 2])
+
+
+class TestProjection(TestCase):
+    def test_projection_path(self):
+        self.assertEqual(projection_path(os.path.join("out", "pca.json")), os.path.join("out", "pca.npz"))
+
+    def test_linear_projection(self):
+        projection = {"scale_mean": numpy.asarray([1.0, 0.0]), "scale": numpy.asarray([2.0, 1.0]),
+                      "mean": numpy.zeros(2), "components": numpy.asarray([[0.0, 1.0], [1.0, 0.0]])}
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "pca.npz")
+            save_projection(path, projection, -1.0, 10.0, 5.0)
+            x_nd = linear_projection(numpy.asarray([[3.0, 2.0]]), path)
+        assert_allclose(x_nd, [[35, 25]])
+
+    def test_knn_projection(self):
+        known = numpy.asarray([[0.0, 0.0], [1.0, 0.0], [10.0, 10.0]])
+        positions = numpy.asarray([[0.0, 0.0], [2.0, 0.0], [50.0, 50.0]])
+        x_nd = knn_projection(known, positions, numpy.asarray([[0.25, 0.0], [10.0, 10.0]]), 2)
+        assert_allclose(x_nd[0], [0.5, 0.0])
+        assert_allclose(x_nd[1], [50.0, 50.0])
@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import numpy
+from numpy.testing import assert_array_equal
+
+from subprocesses import FingerprintCache
+
+
+class TestFingerprintCache(TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.cache = FingerprintCache(os.path.join(self.folder, "cache"))
+        self.audio = os.path.join(self.folder, "sample.wav")
+        with open(self.audio, "wb") as f:
+            f.write(b"mock audio")
+        self.params = {"method": "ms", "duration": 0}
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_get_missing(self):
+        self.assertIsNone(self.cache.get(self.audio, self.params))
+
+    def test_put_and_get(self):
+        arr = numpy.asarray([[1.5, 2], [3, 4]])
+        self.cache.put(self.audio, self.params, arr, 10)
+        fingerprint, length = self.cache.get(self.audio, self.params)
+        assert_array_equal(fingerprint, arr)
+        self.assertEqual(length, 10)
+
+    def test_parameters_in_key(self):
+        self.cache.put(self.audio, self.params, numpy.asarray([1, 2]), 10)
+        self.assertIsNone(self.cache.get(self.audio, {"method": "ms", "duration": 500}))
+        self.assertIsNone(self.cache.get(self.audio, {"method": "mfcc", "duration": 0}))
+
+    def test_changed_file(self):
+        self.cache.put(self.audio, self.params, numpy.asarray([1, 2]), 10)
+        with open(self.audio, "wb") as f:
+            f.write(b"changed mock audio")
+        self.assertIsNone(self.cache.get(self.audio, self.params))
+
+    def test_content_key(self):
+        cache = FingerprintCache(self.cache.cache_dir, content_key=True)
+        cache.put(self.audio, self.params, numpy.asarray([1, 2]), 10)
+        moved = os.path.join(self.folder, "moved.wav")
+        shutil.copy(self.audio, moved)
+        assert_array_equal(cache.get(moved, self.params)[0], [1, 2])
+
+    def test_invalidate_method(self):
+        self.cache.put(self.audio, self.params, numpy.asarray([1, 2]), 10)
+        self.cache.put(self.audio, {"method": "mfcc", "duration": 0}, numpy.asarray([3, 4]), 10)
+        self.cache.invalidate("ms")
+        self.assertIsNone(self.cache.get(self.audio, self.params))
+        self.assertIsNotNone(self.cache.get(self.audio, {"method": "mfcc", "duration": 0}))
+
+    def test_invalidate_feature_set(self):
+        self.cache.put(self.audio, {"method": "ms+chroma", "duration": 0}, numpy.asarray([1, 2]), 10)
+        self.cache.put(self.audio, {"method": "mfcc+chroma", "duration": 0}, numpy.asarray([1, 2]), 10)
+        self.cache.invalidate("ms")
+        self.assertIsNone(self.cache.get(self.audio, {"method": "ms+chroma", "duration": 0}))
+        self.assertIsNotNone(self.cache.get(self.audio, {"method": "mfcc+chroma", "duration": 0}))
+
+    def test_invalidate_all(self):
+        self.cache.put(self.audio, self.params, numpy.asarray([1, 2]), 10)
+        self.cache.invalidate()
+        self.assertFalse(os.path.exists(self.cache.cache_dir))
+
+    def test_evict(self):
+        self.cache.put(self.audio, self.params, numpy.zeros(1000), 10)
+        entry_size = self.cache.size()
+        old_entry = self.cache.entry_path(self.audio, self.params)
+        os.utime(old_entry, (0, 0))
+        self.cache.put(self.audio, {"method": "ms", "duration": 500}, numpy.zeros(1000), 10)
+        self.cache.max_size = entry_size
+        self.assertEqual(self.cache.evict(), 1)
+        self.assertFalse(os.path.exists(old_entry))
+        self.assertIsNotNone(self.cache.get(self.audio, {"method": "ms", "duration": 500}))
+
+    def test_evict_unlimited(self):
+        self.cache.put(self.audio, self.params, numpy.zeros(1000), 10)
+        self.assertEqual(self.cache.evict(), 0)
@@ -1,6 +1,9 @@
+import warnings
 from unittest import mock, TestCase
+import librosa
 import numpy
 import subprocesses
+from subprocesses import fingerprint
 
 
 class TestFingerprintFormData(TestCase):
@@ -9,21 +12,20 @@ class TestFingerprintFormData(TestCase):
             numpy.asarray([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 9, 8, 7, 6, 5, 4, 3, 2, 1]), 16000, 500)
         self.assertEqual(r.shape, (32, 32), "unexpected result shape")
 
-    @mock.patch("librosa.feature.mfcc")
-    def test_mfcc_fingerprint(self, mock_mfcc):
-        data = "mock_data"
-        mock_mfcc.return_value = "mock_return"
+    def test_mfcc_fingerprint(self):
+        data = numpy.random.RandomState(0).randn(16000)
         res = subprocesses.mfcc_fingerprint(data, 16000, 16000)
-        self.assertEqual(res, "mock_return")
-        mock_mfcc.assert_called_with(data, 16000, hop_length=640, n_mfcc=20)
+        self.assertEqual(res.shape, (20, 26), "unexpected result shape")
+        numpy.testing.assert_allclose(res, subprocesses.mfcc_batch_fingerprint(data[numpy.newaxis], 16000, 16000)[0])
 
-    @mock.patch("librosa.feature.chroma_stft")
-    def test_chroma_fingerprint(self, mock_chroma):
-        data = "mock_data"
-        mock_chroma.return_value = "mock_return"
-        res = subprocesses.chroma_fingerprint(data, 16000, 16000)
-        self.assertEqual(res, "mock_return")
-        mock_chroma.assert_called_with(y=data, sr=16000, hop_length=640)
+    @mock.patch("subprocesses.fingerprint._chroma_basis")
+    @mock.patch("librosa.estimate_tuning")
+    def test_chroma_fingerprint(self, mock_tuning, mock_basis):
+        mock_tuning.return_value = 0.0131
+        mock_basis.return_value = numpy.ones((12, 1025))
+        res = subprocesses.chroma_fingerprint(numpy.random.RandomState(0).randn(16000), 16000, 16000)
+        mock_basis.assert_called_with(16000, 2048, 0.01)
+        self.assertEqual(res.shape, (12, 26), "unexpected result shape")
 
     @mock.patch("librosa.feature.tonnetz")
     def test_tonnez_fingerprint(self, mock_tonnez):
@@ -35,10 +37,91 @@ class TestFingerprintFormData(TestCase):
         numpy.testing.assert_array_equal(mock_tonnez.call_args[1]["y"], data.astype(numpy.float64))
         self.assertEqual(mock_tonnez.call_args[1]["sr"], 16000)
 
-    @mock.patch("librosa.feature.melspectrogram")
-    def test_ms_fingerprint(self, mock_ms):
-        data = "mock_data"
-        mock_ms.return_value = "mock_return"
+    def test_ms_fingerprint(self):
+        fingerprint._mel_basis.cache_clear()
+        data = numpy.random.RandomState(0).randn(16000)
         res = subprocesses.ms_fingerprint(data, 16000, 16000)
-        self.assertEqual(res, "mock_return")
-        mock_ms.assert_called_with(y=data, sr=16000, hop_length=640)
+        subprocesses.ms_fingerprint(data, 16000, 16000)
+        self.assertEqual(res.shape, (128, 26), "unexpected result shape")
+        self.assertEqual(fingerprint._mel_basis.cache_info().misses, 1, "mel filter bank built more than once")
+
+    def test_ms_fingerprint_fixed_frames(self):
+        data = numpy.random.RandomState(0).randn(30)
+        self.assertEqual(subprocesses.ms_fingerprint(data, 16000, 30).shape, (128, 26))
+        res = subprocesses.ms_fingerprint(data[:2], 16000, 2)
+        self.assertEqual(res.shape, (128, 26))
+        numpy.testing.assert_array_equal(res[:, 3:], 0)
+
+
+class TestBatchFingerprint(TestCase):
+    def setUp(self):
+        self.data = numpy.random.RandomState(0).randn(3, 8000)
+
+    def _check_batch(self, function, shape):
+        res = function(self.data, 16000, 8000)
+        self.assertEqual(res.shape, (3,) + shape, "unexpected result shape")
+        single = function(self.data[1:2], 16000, 8000)
+        numpy.testing.assert_allclose(res[1], single[0])
+
+    def test_fft_batch_fingerprint(self):
+        self._check_batch(subprocesses.fft_batch_fingerprint, (32, 32))
+
+    def test_ms_batch_fingerprint(self):
+        self._check_batch(subprocesses.ms_batch_fingerprint, (128, 26))
+
+    def test_chroma_batch_fingerprint(self):
+        self._check_batch(subprocesses.chroma_batch_fingerprint, (12, 26))
+
+    def test_mfcc_batch_fingerprint(self):
+        self._check_batch(subprocesses.mfcc_batch_fingerprint, (20, 26))
+
+    @staticmethod
+    def _librosa_reference(method, clip, sr):
+        hop = max(1, len(clip) // 25)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            power = numpy.abs(librosa.stft(clip, n_fft=2048, hop_length=hop, pad_mode="constant")) ** 2
+        if method == "chroma":
+            reference = librosa.feature.chroma_stft(S=power, sr=sr, n_fft=2048)
+        else:
+            reference = librosa.feature.melspectrogram(S=power, sr=sr, n_fft=2048)
+        reference = fingerprint._fix_frames(reference)
+        if method == "mfcc":
+            reference = librosa.feature.mfcc(S=librosa.power_to_db(reference), n_mfcc=20)
+        return reference
+
+    def test_batch_fingerprint_librosa_reference(self):
+        short = numpy.random.RandomState(1).randn(2, 500)
+        for method in ["ms", "mfcc", "chroma"]:
+            function = getattr(subprocesses, method + "_batch_fingerprint")
+            for clips, size in [(self.data, 8000), (short, 500)]:
+                res = function(clips, 16000, size)
+                for i in range(len(clips)):
+                    reference = self._librosa_reference(method, clips[i], 16000)
+                    numpy.testing.assert_allclose(res[i], reference, rtol=1e-6, atol=1e-6 * numpy.abs(reference).max(),
+                                                  err_msg="{} of a clip of {} samples".format(method, size))
+
+    def test_batch_fingerprint_fixed_frames(self):
+        res = subprocesses.ms_batch_fingerprint(self.data[:, :30], 16000, 30)
+        self.assertEqual(res.shape, (3, 128, 26), "unexpected result shape")
+
+
+class TestSpectralFingerprint(TestCase):
+    def setUp(self):
+        self.data = numpy.random.RandomState(0).randn(2, 8000)
+
+    def test_spectral_fingerprint(self):
+        res = subprocesses.spectral_fingerprint(self.data[0], 16000, 8000, ["ms", "mfcc", "chroma"])
+        self.assertEqual(res.shape, (160, 26), "unexpected result shape")
+        numpy.testing.assert_allclose(res[:128], subprocesses.ms_fingerprint(self.data[0], 16000, 8000))
+        numpy.testing.assert_allclose(res[128:148], subprocesses.mfcc_fingerprint(self.data[0], 16000, 8000))
+        numpy.testing.assert_allclose(res[148:], subprocesses.chroma_fingerprint(self.data[0], 16000, 8000))
+
+    def test_spectral_batch_fingerprint(self):
+        res = subprocesses.spectral_batch_fingerprint(self.data, 16000, 8000, ["chroma", "mfcc"])
+        self.assertEqual(res.shape, (2, 32, 26), "unexpected result shape")
+        numpy.testing.assert_allclose(res[:, :12], subprocesses.chroma_batch_fingerprint(self.data, 16000, 8000))
+        numpy.testing.assert_allclose(res[:, 12:], subprocesses.mfcc_batch_fingerprint(self.data, 16000, 8000))
+
+    def test_spectral_fingerprint_unsupported(self):
+        self.assertRaises(ValueError, subprocesses.spectral_batch_fingerprint, self.data, 16000, 8000, ["fft"])
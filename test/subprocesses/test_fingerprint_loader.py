@@ -1,45 +1,155 @@
+import os
+import shutil
+import tempfile
 from unittest import TestCase, mock
 
 import numpy as np
 from numpy.testing import assert_array_equal
 
-from crunch import _arg_parse, load_fingerprints
+from crunch import _arg_parse, load_fingerprints, ProcessFunctions
+from subprocesses import save_numpy_fingerprints, load_numpy_fingerprints, save_matrix_fingerprints, \
+    load_matrix_fingerprints, load_fingerprint_store, load_delimited_fingerprints, load_csv_fingerprints, \
+    load_tsv_fingerprints, FingerprintSource
 
 
 class TestFingerprintLoader(TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def _write(self, name, text):
+        path = os.path.join(self.folder, name)
+        with open(path, "w") as out_file:
+            out_file.write(text)
+        return path
+
     def test_load_csv_fingerprint(self):
-        with mock.patch("builtins.open", mock.mock_open()) as m:
-            with mock.patch("csv.reader") as mock_csv_reader:
-                args = _arg_parse().parse_args(["-e", "mock.csv", "--format", "csv"])
-                mock_csv_reader.return_value = [["name_1", "1", "2", "3"],
-                                                ["name_2", "4", "5", "6"]]
-                results, file_data = load_fingerprints(args)
-                m.assert_called_with("mock.csv")
-                self.assertSequenceEqual(file_data, ["name_1", "name_2"])
-                self.assertEqual(len(results), 2)
-                assert_array_equal(results[0], [1, 2, 3])
-                assert_array_equal(results[1], [4, 5, 6])
+        path = self._write("mock.csv", "name_1,1,2,3\nname_2,4,5,6\n")
+        args = _arg_parse().parse_args(["-e", path, "--format", "csv"])
+        results, file_data = load_fingerprints(args)
+        self.assertSequenceEqual(file_data, ["name_1", "name_2"])
+        self.assertEqual(len(results), 2)
+        assert_array_equal(results[0], [1, 2, 3])
+        assert_array_equal(results[1], [4, 5, 6])
 
     def test_load_tsv_fingerprint(self):
-        with mock.patch("builtins.open", mock.mock_open()) as m:
-            with mock.patch("csv.reader") as mock_csv_reader:
-                args = _arg_parse().parse_args(["-e", "mock.tsv", "--format", "tsv"])
-                mock_csv_reader.return_value = [["name_1", "1", "2", "3"],
-                                                ["name_2", "4", "5", "6"]]
-                results, file_data = load_fingerprints(args)
-                m.assert_called_with("mock.tsv")
-                self.assertSequenceEqual(file_data, ["name_1", "name_2"])
-                self.assertEqual(len(results), 2)
-                assert_array_equal(results[0], [1, 2, 3])
-                assert_array_equal(results[1], [4, 5, 6])
+        path = self._write("mock.tsv", "name_1\t1\t2\t3\nname_2\t4\t5\t6")
+        args = _arg_parse().parse_args(["-e", path, "--format", "tsv"])
+        results, file_data = load_fingerprints(args)
+        self.assertSequenceEqual(file_data, ["name_1", "name_2"])
+        self.assertEqual(len(results), 2)
+        assert_array_equal(results[0], [1, 2, 3])
+        assert_array_equal(results[1], [4, 5, 6])
+
+    def test_load_delimited_fingerprints_chunks(self):
+        path = self._write("mock.csv", "name_1,1.5,-2,3e2\n\"name,2\",4,5,6\n\nname_3,7,8,9\n")
+        results, file_data = load_delimited_fingerprints(path, ",", chunk_rows=2)
+        self.assertSequenceEqual(file_data, ["name_1", "name,2", "name_3"])
+        assert_array_equal(results, [[1.5, -2, 300], [4, 5, 6], [7, 8, 9]])
+
+    def test_load_delimited_fingerprints_invalid(self):
+        path = self._write("mock.csv", "name_1,1,2\nname_2,3,x\n")
+        self.assertRaises(ValueError, load_delimited_fingerprints, path, ",")
+        path = self._write("mock.csv", "name_1,1,2\nname_2,3\n")
+        self.assertRaises(ValueError, load_delimited_fingerprints, path, ",")
+        path = self._write("mock.csv", "a,1,2,3\nb,4\nc,5,6,7,8,9\n")
+        with self.assertRaisesRegex(ValueError, "row 2 \\(b\\)"):
+            load_delimited_fingerprints(path, ",")
+        path = self._write("mock.csv", "name_1,1,2\nname_2,3,\n")
+        with self.assertRaisesRegex(ValueError, "between rows 1 and 2"):
+            load_delimited_fingerprints(path, ",")
+
+    def test_load_delimited_fingerprints_dtype(self):
+        path = self._write("mock.csv", "name_1, 1.5,2\nname_2,3 ,-4e-1\n")
+        results, _ = load_csv_fingerprints(path, dtype="float32")
+        self.assertEqual(results.dtype, np.float32)
+        assert_array_equal(results, np.asarray([[1.5, 2], [3, -0.4]], dtype=np.float32))
+        path = self._write("mock.tsv", "name_1\t1\t2\n")
+        self.assertEqual(load_tsv_fingerprints(path, dtype="float32")[0].dtype, np.float32)
+
+    def test_load_fingerprints_dtype(self):
+        path = self._write("mock.csv", "name_1,1,2,3\nname_2,4,5,6\n")
+        loader = mock.MagicMock(side_effect=load_csv_fingerprints)
+        with mock.patch.dict(ProcessFunctions.fingerprint_loader, {"csv": loader}):
+            results, _ = load_fingerprints(_arg_parse().parse_args(["-e", path, "--format", "csv",
+                                                                    "--dtype", "float32"]))
+        loader.assert_called_with(path, dtype="float32")
+        self.assertEqual(results.dtype, np.float32)
 
     def test_load_numpy_fingerprint(self):
         with mock.patch("numpy.load", mock.mock_open()) as mock_load:
             args = _arg_parse().parse_args(["-e", "mock.npy", "--format", "npy"])
             mock_load.return_value = [("name_1", np.asarray([1, 2, 3])), ("name_2", np.asarray([4, 5, 6]))]
             results, file_data = load_fingerprints(args)
-            mock_load.assert_called_with("mock.npy")
+            mock_load.assert_called_with("mock.npy", allow_pickle=True)
             self.assertSequenceEqual(file_data, ["name_1", "name_2"])
             self.assertEqual(len(results), 2)
             assert_array_equal(results[0], [1, 2, 3])
             assert_array_equal(results[1], [4, 5, 6])
+
+    def test_load_fingerprint_float32(self):
+        with mock.patch("numpy.load", mock.mock_open()) as mock_load:
+            args = _arg_parse().parse_args(["-e", "mock.npy", "--dtype", "float32"])
+            mock_load.return_value = [("name_1", np.asarray([1, 2, 3])), ("name_2", np.asarray([4, 5, 6]))]
+            results, file_data = load_fingerprints(args)
+            self.assertEqual(results.dtype, np.float32)
+            assert_array_equal(results[1], [4, 5, 6])
+
+
+class TestFingerprintWriter(TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_save_numpy_fingerprints(self):
+        path = os.path.join(self.folder, "store.npy")
+        save_numpy_fingerprints(path, np.asarray([[1.5, 2, 3], [4, 5, 6]]), ["name_1", "name_2"])
+        results, file_data = load_numpy_fingerprints(path)
+        self.assertSequenceEqual(file_data, ["name_1", "name_2"])
+        assert_array_equal(results[0], [1.5, 2, 3])
+        assert_array_equal(results[1], [4, 5, 6])
+
+    def test_save_matrix_fingerprints(self):
+        path = os.path.join(self.folder, "store.npy")
+        save_matrix_fingerprints(path, np.asarray([[1.5, 2, 3], [4, 5, 6]], dtype=np.float32), ["name_1", "name 2"])
+        self.assertEqual(np.load(path, allow_pickle=False).dtype, np.float32)
+        results, file_data = load_matrix_fingerprints(path)
+        self.assertIsInstance(results, np.memmap)
+        self.assertFalse(results.flags.writeable)
+        self.assertSequenceEqual(file_data, ["name_1", "name 2"])
+        assert_array_equal(results, [[1.5, 2, 3], [4, 5, 6]])
+        self.assertEqual(sorted(os.listdir(self.folder)), ["store.npy", "store.npy.paths"])
+
+    def test_save_matrix_fingerprints_empty(self):
+        path = os.path.join(self.folder, "store.npy")
+        save_matrix_fingerprints(path, np.empty(0), [])
+        results, file_data = load_matrix_fingerprints(path)
+        self.assertEqual(len(results), 0)
+        self.assertSequenceEqual(file_data, [])
+
+    def test_load_matrix_fingerprints_mismatch(self):
+        path = os.path.join(self.folder, "store.npy")
+        save_matrix_fingerprints(path, np.asarray([[1, 2], [3, 4]]), ["name_1", "name_2"])
+        with open(path + ".paths", "w") as paths_file:
+            paths_file.write("name_1\n")
+        self.assertRaises(ValueError, load_matrix_fingerprints, path)
+
+    def test_load_fingerprint_store(self):
+        matrix_path = os.path.join(self.folder, "matrix.npy")
+        numpy_path = os.path.join(self.folder, "numpy.npy")
+        save_matrix_fingerprints(matrix_path, np.asarray([[1, 2]]), ["name_1"])
+        save_numpy_fingerprints(numpy_path, np.asarray([[3, 4]]), ["name_2"])
+        self.assertIsInstance(load_fingerprint_store(matrix_path)[0], np.memmap)
+        assert_array_equal(load_fingerprint_store(numpy_path)[0][0], [3, 4])
+
+    def test_load_matrix_format(self):
+        path = os.path.join(self.folder, "store.npy")
+        save_matrix_fingerprints(path, np.asarray([[1, 2], [3, 4]]), ["name_1", "name_2"])
+        results, file_data = load_fingerprints(_arg_parse().parse_args(["-e", path, "--format", "matrix"]))
+        self.assertIsInstance(results, FingerprintSource)
+        self.assertIsInstance(results.data, np.memmap)
+        assert_array_equal(results, [[1, 2], [3, 4]])
@@ -0,0 +1,38 @@
+from unittest import TestCase
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from subprocesses import FingerprintSource
+
+
+class TestFingerprintSource(TestCase):
+    def setUp(self):
+        self.matrix = np.arange(20).reshape(5, 4)
+
+    def test_shape(self):
+        source = FingerprintSource(self.matrix, "float32", 2)
+        self.assertEqual(len(source), 5)
+        self.assertEqual(source.shape, (5, 4))
+        self.assertEqual(source.nbytes, 80)
+
+    def test_chunks(self):
+        chunks = list(FingerprintSource(self.matrix, "float32", 2).chunks())
+        self.assertEqual([len(c) for c in chunks], [2, 2, 1])
+        self.assertEqual(chunks[0].dtype, np.float32)
+        assert_array_equal(np.concatenate(chunks), self.matrix)
+
+    def test_list_of_fingerprints(self):
+        source = FingerprintSource([r.reshape(2, 2) for r in self.matrix], rows_per_chunk=3)
+        self.assertEqual(source.shape, (5, 4))
+        assert_array_equal(source[-1], [16, 17, 18, 19])
+        assert_array_equal(np.asarray(source), self.matrix)
+
+    def test_columns(self):
+        source = FingerprintSource(self.matrix, rows_per_chunk=2).columns(1, 3)
+        self.assertEqual(source.shape, (5, 2))
+        assert_array_equal(source, self.matrix[:, 1:3])
+        assert_array_equal(source.columns(1, 2), self.matrix[:, 2:3])
+
+    def test_index_error(self):
+        self.assertRaises(IndexError, FingerprintSource(self.matrix).__getitem__, 5)
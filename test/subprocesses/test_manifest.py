@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import numpy
+import scipy.io.wavfile
+
+from subprocesses import scan_manifest, read_manifest
+from subprocesses.manifest import wav_info
+
+
+class TestManifest(TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.folder, "sub"))
+        self.mono = os.path.join(self.folder, "mono.wav")
+        self.stereo = os.path.join(self.folder, "sub", "stereo.wav")
+        scipy.io.wavfile.write(self.mono, 8000, numpy.zeros(100, dtype=numpy.int16))
+        scipy.io.wavfile.write(self.stereo, 44100, numpy.zeros((50, 2), dtype=numpy.float32))
+        self.manifest = os.path.join(self.folder, "manifest.tsv")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_wav_info(self):
+        self.assertEqual(wav_info(self.mono), (8000, 100))
+        self.assertEqual(wav_info(self.stereo), (44100, 50))
+
+    def test_wav_info_invalid(self):
+        with open(self.manifest, "wb") as f:
+            f.write(b"not a wave file")
+        self.assertEqual(wav_info(self.manifest), (0, 0))
+        self.assertEqual(wav_info(os.path.join(self.folder, "missing.wav")), (0, 0))
+
+    def test_scan_manifest(self):
+        entries = sorted(scan_manifest(self.folder, [".wav"], self.manifest))
+        self.assertEqual([e.path for e in entries], [self.mono, self.stereo])
+        self.assertEqual(entries[0].size, os.path.getsize(self.mono))
+        self.assertEqual((entries[1].sample_rate, entries[1].frames), (44100, 50))
+        self.assertEqual(sorted(read_manifest(self.manifest)), entries)
+
+    def test_unfinished_scan(self):
+        scan = scan_manifest(self.folder, [".wav"], self.manifest)
+        next(scan)
+        scan.close()
+        self.assertEqual([e.path for e in read_manifest(self.manifest)], [self.mono, self.stereo])
+        self.assertFalse(os.path.exists(self.manifest + ".tmp"))
+
+    def test_failed_scan(self):
+        scan = scan_manifest(self.folder, [".wav"], self.manifest)
+        next(scan)
+        with self.assertRaises(KeyError):
+            scan.throw(KeyError("failed"))
+        self.assertFalse(os.path.exists(self.manifest))
+        self.assertFalse(os.path.exists(self.manifest + ".tmp"))
+
+    def test_read_invalid_manifest(self):
+        with open(self.manifest, "w") as f:
+            f.write("file\n")
+        with self.assertRaises(ValueError):
+            list(read_manifest(self.manifest))
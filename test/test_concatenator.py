@@ -44,6 +44,10 @@ class TestParseArguments(TestCase):
         self.assertEqual(args.ext, "mp3")
         self.assertEqual(args.input, ".")
         self.assertEqual(args.output, "concatenated_sounds.blob")
+        self.assertEqual(args.workers, 0)
+        self.assertEqual(args.chunksize, 0)
+        self.assertEqual(args.maxtasksperchild, 0)
+        self.assertIsNone(args.start_method)
 
     def test_parse_arguments_values(self):
         args = audio_concatenator._parse_arguments().parse_args(
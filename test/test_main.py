@@ -1,7 +1,10 @@
+import json
 import os
+import tempfile
 from unittest import mock, TestCase
 
 import numpy
+import scipy.io.wavfile
 
 import crunch
 
@@ -21,6 +24,9 @@ class TestMain(TestCase):
                                                "pronunciation", "-k", "pca", "-g", "fft", "-e", "input.npy", "--td",
                                                "--colorby", "phoneme", "--parallel"])
 
+    def tearDown(self):
+        crunch._remove_temp_files()
+
     def _file_data_comp(self, data, index, x_coord, y_coord, z_coord, file_name, tags):
         self.assertEqual(data[0], index, "Unexpected index. Expected {}, Got{}".format(index, data[0]))
         self.assertEqual(data[1], x_coord, "Unexpected x coordinate. Expected {}, Got{}".format(x_coord, data[1]))
@@ -52,6 +58,44 @@ class TestMain(TestCase):
         self.assertFalse(args.td, "Unexpected value for --td")
         self.assertIsNone(args.colorby, "Unexpected colorby value")
         self.assertFalse(args.parallel, "Unexpected value for parallel.")
+        self.assertIsNone(args.cache_dir, "Unexpected value for cache_dir.")
+        self.assertEqual(args.cache_size, 0, "Unexpected value for cache_size.")
+        self.assertFalse(args.cache_by_content, "Unexpected value for cache_by_content.")
+        self.assertSequenceEqual(args.invalidate_cache, [], "Unexpected value for invalidate_cache.")
+        self.assertIsNone(args.incremental, "Unexpected value for incremental.")
+        self.assertEqual(args.chunksize, 0, "Unexpected value for chunksize.")
+        self.assertIsNone(args.manifest, "Unexpected value for manifest.")
+        self.assertFalse(args.rescan, "Unexpected value for rescan.")
+        self.assertEqual(args.scan_threads, 0, "Unexpected value for scan_threads.")
+        self.assertIsNone(args.shard, "Unexpected value for shard.")
+        self.assertIsNone(args.merge, "Unexpected value for merge.")
+        self.assertIsNone(args.metrics, "Unexpected value for metrics.")
+        self.assertEqual(args.progress_interval, 5.0, "Unexpected value for progress_interval.")
+        self.assertEqual(args.output_format, "npy", "Unexpected value for output_format.")
+        self.assertEqual(args.max_memory, 0, "Unexpected value for max_memory.")
+        self.assertEqual(args.pre_pca, 0, "Unexpected value for pre_pca.")
+        self.assertEqual(args.tsne_method, "auto", "Unexpected value for tsne_method.")
+        self.assertEqual(args.tsne_init, "pca", "Unexpected value for tsne_init.")
+        self.assertFalse(args.chain, "Unexpected value for chain.")
+        self.assertIsNone(args.init_embedding, "Unexpected value for init_embedding.")
+        self.assertEqual(args.warm_iterations, 0, "Unexpected value for warm_iterations.")
+        self.assertEqual(args.tsne_exact_limit, 5000, "Unexpected value for tsne_exact_limit.")
+        self.assertEqual(args.angle, 0.5, "Unexpected value for angle.")
+        self.assertEqual(args.rows_per_chunk, 10000, "Unexpected value for rows_per_chunk.")
+        self.assertEqual(args.pca_solver, "full", "Unexpected value for pca_solver.")
+        self.assertIsNone(args.project, "Unexpected value for project.")
+        self.assertEqual(args.project_neighbors, 10, "Unexpected value for project_neighbors.")
+        self.assertIsNone(args.profile, "Unexpected value for profile.")
+        self.assertFalse(args.profile_memory, "Unexpected value for profile_memory.")
+        self.assertEqual(args.workers, 0, "Unexpected value for workers.")
+        self.assertEqual(args.maxtasksperchild, 0, "Unexpected value for maxtasksperchild.")
+        self.assertIsNone(args.start_method, "Unexpected value for start_method.")
+        self.assertEqual(args.batch_size, 0, "Unexpected value for batch_size.")
+        self.assertEqual(args.dtype, "float64", "Unexpected value for dtype.")
+        self.assertIsNone(args.temp_dir, "Unexpected value for temp_dir.")
+        self.assertFalse(args.save_projection, "Unexpected value for save_projection.")
+        self.assertIsNone(args.features, "Unexpected value for features.")
+        self.assertFalse(args.fuse, "Unexpected value for fuse.")
 
     def test_arg_parse_values(self):
         args = self.val_ap
@@ -110,6 +154,82 @@ class TestMain(TestCase):
         file_path = "pca30.json"
         mock_output.assert_called_with(file_path, data, norm_data, self.val_ap, metadata, arr[1])
 
+    def test_finalize_projection(self):
+        x_nd = numpy.asarray([[-1.0, 0.0], [1.0, 2.0]])
+        projection = {"scale_mean": numpy.zeros(2), "scale": numpy.ones(2), "mean": numpy.zeros(2),
+                      "components": numpy.eye(2)}
+        with tempfile.TemporaryDirectory() as folder:
+            args = self.ap.parse_args(["-o", os.path.join(folder, "map_.json"), "-k", "pca", "--save_projection"])
+            crunch._finalize((x_nd.copy(), "pca", projection), args, ["a.wav", "b.wav"], {})
+            with open(os.path.join(folder, "map_pca.json")) as json_file:
+                points = json.load(json_file)["points"]
+            projected = crunch.linear_projection(x_nd, os.path.join(folder, "map_pca.npz"))
+        numpy.testing.assert_allclose(projected, [point[:2] for point in points])
+
+    def test_finalize_no_projection(self):
+        projection = {"scale_mean": numpy.zeros(2), "scale": numpy.ones(2), "mean": numpy.zeros(2),
+                      "components": numpy.eye(2)}
+        with tempfile.TemporaryDirectory() as folder:
+            args = self.ap.parse_args(["-o", os.path.join(folder, "map_.json"), "-k", "pca"])
+            crunch._finalize((numpy.asarray([[-1.0, 0.0], [1.0, 2.0]]), "pca", projection), args,
+                             ["a.wav", "b.wav"], {})
+            self.assertEqual(os.listdir(folder), ["map_pca.json"])
+
+    def test_project(self):
+        results = numpy.asarray([[0.0, 0.0], [1.0, 1.0], [0.9, 1.0], [0.9, 1.0]])
+        map_data = {"totalPoints": 2, "tags": {}, "points": [[1, 2, 3, "a.wav"], [4, 5, 6, "b.wav"]]}
+        with tempfile.TemporaryDirectory() as folder:
+            args = self.ap.parse_args(["--project", "t_sne_30.json", "--project_neighbors", "1",
+                                       "-o", os.path.join(folder, "out.json")])
+            crunch.project(args, results, ["x/a.wav", "x/b.wav", "x/c.wav", "y/c.wav"], map_data)
+            with open(args.output_file) as json_file:
+                map_data = json.load(json_file)
+        self.assertEqual(map_data["totalPoints"], 3)
+        self.assertEqual(map_data["tags"], {})
+        self.assertEqual(map_data["points"][:2], [[1, 2, 3, "a.wav"], [4, 5, 6, "b.wav"]])
+        self.assertEqual(map_data["points"][2], [4, 5, 6, "c.wav"])
+
+    def test_project_tags(self):
+        results = numpy.asarray([[0.0, 0.0], [1.0, 1.0], [0.9, 1.0]])
+        map_data = {"totalPoints": 2, "tags": {}, "points": [[1, 2, 3, "a.wav"], [4, 5, 6, "b.wav"]]}
+        with tempfile.TemporaryDirectory() as folder:
+            labels = os.path.join(folder, "labels.csv")
+            with open(labels, "w") as csv_file:
+                csv_file.write("filename,kind\na.wav,kick\nb.wav,snare\nc.wav,snare\n")
+            args = self.ap.parse_args(["--project", "t_sne_30.json", "-c", labels,
+                                       "-o", os.path.join(folder, "out.json")])
+            crunch.project(args, results, ["x/a.wav", "x/b.wav", "x/c.wav"], map_data)
+            with open(args.output_file) as json_file:
+                map_data = json.load(json_file)
+        self.assertEqual(map_data["tags"]["kind"]["snare"]["points"], [1, 2])
+        self.assertEqual(map_data["tags"]["kind"]["kick"]["points"], [0])
+        self.assertIn("color", map_data["tags"]["kind"]["snare"])
+
+    @mock.patch("crunch.generate_fingerprints")
+    @mock.patch("crunch._read_data_to_fingerprints")
+    @mock.patch("crunch.all_files")
+    def test_main_project_pca(self, mock_all_files, mock_read_fingerprints, mock_generate):
+        mock_all_files.return_value = ["x/a.wav", "x/c.wav"]
+        mock_read_fingerprints.return_value = numpy.asarray([[2.0, 1.0]]), ["x/c.wav"]
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "pca.json")
+            with open(path, "w") as json_file:
+                json.dump({"totalPoints": 1, "tags": {}, "points": [[1, 2, 0, "a.wav"]]}, json_file)
+            crunch.save_projection(crunch.projection_path(path), {
+                "scale_mean": numpy.zeros(2), "scale": numpy.ones(2), "mean": numpy.zeros(2),
+                "components": numpy.eye(2)}, 0.0, 1.0, 0.0)
+            args = self.ap.parse_args(["--project", path, "--td", "-o", os.path.join(folder, "out.json")])
+            crunch.main(args)
+            with open(args.output_file) as json_file:
+                map_data = json.load(json_file)
+        mock_read_fingerprints.assert_called_with(args, ["x/c.wav"])
+        self.assertFalse(mock_generate.called)
+        self.assertEqual(map_data["points"][1], [2, 1, 0, "c.wav"])
+
+    def test_main_project_features(self):
+        with self.assertRaises(ValueError):
+            crunch.main(self.ap.parse_args(["--project", "t_sne_30.json", "--features", "mfcc", "chroma"]))
+
     @mock.patch("crunch.load_sample")
     def test_read_and_fingerprint(self, mock_load):
         mock_fingerprint = mock.MagicMock()
@@ -126,6 +246,33 @@ class TestMain(TestCase):
         self.assertEqual(ret[1], file_path)
         self.assertEqual(ret[2], 10)
 
+    @mock.patch("crunch.load_sample")
+    @mock.patch("crunch.FingerprintCache")
+    def test_read_and_fingerprint_cached(self, mock_cache, mock_load):
+        args = self.ap.parse_args(["--cache_dir", "cache/", "--cache_size", "2"])
+        arr = numpy.asarray([1, 3, 3, 7])
+        mock_cache.return_value.get.return_value = (arr, 10)
+        ret = crunch._read_and_fingerprint("mock_path", args)
+        mock_cache.assert_called_with("cache/", 2 * 1024 * 1024, False)
+        mock_cache.return_value.get.assert_called_with("mock_path", {"method": "ms", "duration": 0, "frames": 26})
+        self.assertFalse(mock_load.called)
+        numpy.testing.assert_array_equal(ret[0], arr)
+        self.assertEqual(ret[1], "mock_path")
+        self.assertEqual(ret[2], 10)
+
+    @mock.patch("crunch.load_sample")
+    @mock.patch("crunch.FingerprintCache")
+    def test_read_and_fingerprint_cache_miss(self, mock_cache, mock_load):
+        mock_fingerprint = mock.MagicMock()
+        crunch.ProcessFunctions.fingerprint_dict["ms"] = mock_fingerprint
+        args = self.ap.parse_args(["--cache_dir", "cache/"])
+        arr = numpy.asarray([1, 3, 3, 7])
+        mock_cache.return_value.get.return_value = None
+        mock_load.return_value = ("mock_path", numpy.zeros(10), 10, 16000)
+        mock_fingerprint.return_value = arr
+        crunch._read_and_fingerprint("mock_path", args)
+        mock_cache.return_value.put.assert_called_with("mock_path", {"method": "ms", "duration": 0, "frames": 26}, arr, 10)
+
     @mock.patch("crunch.all_files")
     @mock.patch("crunch._read_and_fingerprint", mock_read)
     def test_read_data_to_fingerprints(self, mock_all_files):
@@ -133,10 +280,241 @@ class TestMain(TestCase):
         mock_all_files.return_value = [file_name]
         arr = numpy.asarray([1, 3, 3, 7])
         res = crunch._read_data_to_fingerprints(self.def_ap)
-        mock_all_files.assert_called_with(os.getcwd(), [".wav"])
+        mock_all_files.assert_called_with(os.getcwd(), [".wav"], 0)
         numpy.testing.assert_array_equal(res[0][0], arr)
         self.assertEqual(res[1][0], file_name)
 
+    @mock.patch("crunch.all_files")
+    @mock.patch("crunch._read_and_fingerprint", mock_read)
+    def test_read_data_to_fingerprints_rows(self, mock_all_files):
+        mock_all_files.return_value = ["file_{}.wav".format(i) for i in range(5)]
+        res = crunch._read_data_to_fingerprints(self.ap.parse_args(["--chunksize", "2"]))
+        self.assertEqual(res[0].shape, (5, 4))
+        self.assertEqual(res[0].dtype, numpy.float64)
+        for row in res[0]:
+            numpy.testing.assert_array_equal(row, [1, 3, 3, 7])
+        self.assertSequenceEqual(res[1], mock_all_files.return_value)
+
+    @mock.patch("crunch.all_files")
+    @mock.patch("crunch._read_and_fingerprint", mock_read)
+    def test_read_data_to_fingerprints_workers(self, mock_all_files):
+        mock_all_files.return_value = ["file_{}.wav".format(i) for i in range(5)]
+        res = crunch._read_data_to_fingerprints(self.ap.parse_args(["--workers", "2", "--maxtasksperchild", "1"]))
+        self.assertEqual(res[0].shape, (5, 4))
+        self.assertSequenceEqual(res[1], mock_all_files.return_value)
+
+    @mock.patch("crunch.all_files")
+    @mock.patch("crunch._read_and_fingerprint", mock_read)
+    def test_read_data_to_fingerprints_float32(self, mock_all_files):
+        mock_all_files.return_value = ["file_{}.wav".format(i) for i in range(3)]
+        res = crunch._read_data_to_fingerprints(self.ap.parse_args(["--dtype", "float32"]))
+        self.assertEqual(res[0].dtype, numpy.float32)
+        numpy.testing.assert_array_equal(res[0][2], [1, 3, 3, 7])
+
+    @mock.patch("crunch._read_and_fingerprint", mock_read)
+    def test_read_data_to_fingerprints_empty(self):
+        res = crunch._read_data_to_fingerprints(self.def_ap, [])
+        self.assertEqual(len(res[0]), 0)
+        self.assertSequenceEqual(res[1], [])
+        res = crunch._read_data_to_fingerprints(self.ap.parse_args(["--dtype", "float32"]), [])
+        self.assertEqual(res[0].dtype, numpy.float32)
+
+    @mock.patch("crunch._read_and_fingerprint", mock_read)
+    def test_read_data_to_fingerprints_temp_dir(self):
+        files = ["file_{}.wav".format(i) for i in range(3)]
+        with tempfile.TemporaryDirectory() as output_dir, tempfile.TemporaryDirectory() as temp_dir:
+            for args, folder in [(["-o", os.path.join(output_dir, "out.json")], output_dir),
+                                 (["-o", os.path.join(output_dir, "out.json"), "--temp_dir", temp_dir], temp_dir)]:
+                res = crunch._read_data_to_fingerprints(self.ap.parse_args(args), files)
+                matrix_files = [name for name in os.listdir(folder) if name.endswith(".fingerprints")]
+                self.assertEqual(len(matrix_files), 1, "matrix file should exist while the fingerprints are used")
+                numpy.testing.assert_array_equal(res[0][2], [1, 3, 3, 7])
+                del res
+                crunch._remove_temp_files()
+                self.assertEqual(os.listdir(folder), [])
+
+    @mock.patch("crunch._crunch")
+    def test_main_removes_temp_files(self, mock_crunch):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "matrix.fingerprints")
+
+            def fail(args):
+                open(path, "w").close()
+                crunch._temp_files.append(path)
+                raise ValueError("failed")
+            mock_crunch.side_effect = fail
+            self.assertRaises(ValueError, crunch.main, self.def_ap)
+            self.assertFalse(os.path.exists(path))
+            self.assertEqual(crunch._temp_files, [])
+
+    @mock.patch("crunch.load_sample")
+    def test_read_and_fingerprint_batch(self, mock_load):
+        mock_fingerprint = mock.MagicMock(side_effect=lambda batch, sr, size: batch * 10)
+        crunch.ProcessFunctions.batch_fingerprint_dict["ms"] = mock_fingerprint
+        mock_load.side_effect = [("file1", numpy.asarray([1, 2, 3, 4]), 4, 8),
+                                 ("file2", numpy.asarray([5, 6]), 2, 8),
+                                 ("file3", numpy.asarray([7, 8, 9, 0]), 4, 8)]
+        args = self.ap.parse_args(["-d", "500", "--batch_size", "3"])
+        ret = crunch._read_and_fingerprint_batch(["file1", "file2", "file3"], args)
+        self.assertEqual(mock_fingerprint.call_count, 2)
+        numpy.testing.assert_array_equal(mock_fingerprint.call_args_list[0][0][0], [[1, 2, 3, 4], [7, 8, 9, 0]])
+        self.assertEqual(mock_fingerprint.call_args_list[0][0][1:], (8, 4))
+        numpy.testing.assert_array_equal(mock_fingerprint.call_args_list[1][0][0], [[5, 6]])
+        self.assertEqual(mock_fingerprint.call_args_list[1][0][1:], (8, 2))
+        numpy.testing.assert_array_equal(ret[1][0], [50, 60])
+        self.assertEqual(ret[1][1:], ("file2", 2))
+        numpy.testing.assert_array_equal(ret[2][0], [70, 80, 90, 0])
+
+    def test_read_and_fingerprint_batch_short_clip(self):
+        rng = numpy.random.RandomState(0)
+        with tempfile.TemporaryDirectory() as folder:
+            paths = [os.path.join(folder, name) for name in ["long.wav", "short.wav", "other.wav"]]
+            for path, length in zip(paths, [16000, 500, 16000]):
+                scipy.io.wavfile.write(path, 16000, (rng.randn(length) * 3000).astype(numpy.int16))
+            for method in ["ms", "mfcc", "chroma"]:
+                args = self.ap.parse_args(["-d", "300", "--batch_size", "3", "-g", method])
+                with mock.patch.dict(crunch.ProcessFunctions.batch_fingerprint_dict,
+                                     {method: getattr(crunch, method + "_batch_fingerprint")}):
+                    batched = crunch._read_and_fingerprint_batch(paths, args)
+                args.batch_size = 0
+                for i in range(len(paths)):
+                    with mock.patch.dict(crunch.ProcessFunctions.fingerprint_dict,
+                                         {method: getattr(crunch, method + "_fingerprint")}):
+                        single = crunch._read_and_fingerprint(paths[i], args)
+                    numpy.testing.assert_allclose(batched[i][0], single[0], rtol=1e-6, atol=1e-8,
+                                                  err_msg="{} of {}".format(method, paths[i]))
+                    self.assertEqual(batched[i][2], single[2])
+
+    @mock.patch("crunch.all_files")
+    def test_read_data_to_fingerprints_batch_duration(self, mock_all_files):
+        mock_all_files.return_value = ["mock_file.wav"]
+        args = self.ap.parse_args(["--batch_size", "2"])
+        self.assertRaises(ValueError, crunch._read_data_to_fingerprints, args)
+
+    @mock.patch("crunch._read_and_fingerprint", mock_read)
+    @mock.patch("crunch._warm_up")
+    def test_fingerprint_to_rows(self, mock_warm_up):
+        with tempfile.NamedTemporaryFile() as matrix_file:
+            matrix_file.truncate(3 * 4 * 8)
+            crunch._init_worker(self.def_ap, matrix_file.name, (4,))
+            mock_warm_up.assert_called_with(self.def_ap)
+            res = crunch._fingerprint_to_rows((1, ["file1", "file2"]))
+            self.assertEqual(res, (1, ["file1", "file2"], {}))
+            matrix = numpy.fromfile(matrix_file.name).reshape(3, 4)
+        numpy.testing.assert_array_equal(matrix, [[0, 0, 0, 0], [1, 3, 3, 7], [1, 3, 3, 7]])
+
+    def test_list_input_files_max_to_load(self):
+        with tempfile.TemporaryDirectory() as folder:
+            os.makedirs(os.path.join(folder, "b"))
+            os.makedirs(os.path.join(folder, "a"))
+            for name in ["z.wav", os.path.join("b", "x.wav"), os.path.join("a", "y.wav"), os.path.join("a", "w.wav")]:
+                open(os.path.join(folder, name), "wb").close()
+            args = self.ap.parse_args(["-f", folder, "-a", "3", "--scan_threads", "4"])
+            runs = [list(crunch._list_input_files(args)) for _ in range(5)]
+            manifest = os.path.join(folder, "manifest.tsv")
+            args = self.ap.parse_args(["-f", folder, "-a", "1", "--manifest", manifest])
+            self.assertEqual(len(list(crunch._list_input_files(args))), 1)
+            self.assertEqual(len(list(crunch.read_manifest(manifest))), 4)
+        self.assertEqual(runs[0], [os.path.join(folder, "z.wav"), os.path.join(folder, "a", "w.wav"),
+                                   os.path.join(folder, "a", "y.wav")])
+        for run in runs[1:]:
+            self.assertEqual(run, runs[0])
+
+    @mock.patch("crunch.scan_manifest")
+    @mock.patch("crunch.read_manifest")
+    def test_list_input_files_manifest(self, mock_read, mock_scan):
+        entries = [crunch.ManifestEntry("file_{}.wav".format(i), 10, 0, 44100, 5) for i in range(3)]
+        mock_read.return_value = iter(entries)
+        mock_scan.return_value = iter(entries)
+        with tempfile.NamedTemporaryFile() as manifest:
+            res = list(crunch._list_input_files(self.ap.parse_args(["--manifest", manifest.name, "-a", "2"])))
+            mock_read.assert_called_with(manifest.name)
+            self.assertFalse(mock_scan.called)
+            self.assertEqual(res, ["file_0.wav", "file_1.wav"])
+            res = list(crunch._list_input_files(self.ap.parse_args(["--manifest", manifest.name, "--rescan"])))
+            mock_scan.assert_called_with(os.getcwd(), [".wav"], manifest.name, 0)
+            self.assertEqual(res, [e.path for e in entries])
+
+    def test_shard_argument(self):
+        self.assertEqual(self.ap.parse_args(["--shard", "1/4"]).shard, (1, 4))
+        with mock.patch("sys.stderr"):
+            for value in ["4/4", "-1/4", "1", "a/b"]:
+                with self.assertRaises(SystemExit):
+                    self.ap.parse_args(["--shard", value])
+
+    def test_warm_iterations_argument(self):
+        self.assertEqual(self.ap.parse_args(["--warm_iterations", "250"]).warm_iterations, 250)
+        self.assertEqual(self.ap.parse_args(["--warm_iterations", "0"]).warm_iterations, 0)
+        with mock.patch("sys.stderr"):
+            for value in ["1", "249", "a"]:
+                with self.assertRaises(SystemExit):
+                    self.ap.parse_args(["--warm_iterations", value])
+
+    def test_in_shard(self):
+        files = [os.path.join("root", "folder_{}".format(i % 3), "file_{}.wav".format(i)) for i in range(100)]
+        shards = [[f for f in files if crunch._in_shard(f, self.ap.parse_args(["-f", "root", "--shard", s]))]
+                  for s in ["0/3", "1/3", "2/3"]]
+        self.assertEqual(sorted(shards[0] + shards[1] + shards[2]), sorted(files))
+        self.assertTrue(all(shards))
+        moved = [f for f in (os.path.join("mnt", f) for f in files)
+                 if crunch._in_shard(f, self.ap.parse_args(["-f", os.path.join("mnt", "root"), "--shard", "0/3"]))]
+        self.assertEqual(moved, [os.path.join("mnt", f) for f in shards[0]])
+
+    def test_merge_fingerprints(self):
+        with tempfile.TemporaryDirectory() as folder:
+            stores = [os.path.join(folder, "shard_{}.npy".format(i)) for i in range(3)]
+            crunch.save_numpy_fingerprints(stores[0], numpy.asarray([[1, 3], [3, 7]]), ["file1", "file2"])
+            crunch.save_numpy_fingerprints(stores[1], numpy.empty((0, 2)), [])
+            crunch.save_numpy_fingerprints(stores[2], numpy.asarray([[7, 3]]), ["file3"])
+            merged = os.path.join(folder, "merged.npy")
+            res = crunch.merge_fingerprints(self.ap.parse_args(["--merge"] + stores + ["-r", merged]))
+            numpy.testing.assert_array_equal(res[0], [[1, 3], [3, 7], [7, 3]])
+            self.assertSequenceEqual(res[1], ["file1", "file2", "file3"])
+            loaded = crunch.load_numpy_fingerprints(merged)
+            self.assertSequenceEqual(loaded[1], ["file1", "file2", "file3"])
+            with self.assertRaises(ValueError):
+                crunch.merge_fingerprints(self.ap.parse_args(["--merge", stores[0], stores[0]]))
+            crunch.save_numpy_fingerprints(stores[1], numpy.asarray([[1, 2, 3]]), ["file4"])
+            with self.assertRaises(ValueError):
+                crunch.merge_fingerprints(self.ap.parse_args(["--merge", stores[0], stores[1]]))
+
+    @mock.patch("crunch._run_dimensionality_reduction")
+    @mock.patch("crunch.generate_fingerprints")
+    def test_main_shard(self, mock_generate, mock_reduction):
+        mock_generate.return_value = numpy.asarray([[1, 3]]), ["file1"]
+        crunch.main(self.ap.parse_args(["--shard", "0/2", "-r", "shard_0.npy"]))
+        self.assertTrue(mock_generate.called)
+        self.assertFalse(mock_reduction.called)
+        with self.assertRaises(ValueError):
+            crunch.main(self.ap.parse_args(["--shard", "0/2"]))
+
+    def test_main_warm_start_arguments(self):
+        with self.assertRaises(ValueError):
+            crunch.main(self.ap.parse_args(["--chain", "--parallel"]))
+        with self.assertRaises(ValueError):
+            crunch.main(self.ap.parse_args(["--init_embedding", "t_sne_30.json", "-k", "pca"]))
+
+    def test_run_dimensionality_reduction_init_embedding(self):
+        rf = mock.MagicMock()
+        with tempfile.TemporaryDirectory() as folder, \
+                mock.patch.dict(crunch.ProcessFunctions.dimensionality_reduction_dict, {"tsne": rf}):
+            path = os.path.join(folder, "t_sne_30.json")
+            with open(path, "w") as json_file:
+                json.dump({"points": [[1, 2, 3, "b.wav"], [4, 5, 6, "a.wav"]]}, json_file)
+            args = self.ap.parse_args(["--init_embedding", path])
+            crunch._run_dimensionality_reduction(numpy.zeros((2, 4)), args, ["x/a.wav", "x/b.wav"], {})
+        numpy.testing.assert_array_equal(rf.call_args[1]["init"], [[4, 5, 6], [1, 2, 3]])
+
+    def test_tasks(self):
+        tasks = list(crunch._tasks(iter(["a", "b", "c", "d", "e"]), 1, 2))
+        self.assertEqual(tasks, [(1, ["a", "b"]), (3, ["c", "d"]), (5, ["e"])])
+
+    def test_chunksize(self):
+        self.assertEqual(crunch._chunksize(self.def_ap, 100, 4), 7)
+        self.assertEqual(crunch._chunksize(self.def_ap, 3, 4), 1)
+        self.assertEqual(crunch._chunksize(self.def_ap, None, 4), 1)
+        self.assertEqual(crunch._chunksize(self.ap.parse_args(["--chunksize", "32"]), 100, 4), 32)
+
     def test_run_dimensionality_reduction(self):
         rf = mock.MagicMock()
         crunch.ProcessFunctions.dimensionality_reduction_dict["tsne"] = rf
@@ -177,3 +555,90 @@ class TestMain(TestCase):
                                          numpy.asarray([7, 3, 3, 1]).astype(numpy.float64))
         numpy.testing.assert_array_equal(res[0], numpy.asarray([[1, 3, 3, 7], [7, 3, 3, 1]]).astype(numpy.float64))
         self.assertSequenceEqual(res[1], ["file1", "file2"])
+
+    @mock.patch.dict(crunch.ProcessFunctions.fingerprint_writer, {"npy": mock.MagicMock()})
+    @mock.patch("crunch._list_input_files")
+    @mock.patch("crunch._read_data_to_fingerprints")
+    @mock.patch("crunch.load_fingerprint_store")
+    @mock.patch("os.path.isfile")
+    def test_generate_fingerprints_incremental(self, mock_isfile, mock_load, mock_read_fingerprints, mock_list):
+        mock_save = crunch.ProcessFunctions.fingerprint_writer["npy"]
+        mock_save.reset_mock()
+        args = self.ap.parse_args(["--incremental", "store.npy"])
+        mock_isfile.return_value = True
+        mock_list.return_value = ["file1", "file3"]
+        mock_load.return_value = [numpy.asarray([1, 3, 3, 7]), numpy.asarray([0, 0, 0, 0])], ["file1", "file2"]
+        mock_read_fingerprints.return_value = [numpy.asarray([[7, 3], [3, 1]])], ["file3"]
+        res = crunch.generate_fingerprints(args)
+        mock_load.assert_called_with("store.npy")
+        mock_read_fingerprints.assert_called_with(args, ["file3"])
+        numpy.testing.assert_array_equal(res[0], numpy.asarray([[1, 3, 3, 7], [7, 3, 3, 1]]))
+        self.assertSequenceEqual(res[1], ["file1", "file3"])
+        self.assertEqual(mock_save.call_args[0][0], "store.npy")
+        self.assertSequenceEqual(mock_save.call_args[0][2], ["file1", "file3"])
+
+    @mock.patch.dict(crunch.ProcessFunctions.fingerprint_writer, {"npy": mock.MagicMock()})
+    @mock.patch("crunch.all_files")
+    @mock.patch("crunch.load_fingerprint_store")
+    @mock.patch("crunch._read_data_to_fingerprints")
+    @mock.patch("os.path.isfile")
+    def test_generate_fingerprints_incremental_max_to_load(self, mock_isfile, mock_read_fingerprints, mock_load,
+                                                           mock_all_files):
+        mock_save = crunch.ProcessFunctions.fingerprint_writer["npy"]
+        mock_save.reset_mock()
+        args = self.ap.parse_args(["--incremental", "store.npy", "-a", "1"])
+        mock_isfile.return_value = True
+        mock_all_files.return_value = ["file1", "file2", "file3", "file4"]
+        mock_load.return_value = [numpy.asarray([1, 3]), numpy.asarray([0, 0])], ["file1", "file3"]
+        mock_read_fingerprints.return_value = [numpy.asarray([7, 3])], ["file2"]
+        res = crunch.generate_fingerprints(args)
+        mock_read_fingerprints.assert_called_with(args, ["file2"])
+        self.assertSequenceEqual(res[1], ["file1", "file3", "file2"])
+        self.assertSequenceEqual(mock_save.call_args[0][2], ["file1", "file3", "file2"])
+
+    @mock.patch.dict(crunch.ProcessFunctions.fingerprint_writer, {"npy": mock.MagicMock()})
+    @mock.patch("crunch._list_input_files")
+    @mock.patch("crunch._read_data_to_fingerprints")
+    @mock.patch("os.path.isfile")
+    def test_generate_fingerprints_incremental_new_store(self, mock_isfile, mock_read_fingerprints, mock_list):
+        mock_save = crunch.ProcessFunctions.fingerprint_writer["npy"]
+        mock_save.reset_mock()
+        args = self.ap.parse_args(["--incremental", "store.npy"])
+        mock_isfile.return_value = False
+        mock_list.return_value = ["file1"]
+        mock_read_fingerprints.return_value = [numpy.asarray([[7, 3], [3, 1]])], ["file1"]
+        res = crunch.generate_fingerprints(args)
+        mock_read_fingerprints.assert_called_with(args, ["file1"])
+        self.assertSequenceEqual(res[1], ["file1"])
+        self.assertEqual(mock_save.call_args[0][0], "store.npy")
+
+    def test_collect_float32(self):
+        x_nd = numpy.asarray([[1, 2, 3], [4, 5, 6]], dtype=numpy.float32)
+        res = crunch.collect(["a/file1.wav", "b/file2.wav"], x_nd, {}, self.def_ap, "30")
+        self.assertEqual(res["points"][1], [4.0, 5.0, 6.0, "file2.wav"])
+        json.dumps(res)
+
+    def test_feature_runs(self):
+        args = self.ap.parse_args(["--features", "chroma", "mfcc", "-r", "fing.npy", "-t", "plot_.png"])
+        results = numpy.arange(3 * 32 * 26).reshape(3, -1)
+        runs = crunch._feature_runs(results, args)
+        self.assertEqual(len(runs), 2)
+        self.assertEqual(runs[0][0].fingerprint_method, "chroma")
+        self.assertEqual(runs[1][0].output_file, os.path.join(os.getcwd(), "t_sne_mfcc_.json"))
+        self.assertEqual(runs[1][0].plot_output, "plot_mfcc_.png")
+        self.assertEqual(runs[0][0].fingerprint_output, "fing_chroma.npy")
+        numpy.testing.assert_array_equal(runs[0][1], results[:, :12 * 26])
+        numpy.testing.assert_array_equal(runs[1][1], results[:, 12 * 26:])
+        self.assertEqual(args.plot_output, "plot_.png")
+
+    def test_feature_runs_fused(self):
+        args = self.ap.parse_args(["--features", "chroma", "mfcc", "--fuse"])
+        results = numpy.zeros((3, 32 * 26))
+        runs = crunch._feature_runs(results, args)
+        self.assertEqual(len(runs), 1)
+        self.assertIs(runs[0][0], args)
+        self.assertEqual(crunch._make_header(args, 3, "30")["processingMethod"], "chroma+mfcc - tsne, 30")
+
+    def test_feature_runs_mismatch(self):
+        args = self.ap.parse_args(["--features", "chroma", "mfcc"])
+        self.assertRaises(ValueError, crunch._feature_runs, numpy.zeros((3, 10)), args)
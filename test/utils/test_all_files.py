@@ -1,16 +1,44 @@
-from unittest import mock, TestCase
-from utils import all_files
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from utils import all_files, scan_files
 
 
 class TestAllFiles(TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.folder, "sub", "deeper"))
+        for name in ["TP_VerbKick-F#3.wav", "data.csv", os.path.join("sub", "TP_RoomaKick-C4.WAV"),
+                     os.path.join("sub", "deeper", "snare.wav")]:
+            with open(os.path.join(self.folder, name), "wb") as f:
+                f.write(b"mock")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_all_files(self):
+        res = list(all_files(self.folder, [".wav"]))
+        self.assertEqual(len(res), 3, "Unexpected number of elements returned: {}.".format(len(res)))
+        self.assertTrue(os.path.join(self.folder, "TP_VerbKick-F#3.wav") in res)
+        self.assertTrue(os.path.join(self.folder, "sub", "TP_RoomaKick-C4.WAV") in res)
+        self.assertTrue(os.path.join(self.folder, "sub", "deeper", "snare.wav") in res)
+        self.assertFalse(os.path.join(self.folder, "data.csv") in res)
+
+    def test_all_files_order(self):
+        for name in ["b.wav", os.path.join("sub", "a.wav"), "c.wav"]:
+            with open(os.path.join(self.folder, name), "wb") as f:
+                f.write(b"mock")
+        expected = [os.path.join(self.folder, name) for name in
+                    ["TP_VerbKick-F#3.wav", "b.wav", "c.wav", os.path.join("sub", "TP_RoomaKick-C4.WAV"),
+                     os.path.join("sub", "a.wav"), os.path.join("sub", "deeper", "snare.wav")]]
+        for _ in range(3):
+            self.assertEqual(list(all_files(self.folder, [".wav"], 4)), expected)
+
+    def test_all_files_missing_folder(self):
+        self.assertEqual(list(all_files(os.path.join(self.folder, "missing"), [".wav"])), [])
 
-    @mock.patch("os.walk")
-    def test_all_files(self, mock_os_walk):
-        pa = "root/"
-        mock_os_walk.return_value = iter([(pa, [], ['TP_VerbKick-F#3.wav', 'TP_RoomaKick-C4.wav', "data.csv"])])
-        res = list(all_files(pa, [".wav"]))
-        self.assertEqual(len(res), 2, "Unexpected number of elements returned: {}.".format(len(res)))
-        self.assertTrue("root/TP_VerbKick-F#3.wav" in res)
-        self.assertTrue("root/TP_RoomaKick-C4.wav" in res)
-        self.assertFalse("root/data.csv" in res)
-        mock_os_walk.assert_called_with(pa)
+    def test_scan_files_describe(self):
+        res = sorted(scan_files(self.folder, [".wav"], 2, lambda entry: (entry.name, entry.stat().st_size)))
+        self.assertEqual(res, [("TP_RoomaKick-C4.WAV", 4), ("TP_VerbKick-F#3.wav", 4), ("snare.wav", 4)])
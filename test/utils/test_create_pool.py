@@ -0,0 +1,17 @@
+from unittest import TestCase
+
+from utils import create_pool
+
+
+def _square(x):
+    return x * x
+
+
+class TestCreatePool(TestCase):
+    def test_create_pool(self):
+        with create_pool(2, 1) as p:
+            self.assertEqual(p.map(_square, range(5)), [0, 1, 4, 9, 16])
+
+    def test_create_pool_start_method(self):
+        with create_pool(1, start_method="spawn") as p:
+            self.assertEqual(p.map(_square, [3]), [9])
@@ -0,0 +1,118 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock, TestCase
+
+from utils import Stage, timed, configure_metrics, take_counters, add_counters, record_counters, peak_rss, \
+    worker_profile, collect_worker_profiles
+from utils.metrics import _profiling
+
+
+class TestMetrics(TestCase):
+    def setUp(self):
+        fd, self.log_path = tempfile.mkstemp(suffix=".jsonl")
+        os.close(fd)
+        configure_metrics(self.log_path, 0)
+        take_counters()
+
+    def tearDown(self):
+        configure_metrics()
+        os.remove(self.log_path)
+
+    def _records(self):
+        with open(self.log_path) as log_file:
+            return [json.loads(line) for line in log_file]
+
+    def test_stage(self):
+        with mock.patch("builtins.print"):
+            with Stage("decode", total=10) as stage:
+                stage.update(4, 400)
+                stage.update(1, 100)
+        records = self._records()
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]["stage"], "decode")
+        self.assertEqual(records[0]["items"], 5)
+        self.assertEqual(records[0]["bytes"], 500)
+        self.assertGreaterEqual(records[0]["peak_rss"], 0)
+
+    def test_stage_exception(self):
+        with self.assertRaises(KeyError):
+            with Stage("failing"):
+                raise KeyError()
+        self.assertEqual(self._records(), [])
+
+    def test_progress(self):
+        stage = Stage("fingerprint_files", total=100)
+        stage.update(25, 2000000)
+        text = stage.progress(stage.start + 10)
+        self.assertIn("25/100 files", text)
+        self.assertIn("2.5 files/s", text)
+        self.assertIn("0.2 MB/s", text)
+        self.assertIn("ETA 0:00:30", text)
+
+    def test_stage_start(self):
+        with mock.patch("time.time", return_value=110.0), mock.patch("builtins.print"):
+            with Stage("total", start=100.0) as stage:
+                stage.update(5)
+        self.assertEqual(stage.elapsed, 10.0)
+        self.assertEqual(self._records()[0]["elapsed"], 10.0)
+
+    def test_progress_interval(self):
+        configure_metrics(self.log_path, 0.5)
+        stage = Stage("scan")
+        with mock.patch("builtins.print") as mock_print:
+            stage.update()
+            self.assertFalse(mock_print.called)
+            stage._last_report -= 1
+            stage.update()
+            self.assertTrue(mock_print.called)
+
+    def test_counters(self):
+        with timed("decode", nbytes=10) as counter:
+            counter[2] += 5
+        with timed("decode", 2):
+            pass
+        counters = take_counters()
+        self.assertEqual(counters["decode"][1:], [3, 15])
+        self.assertEqual(take_counters(), {})
+        total = {}
+        add_counters(total, counters)
+        add_counters(total, counters)
+        self.assertEqual(total["decode"][1:], [6, 30])
+        record_counters(total)
+        self.assertEqual(self._records()[0]["items"], 6)
+
+    def test_peak_rss(self):
+        self.assertGreater(peak_rss(), 0)
+
+    def test_profile(self):
+        profile_dir = tempfile.mkdtemp()
+        try:
+            configure_metrics(self.log_path, 0, profile_dir, True)
+            with Stage("t-SNE 30"):
+                with Stage("nested"):
+                    sorted(range(1000))
+            self.assertEqual(sorted(os.listdir(profile_dir)), ["t-SNE_30.pstats", "t-SNE_30.tracemalloc"])
+            self.assertIn("traced_peak", self._records()[-1])
+        finally:
+            shutil.rmtree(profile_dir)
+
+    def test_worker_profile(self):
+        profile_dir = tempfile.mkdtemp()
+        try:
+            configure_metrics(self.log_path, 0, profile_dir)
+            with mock.patch.dict(_profiling, worker=None), mock.patch("utils.metrics.Finalize") as mock_finalize:
+                with worker_profile("fingerprint_files"):
+                    sorted(range(1000))
+                profile = _profiling["worker"]
+            path = mock_finalize.call_args[1]["args"][0]
+            profile.dump_stats(path)
+            self.assertEqual(collect_worker_profiles("fingerprint_files"),
+                             os.path.join(profile_dir, "fingerprint_files.workers.pstats"))
+            self.assertEqual(os.listdir(profile_dir), ["fingerprint_files.workers.pstats"])
+        finally:
+            shutil.rmtree(profile_dir)
+
+    def test_collect_worker_profiles_disabled(self):
+        self.assertIsNone(collect_worker_profiles("fingerprint_files"))
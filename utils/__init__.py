@@ -1,6 +1,11 @@
 """
 Provides support functions for the top level modules
 """
-__all__ = ["mkdir_p", "normalize", "all_files", "parse_metadata", "add_color", "insert_suffix", "html_hex_to_rgb"]
-from utils.utils import mkdir_p, normalize, all_files, parse_metadata, insert_suffix, UnionFind
+__all__ = ["mkdir_p", "normalize", "all_files", "parse_metadata", "add_color", "insert_suffix", "html_hex_to_rgb",
+           "create_pool", "scan_files", "Stage", "timed", "configure_metrics", "metrics_settings", "take_counters",
+           "add_counters", "record_counters", "peak_rss", "worker_profile", "collect_worker_profiles"]
+from utils.utils import mkdir_p, normalize, all_files, parse_metadata, insert_suffix, create_pool, scan_files, \
+    UnionFind
 from utils.coloration import add_color, html_hex_to_rgb
+from utils.metrics import Stage, timed, configure_metrics, metrics_settings, take_counters, add_counters, \
+    record_counters, peak_rss, worker_profile, collect_worker_profiles
@@ -0,0 +1,335 @@
+import cProfile
+import glob
+import json
+import os
+import pstats
+import re
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from multiprocessing.util import Finalize
+from typing import Dict, Any, List, Iterator, Union
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+_settings = {"log_path": None, "interval": 5.0, "profile_dir": None, "trace_memory": False}
+_counters = {}
+_profiling = {"active": False, "worker": None}
+
+
+def configure_metrics(log_path: str = None, interval: float = 5.0, profile_dir: str = None,
+                      trace_memory: bool = False) -> None:
+    """
+    Set where stage metrics are written, how often progress is reported and whether stages are profiled. Must be
+    called in every process that records metrics unless the process is forked after the call.
+
+    :param log_path: JSON lines file to append a record of every finished stage to. None to not write records.
+    :type log_path: str
+    :param interval: Minimum number of seconds between progress reports. 0 to disable progress reports.
+    :type interval: float
+    :param profile_dir: Folder to write a cProfile '.pstats' file of every stage to. None to not profile.
+    :type profile_dir: str
+    :param trace_memory: Also write a tracemalloc snapshot of every profiled stage.
+    :type trace_memory: bool
+    """
+    _settings.update(log_path=log_path, interval=interval, profile_dir=profile_dir, trace_memory=trace_memory)
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+
+
+def metrics_settings() -> Dict[str, Any]:
+    """
+    Get current metrics settings, e.g. for configuring worker processes.
+
+    :return: Dictionary of keyword arguments for configure_metrics.
+    :rtype: Dict[str, Any]
+    """
+    return dict(_settings)
+
+
+def peak_rss() -> int:
+    """
+    Get peak resident set size of this process or of any of its finished child processes, whichever is larger.
+
+    :return: Peak resident set size in bytes. 0 if not available on this platform.
+    :rtype: int
+    """
+    if resource is None:
+        return 0
+    scale = 1 if sys.platform == "darwin" else 1024
+    return scale * max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                       resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+
+def _format_seconds(seconds: float) -> str:
+    """
+    Format a duration as hours, minutes and seconds.
+
+    :param seconds: Duration in seconds.
+    :type seconds: float
+    :return: Duration string of the form H:MM:SS.
+    :rtype: str
+    """
+    minutes, seconds = divmod(int(seconds), 60)
+    return "{}:{:02d}:{:02d}".format(minutes // 60, minutes % 60, seconds)
+
+
+def _profile_path(name: str, extension: str) -> str:
+    """
+    Get path of a profiling output file of a stage.
+
+    :param name: Stage name.
+    :type name: str
+    :param extension: File extension.
+    :type extension: str
+    :return: Path in the profile folder.
+    :rtype: str
+    """
+    return os.path.join(_settings["profile_dir"], re.sub(r"[^\w.-]+", "_", name) + extension)
+
+
+def _record(name: str, elapsed: float, items: int, nbytes: int, **extra: Any) -> Dict[str, Any]:
+    """
+    Create a metrics record and append it to the metrics log.
+
+    :param name: Stage name.
+    :type name: str
+    :param elapsed: Seconds spent in the stage.
+    :type elapsed: float
+    :param items: Number of items processed.
+    :type items: int
+    :param nbytes: Number of bytes processed.
+    :type nbytes: int
+    :param extra: Additional values to store in the record.
+    :type extra: Any
+    :return: Metrics record.
+    :rtype: Dict[str, Any]
+    """
+    record = {"stage": name, "time": time.time(), "elapsed": elapsed, "items": items, "bytes": nbytes,
+              "items_per_second": items / elapsed if elapsed else 0.0,
+              "bytes_per_second": nbytes / elapsed if elapsed else 0.0, "peak_rss": peak_rss()}
+    record.update(extra)
+    if _settings["log_path"]:
+        with open(_settings["log_path"], "a") as log_file:
+            log_file.write(json.dumps(record) + "\n")
+    return record
+
+
+class Stage:
+    def __init__(self, name: str, total: int = None, unit: str = "files", start: float = None):
+        """
+        Create instance of Stage. Used as a context manager around a processing stage; a record of the stage is
+        written to the metrics log when the block finishes without an exception. If profiling is configured, the
+        block is run under cProfile unless another stage is already being profiled, in which case it is included in
+        the profile of that stage.
+
+        :param name: Stage name.
+        :type name: str
+        :param total: Number of items the stage is expected to process. None if not known.
+        :type total: int
+        :param unit: Name of the processed items in progress reports.
+        :type unit: str
+        :param start: Time the stage started at, as returned by time.time(), for stages that began before the Stage
+                      was created. None to start when the Stage is created or entered.
+        :type start: float
+        """
+        self.name = name
+        self.total = total
+        self.unit = unit
+        self.items = 0
+        self.bytes = 0
+        self._fixed_start = start is not None
+        self.start = start if self._fixed_start else time.time()
+        self.elapsed = None
+        self.traced_peak = None
+        self._last_report = self.start
+        self._profile = None
+        self._tracing = False
+
+    def __enter__(self) -> "Stage":
+        if _settings["profile_dir"] and not _profiling["active"]:
+            _profiling["active"] = True
+            if _settings["trace_memory"] and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._tracing = True
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        self._last_report = time.time()
+        if not self._fixed_start:
+            self.start = self._last_report
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if self._profile:
+            self._profile.disable()
+            _profiling["active"] = False
+            self._profile.dump_stats(_profile_path(self.name, ".pstats"))
+            self._profile = None
+        if self._tracing:
+            tracemalloc.take_snapshot().dump(_profile_path(self.name, ".tracemalloc"))
+            self.traced_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self._tracing = False
+        if exc_type is None:
+            self.close()
+
+    def update(self, items: int = 1, nbytes: int = 0) -> None:
+        """
+        Count processed items and report progress if the report interval has passed.
+
+        :param items: Number of items processed since last update.
+        :type items: int
+        :param nbytes: Number of bytes processed since last update.
+        :type nbytes: int
+        """
+        self.items += items
+        self.bytes += nbytes
+        now = time.time()
+        if _settings["interval"] and now - self._last_report >= _settings["interval"]:
+            self._last_report = now
+            print(self.progress(now))
+
+    def progress(self, now: float = None) -> str:
+        """
+        Describe progress of the stage.
+
+        :param now: Current time. None to use time.time().
+        :type now: float
+        :return: Progress string with processed items, rates, peak memory use and estimated time left.
+        :rtype: str
+        """
+        elapsed = (now or time.time()) - self.start
+        rate = self.items / elapsed if elapsed else 0.0
+        text = "{}: {}{} {} in {}, {:.1f} {}/s, {:.1f} MB/s, peak RSS {:.0f} MB".format(
+            self.name, self.items, "/{}".format(self.total) if self.total else "", self.unit,
+            _format_seconds(elapsed), rate, self.unit, self.bytes / elapsed / 1e6 if elapsed else 0.0,
+            peak_rss() / 1e6)
+        if self.total and rate and self.items < self.total:
+            text += ", ETA {}".format(_format_seconds(max(0, self.total - self.items) / rate))
+        return text
+
+    def close(self) -> Dict[str, Any]:
+        """
+        Finish the stage, report its totals if it counted items and write its record to the metrics log.
+
+        :return: Metrics record.
+        :rtype: Dict[str, Any]
+        """
+        self.elapsed = time.time() - self.start
+        if self.items:
+            print(self.progress(self.start + self.elapsed))
+        if self.traced_peak is None:
+            return _record(self.name, self.elapsed, self.items, self.bytes)
+        return _record(self.name, self.elapsed, self.items, self.bytes, traced_peak=self.traced_peak)
+
+
+@contextmanager
+def timed(name: str, items: int = 1, nbytes: int = 0) -> Iterator[List[float]]:
+    """
+    Add time spent in a block to a counter of this process. Used for work that is spread over pool processes, whose
+    counters are collected with take_counters and added up in the main process.
+
+    :param name: Counter name.
+    :type name: str
+    :param items: Number of items processed in the block.
+    :type items: int
+    :param nbytes: Number of bytes processed in the block.
+    :type nbytes: int
+    :return: List of seconds, items and bytes added to the counter when the block ends. Items and bytes only known
+             inside the block can be added to it.
+    :rtype: Iterator[List[float]]
+    """
+    values = [0.0, items, nbytes]
+    start = time.time()
+    yield values
+    values[0] += time.time() - start
+    add_counters(_counters, {name: values})
+
+
+def take_counters() -> Dict[str, List[float]]:
+    """
+    Get and reset counters of this process.
+
+    :return: Dictionary of counter names to lists of seconds, items and bytes.
+    :rtype: Dict[str, List[float]]
+    """
+    counters = {k: list(v) for k, v in _counters.items()}
+    _counters.clear()
+    return counters
+
+
+def add_counters(total: Dict[str, List[float]], counters: Dict[str, List[float]]) -> None:
+    """
+    Add counters to a running total.
+
+    :param total: Dictionary of counter names to lists of seconds, items and bytes to add to.
+    :type total: Dict[str, List[float]]
+    :param counters: Counters to add.
+    :type counters: Dict[str, List[float]]
+    """
+    for name, values in counters.items():
+        current = total.setdefault(name, [0.0, 0, 0])
+        for i in range(3):
+            current[i] += values[i]
+
+
+def record_counters(counters: Dict[str, List[float]]) -> List[Dict[str, Any]]:
+    """
+    Write records of counters to the metrics log. The elapsed time of a counter is the sum over all processes.
+
+    :param counters: Dictionary of counter names to lists of seconds, items and bytes.
+    :type counters: Dict[str, List[float]]
+    :return: List of metrics records.
+    :rtype: List[Dict[str, Any]]
+    """
+    return [_record(name, *counters[name]) for name in sorted(counters)]
+
+
+@contextmanager
+def worker_profile(name: str) -> Iterator[None]:
+    """
+    Profile a block run in a pool process if profiling is configured. Profiles of all blocks run in a process are
+    added up and written when the process exits, so the pool must be closed and joined rather than terminated.
+    The files of all processes are combined with collect_worker_profiles.
+
+    :param name: Stage name.
+    :type name: str
+    """
+    if not _settings["profile_dir"]:
+        yield
+        return
+    profile = _profiling["worker"]
+    if profile is None:
+        profile = _profiling["worker"] = cProfile.Profile()
+        path = _profile_path("{}.worker-{}".format(name, os.getpid()), ".pstats")
+        Finalize(profile, profile.dump_stats, args=(path,), exitpriority=10)
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+
+
+def collect_worker_profiles(name: str) -> Union[str, None]:
+    """
+    Combine profiles written by pool processes for a stage into a single '.pstats' file.
+
+    :param name: Stage name.
+    :type name: str
+    :return: Path of the combined profile. None if profiling is not configured or no profiles were written.
+    :rtype: Union[str, None]
+    """
+    if not _settings["profile_dir"]:
+        return None
+    paths = glob.glob(_profile_path(name + ".worker-", "*.pstats"))
+    if not paths:
+        return None
+    combined = _profile_path(name + ".workers", ".pstats")
+    pstats.Stats(*paths).dump_stats(combined)
+    for path in paths:
+        os.remove(path)
+    return combined
@@ -1,7 +1,10 @@
 import os
 import errno
 import csv
-from typing import List, Dict, TypeVar, Any
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.pool import Pool
+from typing import List, Dict, TypeVar, Any, Callable, Iterable, Iterator, Tuple
 from argparse import Namespace
 
 import numpy as np
@@ -10,7 +13,50 @@ import numpy as np
 T = TypeVar("T")
 
 
-def all_files(folder_path: str, exts: List[str]) -> str:
+def scan_files(folder_path: str, exts: List[str], threads: int = 0,
+               describe: Callable[[os.DirEntry], T] = None) -> Iterator[T]:
+    """
+    Gather all files conforming to provided extensions. Folders are listed concurrently with os.scandir, but files
+    are yielded in a fixed order like a sorted os.walk: the files of a folder sorted by name, then the files of each
+    subfolder in name order. Results of a folder are yielded as soon as it and the folders before it have been listed.
+
+    :param folder_path: Path to folder
+    :type folder_path: str
+    :param exts: list of file extensions to accept
+    :type exts: List[str]
+    :param threads: Number of folders to list at once. 0 for the thread pool default.
+    :type threads: int
+    :param describe: Function called with the os.DirEntry of each accepted file in the listing thread. Its return
+                     value is yielded. Defaults to the path of the file.
+    :type describe: Callable[[os.DirEntry], T]
+    :rtype: Iterator[T]
+    """
+    describe = describe or (lambda entry: entry.path)
+
+    def list_folder(path: str) -> Tuple[List[str], List[T]]:
+        folders, found = [], []
+        try:
+            with os.scandir(path) as it:
+                for entry in sorted(it, key=lambda e: e.name):
+                    if entry.is_dir(follow_symlinks=False):
+                        folders.append(entry.path)
+                    elif os.path.splitext(entry.name)[1].lower() in exts:
+                        found.append(describe(entry))
+        except OSError:
+            pass
+        return folders, found
+
+    with ThreadPoolExecutor(threads or None) as executor:
+        # Subfolders are submitted as soon as they are found and listed in the background, while results are taken
+        # from the stack in depth first order
+        stack = [executor.submit(list_folder, folder_path)]
+        while stack:
+            folders, found = stack.pop().result()
+            stack.extend(executor.submit(list_folder, f) for f in reversed(folders))
+            yield from found
+
+
+def all_files(folder_path: str, exts: List[str], threads: int = 0) -> Iterator[str]:
     """
     Gather all files conforming to provided extensions.
 
@@ -18,14 +64,11 @@ def all_files(folder_path: str, exts: List[str]) -> str:
     :type folder_path: str
     :param exts: list of file extensions to accept
     :type exts: List[str]
-    :rtype: Union[str, None]
+    :param threads: Number of folders to list at once. 0 for the thread pool default.
+    :type threads: int
+    :rtype: Iterator[str]
     """
-    for root, dirs, files in os.walk(folder_path):
-        for f in files:
-            base, ext = os.path.splitext(f)
-            joined = os.path.join(root, f)
-            if ext.lower() in exts:
-                yield joined
+    return scan_files(folder_path, exts, threads)
 
 
 def mkdir_p(path: str):
@@ -138,6 +181,28 @@ def insert_suffix(file_path: str, suffix: str) -> str:
     return "".join([prefix, suffix, ext])
 
 
+def create_pool(workers: int = 0, maxtasksperchild: int = 0, start_method: str = None,
+                initializer: Callable = None, initargs: Iterable[Any] = ()) -> Pool:
+    """
+    Create a process pool.
+
+    :param workers: Number of worker processes. 0 to use one per cpu.
+    :type workers: int
+    :param maxtasksperchild: Number of tasks a worker process completes before it is replaced. 0 for no limit.
+    :type maxtasksperchild: int
+    :param start_method: Process start method ('fork', 'spawn' or 'forkserver'). None for platform default.
+    :type start_method: str
+    :param initializer: Function to call in each worker process when it starts.
+    :type initializer: Callable
+    :param initargs: Arguments for initializer.
+    :type initargs: Iterable[Any]
+    :return: Process pool
+    :rtype: multiprocessing.pool.Pool
+    """
+    context = multiprocessing.get_context(start_method)
+    return context.Pool(workers or None, initializer, tuple(initargs), maxtasksperchild or None)
+
+
 class UnionFind:
     def __init__(self, items: List[T]):
         """